@@ -1,6 +1,4 @@
 import os
-import openai
-from openai import OpenAI
 import json
 from dotenv import load_dotenv
 from bs4 import BeautifulSoup # Import BeautifulSoup for HTML parsing
@@ -8,25 +6,34 @@ from html_processor import extract_form_sections # Import the new function
 from llm_agent import generate_playbook # Import the LLM agent function
 from playbook_manager import load_playbook, save_playbook # Import playbook manager functions
 from urllib.parse import urlparse # Import urlparse to extract domain
+from llm_cache import get_llm_cache, make_cache_key
+from llm_transport import get_chat_client, transport_mode, REPLAY
+from prompt_budget import pack_sections
+from tracing import traced
 
 # Load environment variables from .env file
 load_dotenv()
 
 # Check if the API key was loaded
 openai_api_key = os.getenv("OPENAI_API_KEY")
-if not openai_api_key:
+if not openai_api_key and transport_mode() != REPLAY and not os.getenv("LLM_BASE_URL"):
     print("[ERROR] OPENAI_API_KEY environment variable not found after loading .env")
     # Depending on desired behavior, you might exit or raise an error here.
-    # For now, we'll proceed, but the OpenAI client initialization will likely fail.
+    # For now, we'll proceed, but live LLM calls will fail.
 
-# Configure OpenAI API (ensure your API key is set as an environment variable)
-# The API key is typically read from the OPENAI_API_KEY environment variable.
-client = OpenAI(api_key=openai_api_key)
+# Chat calls go through llm_transport (live, record or replay; see LLM_MODE)
 
-def analyze_form_page(html_content: str, screenshot_path: str = None) -> dict:
+ANALYZE_MODEL = "gpt-4o"
+# Bump when the prompt below changes so cached responses are not reused
+ANALYZE_PROMPT_VERSION = "analyze_form_page/2"
+ANALYZE_TOKEN_BUDGET = 6000  # form sections sent per request
+
+@traced("llm.analyze_form_page", cat="llm")
+def analyze_form_page(html_content: str, screenshot_path: str = None, form_sections: list = None) -> dict:
     """
     Process HTML to extract form sections, send extracted information and screenshot
     to the LLM to analyze the page and identify interactive elements and actions.
+    Pass form_sections (e.g. PageSnapshot.form_sections) to skip re-extracting them.
     Returns a dictionary (playbook actions for this page) parsed from the LLM's JSON output.
     """
     # Prepare the prompt for the model
@@ -41,12 +48,24 @@ def analyze_form_page(html_content: str, screenshot_path: str = None) -> dict:
     )
 
     # Use html_processor to extract relevant sections
-    extracted_sections = extract_form_sections(html_content)
+    extracted_sections = form_sections if form_sections is not None else extract_form_sections(html_content)
+
+    # Identical form sections were analyzed before: reuse that response
+    cache = get_llm_cache()
+    cache_key = make_cache_key(extracted_sections, ANALYZE_PROMPT_VERSION, ANALYZE_MODEL)
+    if cache is not None:
+        cached_actions = cache.get(cache_key)
+        if cached_actions is not None:
+            print("LLM analysis served from cache.")
+            return cached_actions
+
+    # Keep the most relevant sections (uploads, fields, Next/Submit) within the token budget
+    packed_sections, _ = pack_sections(extracted_sections, ANALYZE_TOKEN_BUDGET, ANALYZE_MODEL, label="form analysis")
 
-    # Combine extracted sections into a single message for the LLM
+    # Combine the packed sections into a single message for the LLM
     # Use a clear separator between sections
     user_message_parts = ["Extracted Form Sections:"]
-    for i, section in enumerate(extracted_sections):
+    for i, section in enumerate(packed_sections):
         user_message_parts.append(f"\n--- Section {i+1} ---\n{section}")
 
     user_message = "\n".join(user_message_parts)
@@ -58,8 +77,8 @@ def analyze_form_page(html_content: str, screenshot_path: str = None) -> dict:
 
 
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o",  # Using a model that supports vision and larger context
+        response = get_chat_client().chat.completions.create(
+            model=ANALYZE_MODEL,  # Using a model that supports vision and larger context
             messages=[
                 {"role": "system", "content": system_message},
                 {"role": "user", "content": user_message}
@@ -77,6 +96,8 @@ def analyze_form_page(html_content: str, screenshot_path: str = None) -> dict:
         # The model is instructed to give JSON. We attempt to parse it:
         actions = json.loads(json_string)
         print("LLM analysis successful, received actions JSON.")
+        if cache is not None and actions:
+            cache.put(cache_key, actions, meta={"prompt_version": ANALYZE_PROMPT_VERSION})
         return actions
     except json.JSONDecodeError as e:
         print(f"[Error] LLM output is not valid JSON: {e}")
@@ -118,7 +139,7 @@ if __name__ == "__main__":
             playbook = generate_playbook(extracted_sections)
 
             # Save the generated playbook to cache
-            if playbook: # Only save if playbook generation was successful
+            if playbook and not playbook.get("failed_sections"): # Only save complete playbooks
                 save_playbook(domain, playbook)
         else:
             print(f"Sample HTML not found at {sample_html_path}. Cannot generate playbook.")
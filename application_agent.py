@@ -6,10 +6,17 @@ from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from urllib.parse import urlparse
 
-from page_capture import save_page_snapshot
-from html_processor import extract_form_sections
+from page_capture import capture_page_snapshot
+from snapshot_writer import flush_snapshots
+from page_waits import wait_for_page_ready, get_wait_stats
 from llm_agent import generate_playbook
-from playbook_manager import load_playbook, save_playbook
+from playbook_manager import load_step_playbook, save_step_playbook
+from form_fingerprint import form_fingerprint
+from tracing import job_trace, span
+from playbook_executor import execute_playbook_actions
+from selector_validator import validate_actions
+from dom_extractor import extract_dom_model
+from dom_fingerprint import StateHistory
 
 class ApplicationAgent:
     def __init__(self, driver: WebDriver, job_id: str, job_title: str, resume_path: str, cover_letter_path: str):
@@ -20,64 +27,96 @@ class ApplicationAgent:
         self.cover_letter_path = cover_letter_path
         self.step_counter = 0
 
-    def run_application(self, start_url: str):
+    def run_application(self, start_url: str, apply_xpath: str = None):
+        """
+        Work through the application form starting at start_url.
+        If apply_xpath is given, that element (e.g. the job page's Apply link) is
+        clicked first. Returns True if every step ran without an action failure.
+        """
+        with job_trace(self.job_id):
+            return self._run_application(start_url, apply_xpath)
+
+    def _run_application(self, start_url, apply_xpath):
         print(f"Starting application process for job: {self.job_title} ({self.job_id})")
-        self.driver.get(start_url)
-        time.sleep(5) # Initial wait
+        with span("driver.get", cat="selenium", url=start_url):
+            self.driver.get(start_url)
+        wait_for_page_ready(self.driver, "initial page load", replaces=5) # Initial wait
 
         # Initial capture after navigating to the job page
         self.step_counter += 1
         self._capture_page(f"nav_{self.step_counter}")
 
+        if apply_xpath:
+            WebDriverWait(self.driver, 20).until(EC.element_to_be_clickable((By.XPATH, apply_xpath))).click()
+            wait_for_page_ready(self.driver, "after Apply", replaces=5)
+            self.step_counter += 1
+        succeeded = True
+
         # Assuming the first action is to click 'Apply' or similar to get to the form
         # This part might need to be handled outside the main loop if it's a fixed first step
         # For now, let's assume the loop starts on the first form page.
         # We'll need to adjust launch_browser.py to click 'Apply' before calling run_application.
 
         application_complete = False
+        visited_states = StateHistory()
         while not application_complete:
             current_url = self.driver.current_url
             domain = urlparse(current_url).netloc
             print(f"Processing step {self.step_counter} on domain: {domain}")
 
-            # Capture current page state
-            html_file_path, screenshot_path = self._capture_page(f"step_{self.step_counter}")
-
-            if not os.path.exists(html_file_path):
-                print(f"[Error] Captured HTML file not found: {html_file_path}. Exiting application process.")
+            # One in-page pass gives the form sections and the structural DOM fingerprint
+            page_model = extract_dom_model(self.driver)
+            form_sections = page_model["sections"]
+
+            # Capture current page state (the sections are reused, so the HTML is not parsed again)
+            snapshot = self._capture_page(f"step_{self.step_counter}", form_sections=form_sections)
+
+            # The same URL and form with a near-identical DOM skeleton means the last step did not advance
+            fingerprint = form_fingerprint(form_sections)
+            state_key = (current_url, fingerprint)
+            page_fingerprint = page_model["dom_fingerprint"]
+            repeated_step = visited_states.match(state_key, page_fingerprint)
+            if repeated_step is not None:
+                print(f"[Warning] Step {self.step_counter} repeats the page of step {repeated_step} (possible loop). Exiting.")
+                succeeded = False
                 application_complete = True
                 continue
-
-            with open(html_file_path, "r", encoding="utf-8") as f:
-                captured_html = f.read()
-
-            # Process HTML to find form sections
-            form_sections = extract_form_sections(captured_html)
+            visited_states.add(state_key, page_fingerprint, self.step_counter)
 
             if not form_sections:
                 print("No more form sections found on this page. Application likely complete.")
                 application_complete = True
                 continue
 
-            # Attempt to load existing playbook
-            playbook = load_playbook(domain)
+            # Attempt to load the playbook recorded for this form step
+            with span("load_step_playbook", cat="playbook", fingerprint=fingerprint):
+                playbook = load_step_playbook(domain, fingerprint)
 
             if playbook is None:
-                print(f"No playbook found for {domain}. Generating new playbook...")
-                # Analyze the captured HTML using the LLM to generate playbook
-                print(f"Analyzing captured HTML from: {html_file_path}")
-                # Truncate HTML content to avoid exceeding token limits if necessary
-                max_html_length = 400000
-                truncated_html = captured_html[:max_html_length]
-                playbook = generate_playbook(truncated_html, screenshot_path)
-
-                if playbook:
+                print(f"No playbook found for step {fingerprint} on {domain}. Generating new playbook...")
+                # Analyze the extracted form sections using the LLM to generate playbook
+                print(f"Analyzing {len(form_sections)} form sections captured for step {snapshot.step}")
+                playbook = generate_playbook(form_sections)
+                if playbook and playbook.get("actions"):
+                    # Reject or repair selectors against the captured HTML before saving or executing
+                    playbook["actions"], _ = validate_actions(playbook["actions"], snapshot.html)
+                    if not playbook["actions"]:
+                        print("[Warning] No generated action matches this page; discarding the playbook.")
+                        playbook = None
+
+                if playbook and playbook.get("failed_sections"):
+                    # Run what was generated, but never store a partial plan: the next visit asks the LLM again
+                    print(f"[Warning] Sections {playbook['failed_sections']} could not be planned; "
+                          "not saving this playbook.")
+                elif playbook:
                     # Save the generated playbook
-                    save_playbook(domain, playbook)
+                    if fingerprint:
+                        save_step_playbook(domain, fingerprint, playbook)
                     print("Generated and saved new playbook.")
                 else:
                     print("[Warning] LLM did not generate a valid playbook.")
                     # Decide how to handle this - maybe try again or exit?
+                    succeeded = False
                     application_complete = True # Exit if no playbook generated
                     continue
 
@@ -86,78 +125,39 @@ class ApplicationAgent:
                 print(f"Executing playbook actions for {domain}...")
                 if not self._execute_playbook_actions(playbook['actions']):
                      print("[Error] Failed to execute all playbook actions. Exiting.")
+                     succeeded = False
                      application_complete = True # Exit on action execution failure
                      continue
                 print("Finished executing playbook actions.")
             else:
                  print("[Warning] Playbook is empty or missing 'actions'. Cannot proceed.")
+                 succeeded = False
                  application_complete = True # Exit if playbook is invalid
 
             # After executing actions, wait for the next page to load
-            time.sleep(5)
+            wait_for_page_ready(self.driver, "next page", replaces=5)
             self.step_counter += 1 # Increment step counter for the *next* page capture
 
+        flush_snapshots()  # make sure every background snapshot write reached the disk
+        get_wait_stats().report()
         print("Application process finished.")
+        return succeeded
 
 
-    def _capture_page(self, step_name: str):
-        """Captures the current page HTML and screenshot."""
+    def _capture_page(self, step_name: str, form_sections=None):
+        """Captures the current page HTML and screenshot as an in-memory PageSnapshot."""
         print(f"Capturing page state for step: {step_name}")
-        html_path, screenshot_path = save_page_snapshot(self.driver, self.job_id, self.job_title, step_name)
-        print(f"Saved page snapshot: HTML -> {html_path}, Screenshot -> {screenshot_path}")
-        return html_path, screenshot_path
+        return capture_page_snapshot(self.driver, self.job_id, self.job_title, step_name,
+                                     form_sections=form_sections)
 
     def _execute_playbook_actions(self, actions: list):
-        """Executes a list of actions using Selenium."""
-        success = True
-        for action in actions:
-            try:
-                selector = action.get('target') or action.get('selector') # Allow 'target' or 'selector'
-                action_type = action.get('action')
-                value = action.get('value')
-                description = action.get('description', 'No description')
-
-                print(f"Executing action: {action_type} on {selector} ({description})")
-
-                if not selector:
-                    print(f"[Warning] Action skipped due to missing selector: {action}")
-                    success = False # Mark as failure but continue
-                    continue
-
-                # Use WebDriverWait for robustness
-                wait = WebDriverWait(self.driver, 10)
-                element = wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, selector)))
-
-                if action_type == 'click':
-                    element.click()
-                elif action_type == 'type':
-                    if value is not None:
-                        element.send_keys(value)
-                elif action_type == 'upload':
-                    if value == '[RESUME_PATH]':
-                        upload_path = self.resume_path
-                    elif value == '[COVER_LETTER_PATH]':
-                        upload_path = self.cover_letter_path
-                    else:
-                        print(f"[Warning] Unknown upload value placeholder: {value}. Skipping upload.")
-                        success = False # Mark as failure but continue
-                        continue
-                    print(f"Uploading file: {upload_path}")
-                    element.send_keys(upload_path)
-                # Add other action types as needed (e.g., select dropdown)
-                else:
-                    print(f"[Warning] Unknown action type: {action_type}. Skipping action.")
-                    success = False # Mark as failure but continue
-
-                time.sleep(1) # Short pause after each action
-
-            except Exception as action_e:
-                print(f"[Error] Failed to execute action {action}: {action_e}")
-                success = False # Mark as failure but continue with next action
-                # Optionally, break here if any action failure should stop the process:
-                # break
-
-        return success # Return overall success status
+        """
+        Executes a step's actions through playbook_executor: runs of non-upload
+        actions go into the page in one round trip, uploads through send_keys.
+        Each new step is captured by the agent loop, so there is no per-action LLM review.
+        """
+        return execute_playbook_actions(self.driver, actions, self.resume_path, self.cover_letter_path,
+                                        review=False)
 
 # Example Usage (will be called from launch_browser.py)
 # if __name__ == "__main__":
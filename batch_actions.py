@@ -0,0 +1,139 @@
+# batch_actions.py
+# Executes a run of consecutive non-upload playbook actions (clicks, typing,
+# selects, checkboxes) inside the page with one execute_async_script call.
+# Typed values go through the native value setter followed by input/change
+# events, so React-style controlled inputs see them. Each action re-finds its
+# element when it runs (waiting briefly if an earlier action is still
+# revealing it) and the run stops at the first failure. A click that ends the
+# run is dispatched after the results are returned, so a Next/Submit click
+# that navigates away does not abort the script.
+from selenium.common.exceptions import TimeoutException, WebDriverException
+
+from page_waits import run_async_script
+from element_resolver import selector_key
+from tracing import span
+
+BATCHABLE_ACTIONS = ("click", "type", "fill", "select", "check", "uncheck")
+ELEMENT_TIMEOUT_MS = 2000  # per action, inside the page
+ACTION_GAP_MS = 30  # let the page re-render between actions
+
+BATCH_SCRIPT = r"""
+var actions = arguments[0];
+var elementTimeout = arguments[1];
+var gap = arguments[2];
+var done = arguments[arguments.length - 1];
+var results = [];
+
+function find(selector, xpath) {
+  if (xpath) {
+    var node = document.evaluate(selector, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+    return node && node.nodeType === 1 ? node : null;
+  }
+  return document.querySelector(selector);
+}
+
+function setValue(el, value) {
+  var proto = el instanceof HTMLTextAreaElement ? HTMLTextAreaElement.prototype
+            : el instanceof HTMLSelectElement ? HTMLSelectElement.prototype
+            : HTMLInputElement.prototype;
+  var descriptor = Object.getOwnPropertyDescriptor(proto, 'value');
+  if (descriptor && descriptor.set) { descriptor.set.call(el, value); } else { el.value = value; }
+  el.dispatchEvent(new Event('input', {bubbles: true}));
+  el.dispatchEvent(new Event('change', {bubbles: true}));
+}
+
+function perform(el, action) {
+  el.scrollIntoView({block: 'center'});
+  var value = action.value === null || action.value === undefined ? '' : String(action.value);
+  switch (action.action) {
+    case 'click':
+      el.click();
+      return 'done';
+    case 'type':
+    case 'fill':
+      el.focus();
+      setValue(el, value);
+      el.blur();
+      return 'done';
+    case 'select':
+      if (!(el instanceof HTMLSelectElement)) { throw new Error('not a <select>'); }
+      var match = null;
+      for (var i = 0; i < el.options.length && !match; i++) {
+        var option = el.options[i];
+        if (option.value === value || option.text.trim() === value) { match = option; }
+      }
+      if (!match) { throw new Error('no option "' + value + '"'); }
+      setValue(el, match.value);
+      return 'done';
+    case 'check':
+    case 'uncheck':
+      if (el.checked !== (action.action === 'check')) { el.click(); }
+      return 'done';
+  }
+  return 'skipped';
+}
+
+function run(index) {
+  if (index >= actions.length) { done(results); return; }
+  var action = actions[index];
+  var started = performance.now();
+  (function attempt() {
+    var el;
+    try {
+      el = find(action.selector, action.use_xpath);
+    } catch (e) {
+      results.push({ok: false, error: 'invalid selector: ' + (e && e.message || e)});
+      done(results);
+      return;
+    }
+    if (!el) {
+      if (performance.now() - started < elementTimeout) { setTimeout(attempt, 50); return; }
+      results.push({ok: false, error: 'element not found'});
+      done(results);
+      return;
+    }
+    if (index === actions.length - 1 && action.action === 'click') {
+      // The last click may navigate away (Next/Submit): report first, then click
+      results.push({ok: true, status: 'dispatched', ms: Math.round(performance.now() - started)});
+      done(results);
+      setTimeout(function () { el.scrollIntoView({block: 'center'}); el.click(); }, 0);
+      return;
+    }
+    try {
+      results.push({ok: true, status: perform(el, action), ms: Math.round(performance.now() - started)});
+    } catch (e) {
+      results.push({ok: false, error: String(e && e.message || e)});
+      done(results);
+      return;
+    }
+    setTimeout(function () { run(index + 1); }, gap);
+  })();
+}
+run(0);
+"""
+
+
+def is_batchable(action):
+    return action.get("action") in BATCHABLE_ACTIONS
+
+
+def run_batched_actions(driver, actions, element_timeout_ms=ELEMENT_TIMEOUT_MS, gap_ms=ACTION_GAP_MS):
+    """
+    Run actions in the page with one round trip.
+    Returns one result per action attempted: {"ok", "status" or "error"};
+    the list is shorter than actions when the run stopped at a failure.
+    """
+    payload = []
+    for action in actions:
+        selector, xpath = selector_key(action)
+        payload.append({"action": action.get("action"), "selector": selector, "use_xpath": xpath,
+                        "value": action.get("value")})
+    script_timeout = (element_timeout_ms + gap_ms) * len(actions) / 1000 + 5
+    with span("batched_actions", cat="action", count=len(actions)):
+        try:
+            results = run_async_script(driver, BATCH_SCRIPT, script_timeout, payload, element_timeout_ms, gap_ms)
+        except (TimeoutException, WebDriverException) as e:
+            # e.g. a click navigated away mid-run; report it on the first action
+            message = str(e).splitlines()[0] if str(e) else type(e).__name__
+            return [{"ok": False, "error": message}]
+    return results or []
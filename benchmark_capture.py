@@ -0,0 +1,117 @@
+# benchmark_capture.py
+# Compare screenshot capture methods in a real (headless) Firefox:
+#   resize    the old way: resize the window to the page's scroll size, screenshot <body>
+#   native    Firefox's full-page screenshot at the normal window size
+#   stitched  viewport tiles scrolled through and stitched with Pillow
+#   viewport  the visible viewport only
+#   python benchmark_capture.py                       # a few pages from the captured corpus
+#   python benchmark_capture.py https://... file:///...
+import os
+import glob
+import json
+import time
+import argparse
+
+from selenium.webdriver.common.by import By
+
+from benchmark_corpus import percentiles, RESULTS_DIR
+from benchmark_extraction import CORPUS_GLOBS
+from launch_browser import create_driver
+from page_waits import wait_for_page_ready
+from screenshot_capture import capture_screenshot, stitch_viewport_tiles, WINDOW_SIZE, VIEWPORT
+
+METHODS = ("resize", "native", "stitched", "viewport")
+DEFAULT_PAGES = 5
+
+
+def capture_resize(driver):
+    """The capture page_capture used before: resize the window to the page, then screenshot <body>."""
+    width = driver.execute_script("return document.body.parentNode.scrollWidth")
+    height = driver.execute_script("return document.body.parentNode.scrollHeight")
+    driver.set_window_size(width, height)
+    return driver.find_element(By.TAG_NAME, "body").screenshot_as_png
+
+
+CAPTURES = {
+    "resize": capture_resize,
+    "native": lambda driver: driver.get_full_page_screenshot_as_png(),
+    "stitched": stitch_viewport_tiles,
+    "viewport": lambda driver: capture_screenshot(driver, VIEWPORT)[0],
+}
+
+
+def corpus_urls(count):
+    paths = []
+    for pattern in CORPUS_GLOBS:
+        paths.extend(sorted(glob.glob(pattern, recursive=True)))
+    return ["file://" + os.path.abspath(path) for path in paths[:count]]
+
+
+def benchmark_page(driver, url, rounds):
+    """Time every method on one page; the window is reset to WINDOW_SIZE before each capture."""
+    driver.get(url)
+    wait_for_page_ready(driver, "benchmark page load")
+    results = {}
+    for method in METHODS:
+        samples, sizes, window_changed = [], [], False
+        for _ in range(rounds):
+            driver.set_window_size(*WINDOW_SIZE)
+            driver.execute_script("window.scrollTo(0, 0);")
+            start = time.perf_counter()
+            try:
+                png = CAPTURES[method](driver)
+            except Exception as e:
+                print(f"  {method:<9} failed: {e}")
+                break
+            samples.append(time.perf_counter() - start)
+            sizes.append(len(png))
+            size = driver.get_window_size()
+            window_changed = window_changed or (size["width"], size["height"]) != WINDOW_SIZE
+        if samples:
+            results[method] = dict(percentiles(samples), png_kb=sum(sizes) / len(sizes) / 1024,
+                                   window_changed=window_changed)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark screenshot capture methods in headless Firefox.")
+    parser.add_argument("--rounds", type=int, default=3, help="captures per method and page")
+    parser.add_argument("--pages", type=int, default=DEFAULT_PAGES, help="corpus pages to use when no URLs are given")
+    parser.add_argument("--output", help="where to save the JSON results (default: benchmarks/capture_<time>.json)")
+    parser.add_argument("urls", nargs="*", help="pages to capture (default: the first captured corpus pages)")
+    args = parser.parse_args()
+
+    urls = args.urls or corpus_urls(args.pages)
+    if not urls:
+        print("No pages to capture.")
+        return
+    driver = create_driver(profile_path=None, headless=True)
+    per_page = {}
+    try:
+        for url in urls:
+            print(f"Page: {url}")
+            per_page[url] = benchmark_page(driver, url, args.rounds)
+            for method, result in per_page[url].items():
+                print(f"  {method:<9} p50 {result['p50_ms']:8.1f} ms  p95 {result['p95_ms']:8.1f} ms  "
+                      f"{result['png_kb']:8.0f} KB  window changed: {result['window_changed']}")
+    finally:
+        driver.quit()
+
+    print("\nAll pages:")
+    summary = {}
+    for method in METHODS:
+        p50s = [page[method]["p50_ms"] for page in per_page.values() if method in page]
+        if p50s:
+            summary[method] = {"pages": len(p50s), "mean_p50_ms": sum(p50s) / len(p50s)}
+            print(f"  {method:<9} mean p50 {summary[method]['mean_p50_ms']:8.1f} ms over {len(p50s)} pages")
+
+    output = args.output or os.path.join(RESULTS_DIR, f"capture_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump({"created": time.strftime("%Y-%m-%dT%H:%M:%S"), "rounds": args.rounds,
+                   "summary": summary, "pages": per_page}, f, indent=2)
+    print(f"Results saved to {output}")
+
+
+if __name__ == "__main__":
+    main()
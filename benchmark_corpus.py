@@ -0,0 +1,207 @@
+# benchmark_corpus.py
+# Benchmark suite over the captured HTML corpus (see benchmark_extraction.CORPUS_GLOBS).
+#   python benchmark_corpus.py                      # run, print, save JSON
+#   python benchmark_corpus.py --compare old.json   # also flag regressions against an earlier run
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import platform
+import tracemalloc
+
+from bs4 import BeautifulSoup
+
+import html_processor
+from benchmark_extraction import CORPUS_GLOBS, load_corpus
+from form_fingerprint import form_fingerprint
+from launch_browser import sanitize_actions
+from prompt_budget import count_tokens, tiktoken
+from selector_validator import validate_actions
+
+RESULTS_DIR = "benchmarks"
+REGRESSION_THRESHOLD = 0.20  # flag a benchmark when its p50 or p95 gets 20% slower
+
+_BUTTON_RE = re.compile(r"\[BUTTON: ([^\]]*)\]")
+_NAME_RE = re.compile(r"\[(?:INPUT|TEXTAREA|SELECT)[^\]]*?name=([^,\]]*)")
+
+
+def title_bs4(html):
+    """The job title lookup launch_browser.main used to do on page_source."""
+    element = BeautifulSoup(html, "html.parser").select_one("h1")
+    return element.get_text(strip=True) if element else "N-A"
+
+
+def actions_for_sections(sections):
+    """
+    Actions shaped like LLM output for one page: a click per named field and a
+    :contains() click per button, so sanitize_actions has selectors to rewrite.
+    """
+    actions = []
+    for section in sections:
+        for name in _NAME_RE.findall(section):
+            actions.append({"action": "click", "selector": f"input[name='{name}']", "field": name})
+        for label in _BUTTON_RE.findall(section):
+            actions.append({"action": "click", "selector": f"button:contains('{label}')", "field": label})
+    return actions
+
+
+def percentiles(samples):
+    ordered = sorted(samples)
+    if not ordered:
+        return {}
+
+    def pick(pct):
+        return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+    return {
+        "p50_ms": pick(50) * 1000,
+        "p90_ms": pick(90) * 1000,
+        "p95_ms": pick(95) * 1000,
+        "p99_ms": pick(99) * 1000,
+        "max_ms": ordered[-1] * 1000,
+        "mean_ms": sum(ordered) / len(ordered) * 1000,
+    }
+
+
+def run_benchmark(name, func, inputs, rounds):
+    """
+    Time func on every input (`rounds` passes, one sample per call), then
+    measure peak traced memory in a separate pass so tracing does not skew timings.
+    """
+    samples = []
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for args in inputs:
+            t0 = time.perf_counter()
+            func(*args)
+            samples.append(time.perf_counter() - t0)
+    elapsed = time.perf_counter() - start
+
+    peak_per_call = 0
+    tracemalloc.start()
+    try:
+        for args in inputs:
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+            func(*args)
+            peak_per_call = max(peak_per_call, tracemalloc.get_traced_memory()[1] - baseline)
+    finally:
+        tracemalloc.stop()
+
+    result = {"calls": len(samples), "per_sec": len(samples) / elapsed if elapsed else None,
+              "peak_memory_kb": peak_per_call / 1024}
+    result.update(percentiles(samples))
+    print(f"  {name:<28} p50 {result['p50_ms']:7.2f} ms  p95 {result['p95_ms']:7.2f} ms  "
+          f"max {result['max_ms']:7.2f} ms  peak {result['peak_memory_kb']:8.0f} KB")
+    return result
+
+
+def output_stats(pages):
+    """Section counts and extracted output size in characters and tokens."""
+    section_counts, chars, tokens = [], [], []
+    fingerprints = set()
+    for _, html in pages:
+        sections = html_processor.extract_form_sections(html)
+        text = "\n\n".join(sections)
+        section_counts.append(len(sections))
+        chars.append(len(text))
+        tokens.append(count_tokens(text))
+        fingerprints.add(form_fingerprint(sections))
+    n = len(pages)
+    return {
+        "pages": n,
+        "input_chars": sum(len(html) for _, html in pages),
+        "sections_total": sum(section_counts),
+        "sections_per_page_mean": sum(section_counts) / n,
+        "sections_per_page_max": max(section_counts),
+        "pages_without_sections": section_counts.count(0),
+        "output_chars_total": sum(chars),
+        "output_chars_per_page_max": max(chars),
+        "output_tokens_total": sum(tokens),
+        "output_tokens_per_page_max": max(tokens),
+        "tokens_estimated": tiktoken is None,
+        "distinct_form_fingerprints": len(fingerprints - {None}),
+    }
+
+
+def compare(current, baseline, threshold=REGRESSION_THRESHOLD):
+    """Print timing deltas against a previous run; return the names that regressed."""
+    regressions = []
+    print(f"\nCompared with {baseline.get('created', 'baseline')}:")
+    for name, result in current["benchmarks"].items():
+        old = baseline.get("benchmarks", {}).get(name)
+        if not old:
+            continue
+        deltas = []
+        for key in ("p50_ms", "p95_ms"):
+            if old.get(key):
+                change = (result[key] - old[key]) / old[key]
+                deltas.append(f"{key[:3]} {change:+.0%}")
+                if change > threshold:
+                    regressions.append(name)
+        print(f"  {name:<28} {', '.join(deltas)}")
+    for name in sorted(set(regressions)):
+        print(f"[Warning] {name} regressed by more than {threshold:.0%}")
+    return sorted(set(regressions))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark extraction and parsing on the captured HTML corpus.")
+    parser.add_argument("--rounds", type=int, default=3, help="passes over the corpus per benchmark")
+    parser.add_argument("--output", help="where to save the JSON results (default: benchmarks/corpus_<time>.json)")
+    parser.add_argument("--compare", help="earlier results JSON to compare against")
+    parser.add_argument("patterns", nargs="*", help="glob patterns of HTML files (default: captured corpus)")
+    args = parser.parse_args()
+
+    pages = load_corpus(args.patterns or CORPUS_GLOBS)
+    if not pages:
+        print("No HTML pages found.")
+        return
+    print(f"Corpus: {len(pages)} pages, {sum(len(h) for _, h in pages) / 1024:,.0f} KB")
+
+    html_inputs = [(html,) for _, html in pages]
+    action_inputs = [(actions_for_sections(html_processor.extract_form_sections(html)),) for _, html in pages]
+    # sanitize_actions rewrites actions in place; give every call fresh copies
+    fresh_actions = lambda actions: sanitize_actions([dict(a) for a in actions])
+    validate_inputs = [(sanitize_actions([dict(a) for a in actions]), html)
+                       for (actions,), (_, html) in zip(action_inputs, pages)]
+    validate = lambda actions, html: validate_actions(actions, html, verbose=False)
+
+    benchmarks = {}
+    benchmarks["extract_form_sections"] = run_benchmark(
+        "extract_form_sections", html_processor.extract_form_sections, html_inputs, args.rounds)
+    benchmarks["extract_form_sections_bs4"] = run_benchmark(
+        "extract_form_sections_bs4", html_processor.extract_form_sections_bs4, html_inputs, args.rounds)
+    benchmarks["title_bs4"] = run_benchmark("title_bs4", title_bs4, html_inputs, args.rounds)
+    benchmarks["sanitize_actions"] = run_benchmark("sanitize_actions", fresh_actions, action_inputs, args.rounds)
+    benchmarks["validate_actions"] = run_benchmark("validate_actions", validate, validate_inputs, args.rounds)
+
+    results = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "backend": "lxml" if html_processor.etree is not None else "html.parser",
+        "rounds": args.rounds,
+        "corpus": output_stats(pages),
+        "benchmarks": benchmarks,
+    }
+    corpus = results["corpus"]
+    print(f"Sections: {corpus['sections_total']} total, {corpus['sections_per_page_mean']:.1f}/page "
+          f"(max {corpus['sections_per_page_max']}); output {corpus['output_chars_total']:,} chars, "
+          f"{corpus['output_tokens_total']:,} tokens{' (estimated)' if corpus['tokens_estimated'] else ''}")
+
+    output = args.output or os.path.join(RESULTS_DIR, f"corpus_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results saved to {output}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            if compare(results, json.load(f)):
+                sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+# benchmark_extraction.py
+import argparse
+import glob
+import os
+import time
+
+import html_processor
+
+CORPUS_GLOBS = [
+    os.path.join("resources", "html", "**", "*.html"),
+    os.path.join("html", "*.html"),
+    os.path.join("screenshots", "*.html"),
+]
+
+
+def load_corpus(patterns=CORPUS_GLOBS):
+    """Read every captured HTML page matching the given glob patterns."""
+    pages = []
+    for pattern in patterns:
+        for path in sorted(glob.glob(pattern, recursive=True)):
+            with open(path, "r", encoding="utf-8") as f:
+                pages.append((path, f.read()))
+    return pages
+
+
+def check_identical(pages):
+    """Return the paths whose sections differ between the reference and single-pass engines."""
+    mismatches = []
+    for path, html in pages:
+        if html_processor.extract_form_sections_bs4(html) != html_processor.extract_form_sections(html):
+            mismatches.append(path)
+    return mismatches
+
+
+def time_engine(extract, pages, rounds):
+    """Run extract over the corpus `rounds` times and return pages/sec."""
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for _, html in pages:
+            extract(html)
+    elapsed = time.perf_counter() - start
+    return (len(pages) * rounds) / elapsed if elapsed else float("inf")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark extract_form_sections on the captured HTML corpus.")
+    parser.add_argument("--rounds", type=int, default=3, help="passes over the corpus per engine")
+    parser.add_argument("patterns", nargs="*", help="glob patterns of HTML files (default: captured corpus)")
+    args = parser.parse_args()
+
+    pages = load_corpus(args.patterns or CORPUS_GLOBS)
+    if not pages:
+        print("No HTML pages found.")
+        return
+    total_kb = sum(len(html) for _, html in pages) / 1024
+    backend = "lxml" if html_processor.etree is not None else "html.parser"
+    print(f"Corpus: {len(pages)} pages, {total_kb:,.0f} KB. Single-pass backend: {backend}")
+
+    mismatches = check_identical(pages)
+    if mismatches:
+        print(f"[Warning] {len(mismatches)} pages differ between engines:")
+        for path in mismatches:
+            print(f"  {path}")
+    else:
+        print("Section text is identical on every page.")
+
+    old_rate = time_engine(html_processor.extract_form_sections_bs4, pages, args.rounds)
+    new_rate = time_engine(html_processor.extract_form_sections, pages, args.rounds)
+    print(f"bs4 reference : {old_rate:8.1f} pages/sec")
+    print(f"single-pass   : {new_rate:8.1f} pages/sec ({new_rate / old_rate:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
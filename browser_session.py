@@ -0,0 +1,172 @@
+# browser_session.py
+import os
+import time
+import glob
+import shutil
+
+from selenium.common.exceptions import WebDriverException
+
+SLIM_PROFILE_DIR = os.path.join("profiles", "slim")
+MAX_JOBS_PER_SESSION = 20
+
+# Everything a logged-in session needs; caches, history, extensions and the
+# rest of the personal profile are left behind.
+SLIM_PROFILE_FILES = (
+    "cookies.sqlite", "cookies.sqlite-wal",
+    "key4.db", "cert9.db", "logins.json",
+    "permissions.sqlite", "webappsstore.sqlite",
+)
+# localStorage/IndexedDB of these sites is kept too (storage/default/https+++www.seek.com.au, ...)
+KEEP_STORAGE_ORIGINS = ("seek.com.au",)
+
+# Runs in one tab and clears only that tab's origin (storage is per origin).
+# localStorage is kept for keep_origins unless arguments[0] is set. Returns
+# whether the origin is one of keep_origins, so the caller knows whether to
+# clear its cookies.
+RESET_SCRIPT = """
+var host = window.location.hostname, keep = arguments[1];
+var kept = keep.some(function (origin) { return host === origin || host.endsWith("." + origin); });
+try { window.sessionStorage.clear(); } catch (e) {}
+if (arguments[0] || !kept) { try { window.localStorage.clear(); } catch (e) {} }
+return {host: host, kept: kept};
+"""
+
+
+def build_slim_profile(source_profile, dest=SLIM_PROFILE_DIR, keep_origins=KEEP_STORAGE_ORIGINS, force=False):
+    """
+    Build (once) a small profile template holding only cookies and logged-in state
+    copied from source_profile. It is rebuilt when the source cookies are newer
+    than the template, or when force is set. Returns the template path.
+    """
+    if not source_profile or not os.path.isdir(source_profile):
+        print(f"[Session] Profile {source_profile} not found; starting without a profile.")
+        return None
+    source_cookies = os.path.join(source_profile, "cookies.sqlite")
+    dest_cookies = os.path.join(dest, "cookies.sqlite")
+    if not force and os.path.exists(dest_cookies):
+        if not os.path.exists(source_cookies) or os.path.getmtime(source_cookies) <= os.path.getmtime(dest_cookies):
+            return dest
+
+    start = time.perf_counter()
+    if os.path.isdir(dest):
+        shutil.rmtree(dest)
+    os.makedirs(dest)
+    copied = 0
+    for name in SLIM_PROFILE_FILES:
+        path = os.path.join(source_profile, name)
+        if os.path.exists(path):
+            shutil.copy2(path, os.path.join(dest, name))
+            copied += os.path.getsize(path)
+    for origin in keep_origins:
+        for path in glob.glob(os.path.join(source_profile, "storage", "default", f"*{origin}*")):
+            target = os.path.join(dest, os.path.relpath(path, source_profile))
+            shutil.copytree(path, target, ignore=shutil.ignore_patterns("cache"))
+            copied += sum(os.path.getsize(os.path.join(root, f))
+                          for root, _, files in os.walk(target) for f in files)
+    print(f"[Session] Built slim profile {dest} ({copied / 1024:,.0f} KB) "
+          f"in {time.perf_counter() - start:.2f}s")
+    return dest
+
+
+class BrowserSession:
+    """
+    Keeps one warm browser for sequential jobs.
+    acquire() starts a browser on first use and otherwise hands back the
+    running one after a reset (see reset() for exactly what is cleared). The
+    browser is recycled (quit and relaunched) after max_jobs jobs, or on the
+    next acquire() after a crash. Startup and reset times are recorded for
+    report().
+    """
+
+    def __init__(self, driver_factory, profile_path=None, max_jobs=MAX_JOBS_PER_SESSION,
+                 clear_local_storage=False, keep_origins=KEEP_STORAGE_ORIGINS):
+        self.driver_factory = driver_factory
+        self.profile_path = profile_path
+        self.max_jobs = max_jobs
+        self.clear_local_storage = clear_local_storage
+        self.keep_origins = keep_origins
+        self.driver = None
+        self.jobs_in_session = 0
+        self.startup_times = []
+        self.reset_times = []
+        self.recycles = 0
+
+    def acquire(self):
+        """Return a ready browser for the next job."""
+        if self.driver is not None and (self.jobs_in_session >= self.max_jobs or not self._is_alive()):
+            reason = "job limit reached" if self.jobs_in_session >= self.max_jobs else "browser not responding"
+            print(f"[Session] Recycling browser ({reason}).")
+            self.recycle()
+        if self.driver is None:
+            start = time.perf_counter()
+            self.driver = self.driver_factory(profile_path=self.profile_path)
+            self.startup_times.append(time.perf_counter() - start)
+            print(f"[Session] Browser started in {self.startup_times[-1]:.2f}s")
+        elif self.jobs_in_session:
+            self.reset()
+        self.jobs_in_session += 1
+        return self.driver
+
+    def reset(self):
+        """
+        Bring the warm browser back to a clean state without quitting it.
+        For the origin open in each tab: sessionStorage is cleared; for sites
+        outside keep_origins localStorage and cookies are cleared too, while
+        keep_origins (the logged-in sites) keep their cookies and keep
+        localStorage unless clear_local_storage is set. Extra tabs are then
+        closed and the first tab goes to about:blank. Origins a tab navigated
+        away from earlier in the job, IndexedDB and the HTTP cache are not
+        touched; they last until the browser is recycled.
+        """
+        start = time.perf_counter()
+        handles = self.driver.window_handles
+        for handle in reversed(handles):
+            self.driver.switch_to.window(handle)
+            self._clear_origin()
+            if handle != handles[0]:
+                self.driver.close()
+        self.driver.switch_to.window(handles[0])
+        self.driver.get("about:blank")
+        self.reset_times.append(time.perf_counter() - start)
+        print(f"[Session] Browser reset in {self.reset_times[-1]:.2f}s")
+
+    def recycle(self):
+        """Quit the current browser; the next acquire() starts a fresh one."""
+        if self.driver is not None:
+            self.recycles += 1
+        self.close()
+
+    def close(self):
+        if self.driver is not None:
+            try:
+                self.driver.quit()
+            except WebDriverException:
+                pass
+        self.driver = None
+        self.jobs_in_session = 0
+
+    def report(self):
+        """Print startup and reset timings for this session."""
+        if self.startup_times:
+            avg = sum(self.startup_times) / len(self.startup_times)
+            print(f"[Session] {len(self.startup_times)} browser starts, avg {avg:.2f}s "
+                  f"({self.recycles} recycles)")
+        if self.reset_times:
+            avg = sum(self.reset_times) / len(self.reset_times)
+            print(f"[Session] {len(self.reset_times)} warm resets, avg {avg:.2f}s")
+
+    def _clear_origin(self):
+        """Clear the storage (and, outside keep_origins, the cookies) of the current tab's origin."""
+        try:
+            origin = self.driver.execute_script(RESET_SCRIPT, self.clear_local_storage, list(self.keep_origins))
+            if origin and origin.get("host") and not origin.get("kept"):
+                self.driver.delete_all_cookies()  # WebDriver only sees the current document's cookies
+        except WebDriverException as e:
+            print(f"[Session] Could not clear tab storage ({e.msg}).")
+
+    def _is_alive(self):
+        try:
+            self.driver.window_handles
+            return True
+        except WebDriverException:
+            return False
@@ -0,0 +1,67 @@
+# candidate_profile.py
+# Personal details that playbook values refer to with placeholders such as
+# [NAME], [EMAIL] or [PHONE] (see the analyze_form prompt). Playbooks keep the
+# placeholders, so personal data never lands in the playbook store; the
+# executor fills them in right before typing. Values come from
+# candidate_profile.json ({"NAME": "...", "EMAIL": "...", ...}) and from
+# CANDIDATE_<PLACEHOLDER> environment variables (e.g. CANDIDATE_EMAIL, also
+# read from .env), which take precedence.
+import os
+import re
+import json
+import threading
+
+PROFILE_PATH = "candidate_profile.json"
+ENV_PREFIX = "CANDIDATE_"
+# Resolved by the upload step, not from the profile
+FILE_PLACEHOLDERS = ("RESUME_PATH", "COVER_LETTER_PATH")
+
+_PLACEHOLDER_RE = re.compile(r"\[([A-Z][A-Z0-9_]*)\]")
+
+
+def load_candidate_profile(path=PROFILE_PATH):
+    """{PLACEHOLDER: value} from the profile file and the environment."""
+    profile = {}
+    if path and os.path.exists(path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            profile.update({str(k).upper(): str(v) for k, v in data.items() if v is not None})
+        except (OSError, ValueError, AttributeError) as e:
+            print(f"[Profile] Could not read {path}: {e}")
+    for name, value in os.environ.items():
+        if name.startswith(ENV_PREFIX) and value:
+            profile[name[len(ENV_PREFIX):]] = value
+    return profile
+
+
+def fill_placeholders(value, profile):
+    """
+    Replace every [PLACEHOLDER] in value from profile.
+    Returns (filled value, names of placeholders the profile has no value for).
+    """
+    if not isinstance(value, str):
+        return value, []
+    missing = []
+
+    def replace(match):
+        name = match.group(1)
+        if name in profile:
+            return profile[name]
+        missing.append(name)
+        return match.group(0)
+
+    return _PLACEHOLDER_RE.sub(replace, value), missing
+
+
+_profile = None
+_profile_lock = threading.Lock()
+
+
+def get_candidate_profile():
+    """Return the process-wide candidate profile (loaded once)."""
+    global _profile
+    with _profile_lock:
+        if _profile is None:
+            _profile = load_candidate_profile()
+    return _profile
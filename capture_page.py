@@ -1,5 +1,5 @@
 import os
-from selenium.webdriver.common.by import By
+from screenshot_capture import capture_screenshot, FULL_PAGE
 
 def capture_step(driver, session_dir: str, step_name: str):
     """
@@ -13,21 +13,12 @@ def capture_step(driver, session_dir: str, step_name: str):
     img_path = os.path.join(session_dir, f"{step_name}.png")
     html_path = os.path.join(session_dir, f"{step_name}.html")
 
-    # Adjust window size to capture full page
+    # Full-page screenshot without resizing the window (native Firefox capture or stitched viewport tiles)
     try:
-        # Execute JS to get total page width/height for full-page screenshot
-        total_width = driver.execute_script("return document.body.parentNode.scrollWidth")
-        total_height = driver.execute_script("return document.body.parentNode.scrollHeight")
-        driver.set_window_size(total_width, total_height)
-    except Exception as e:
-        print(f"Warning: Could not resize window for full screenshot: {e}")
-        # Continue anyway with current window size
-
-    # Take screenshot of the full page by screenshotting the <body> element (to avoid scrollbar in image)
-    try:
-        body = driver.find_element(By.TAG_NAME, "body")
-        body.screenshot(img_path)
-        print(f"Saved screenshot: {img_path}")
+        png, method = capture_screenshot(driver, FULL_PAGE)
+        with open(img_path, "wb") as f:
+            f.write(png)
+        print(f"Saved screenshot ({method}): {img_path}")
     except Exception as e:
         print(f"[Error] Failed to capture screenshot: {e}")
 
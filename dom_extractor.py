@@ -0,0 +1,237 @@
+# dom_extractor.py
+# In-browser form extraction. Instead of pulling driver.page_source (the whole
+# serialized DOM) several times per step, EXTRACT_SCRIPT walks the live DOM once
+# inside the page and returns a compact JSON model: the form sections as text in
+# the same shape as html_processor.extract_form_sections(), the fields and
+# buttons, the first <h1>, a structural hash, the tag/attribute skeleton for
+# dom_fingerprint and optional keyword counts.
+from tracing import traced
+from dom_fingerprint import simhash
+
+EXTRACT_SCRIPT = r"""
+var keywords = arguments[0] || [];
+var REMOVED = {script: 1, style: 1, noscript: 1, header: 1, footer: 1, nav: 1, aside: 1};
+var HEADINGS = {h1: 1, h2: 1, h3: 1, h4: 1, h5: 1, h6: 1};
+var CONTROLS = {input: 1, textarea: 1, button: 1, select: 1};
+var EXCLUDED = {template: 1, rt: 1, rp: 1};
+var fields = [];
+var buttons = [];
+
+function tagOf(node) {
+  return node.nodeType === 1 ? node.tagName.toLowerCase() : null;
+}
+
+function flush(run, out) {
+  if (run.length) {
+    var text = run.join('').trim();
+    if (text) { out.push(text); }
+    run.length = 0;
+  }
+}
+
+function collectText(node, out, run, merged, excluded) {
+  for (var c = node.firstChild; c; c = c.nextSibling) {
+    if (c.nodeType === 3 || c.nodeType === 4) {
+      if (excluded) { continue; }
+      if (merged) { run.push(c.nodeValue); }
+      else { var t = c.nodeValue.trim(); if (t) { out.push(t); } }
+      continue;
+    }
+    var name = tagOf(c);
+    if (name && REMOVED[name]) { continue; }
+    flush(run, out);
+    if (!name) { continue; }
+    collectText(c, out, run, merged, excluded || !!EXCLUDED[name]);
+    flush(run, out);
+  }
+}
+
+function joinedText(node, merged) {
+  var out = [], run = [];
+  collectText(node, out, run, merged, false);
+  flush(run, out);
+  return out.join('');
+}
+
+function attr(el, key, dflt) {
+  var v = el.getAttribute(key);
+  return v === null ? dflt : v;
+}
+
+function labelOf(el) {
+  if (el.labels && el.labels.length) { return joinedText(el.labels[0], false); }
+  return attr(el, 'aria-label', '');
+}
+
+function placeholderFor(el, name) {
+  var p = '';
+  if (name === 'input') {
+    var type = attr(el, 'type', 'text');
+    if (type === 'hidden') { return ''; }
+    p = '[INPUT: type=' + type;
+    if (attr(el, 'name', '')) { p += ', name=' + el.getAttribute('name'); }
+    if (attr(el, 'placeholder', '')) { p += ', placeholder=' + el.getAttribute('placeholder'); }
+    if (type === 'radio' || type === 'checkbox') {
+      var value = attr(el, 'value', '');
+      if (value && ['on', 'off', ''].indexOf(value.toLowerCase()) < 0) { p += ', value=' + value; }
+    }
+    if (type === 'file') { p += ', file upload'; }
+    p += ']';
+    fields.push({tag: name, type: type, name: attr(el, 'name', ''), id: el.id || '', label: labelOf(el)});
+  } else if (name === 'textarea') {
+    p = '[TEXTAREA';
+    if (attr(el, 'name', '')) { p += ', name=' + el.getAttribute('name'); }
+    if (attr(el, 'placeholder', '')) { p += ', placeholder=' + el.getAttribute('placeholder'); }
+    p += ']';
+    fields.push({tag: name, type: 'textarea', name: attr(el, 'name', ''), id: el.id || '', label: labelOf(el)});
+  } else if (name === 'button') {
+    var btnType = attr(el, 'type', 'button');
+    var text = joinedText(el, true);
+    if ((btnType === 'submit' || btnType === 'button') && text) {
+      p = '[BUTTON: ' + text + ']';
+      buttons.push({text: text, type: btnType, id: el.id || ''});
+    }
+  } else if (name === 'select') {
+    var options = [];
+    var opts = el.getElementsByTagName('option');
+    for (var i = 0; i < opts.length; i++) {
+      var o = joinedText(opts[i], true);
+      if (o) { options.push(o); }
+    }
+    var summary = '';
+    if (options.length > 5) {
+      summary = options.slice(0, 3).join(', ') + ', ... (+' + (options.length - 3) + ' more options)';
+    } else {
+      summary = options.join(', ');
+    }
+    p = '[SELECT';
+    if (attr(el, 'name', '')) { p += ', name=' + el.getAttribute('name'); }
+    if (summary) { p += ', options=' + summary; }
+    p += ']';
+    fields.push({tag: name, type: 'select', name: attr(el, 'name', ''), id: el.id || '', label: labelOf(el)});
+  }
+  return p;
+}
+
+function walkSection(node, out, run, excluded) {
+  for (var c = node.firstChild; c; c = c.nextSibling) {
+    if (c.nodeType === 3 || c.nodeType === 4) {
+      if (!excluded) { run.push(c.nodeValue); }
+      continue;
+    }
+    var name = tagOf(c);
+    if (name && REMOVED[name]) { continue; }
+    flush(run, out);
+    if (!name) { continue; }
+    if (CONTROLS[name]) {
+      var p = placeholderFor(c, name);
+      if (p) { out.push(p); }
+      continue;
+    }
+    walkSection(c, out, run, excluded || !!EXCLUDED[name]);
+    flush(run, out);
+  }
+}
+
+function renderSection(el, name, prevHeading) {
+  var title = '';
+  if (name === 'fieldset') {
+    if (el.hasAttribute('aria-label')) { title = el.getAttribute('aria-label'); }
+    var legend = el.querySelector('legend');
+    if (legend) { title = joinedText(legend, false) || title; }
+  }
+  if (!title && prevHeading) { title = joinedText(prevHeading, false); }
+  var out = [], run = [];
+  walkSection(el, out, run, false);
+  flush(run, out);
+  var text = out.join('\n');
+  if (title) { text = title + ':\n' + text; }
+  return text.trim();
+}
+
+// One pass over the document: sections, their preceding headings, the structural hash
+// and the tag/attribute skeleton (see dom_fingerprint.skeleton_token)
+var fieldsets = [], firstForm = null, body = null, lastHeading = null, h1 = null;
+var skeleton = {};
+var SKELETON_ATTRS = ['type', 'name', 'role'];
+function skeletonToken(node, name) {
+  var token = (tagOf(node.parentNode) || '') + '>' + name;
+  for (var a = 0; a < SKELETON_ATTRS.length; a++) {
+    var value = node.getAttribute(SKELETON_ATTRS[a]);
+    if (value) { token += '[' + SKELETON_ATTRS[a] + '=' + value.slice(0, 64) + ']'; }
+  }
+  return token;
+}
+var hash = 0x811c9dc5;
+function mix(s) {
+  for (var i = 0; i < s.length; i++) {
+    hash ^= s.charCodeAt(i);
+    hash = Math.imul(hash, 0x01000193) >>> 0;
+  }
+}
+var stack = [document.documentElement];
+while (stack.length) {
+  var node = stack.pop();
+  var name = tagOf(node);
+  if (!name || REMOVED[name]) { continue; }
+  mix('<' + name + (node.getAttribute('type') || '') + (node.getAttribute('name') || '') + '>');
+  var token = skeletonToken(node, name);
+  skeleton[token] = (skeleton[token] || 0) + 1;
+  if (name === 'fieldset') { fieldsets.push([node, name, lastHeading]); }
+  else if (name === 'form' && !firstForm) { firstForm = [node, name, lastHeading]; }
+  else if (name === 'body' && !body) { body = [node, name, lastHeading]; }
+  if (HEADINGS[name]) { lastHeading = node; if (name === 'h1' && !h1) { h1 = node; } }
+  for (var c = node.lastChild; c; c = c.previousSibling) {
+    if (c.nodeType === 1) { stack.push(c); }
+  }
+}
+
+var candidates = fieldsets;
+if (!candidates.length) {
+  // If no fieldsets, use the main form (if any) or body as one section
+  var container = firstForm || body;
+  candidates = container ? [container] : [];
+}
+var sections = [];
+for (var s = 0; s < candidates.length; s++) {
+  var text = renderSection(candidates[s][0], candidates[s][1], candidates[s][2]);
+  if (text) { sections.push(text); }
+}
+mix(sections.join('\n\n'));
+
+var counts = {};
+if (keywords.length) {
+  var html = document.documentElement.outerHTML.toLowerCase();
+  for (var k = 0; k < keywords.length; k++) {
+    counts[keywords[k]] = html.split(keywords[k]).length - 1;
+  }
+}
+
+return {
+  url: location.href,
+  title: h1 ? joinedText(h1, false) : '',
+  sections: sections,
+  fields: fields,
+  buttons: buttons,
+  structure_hash: ('00000000' + hash.toString(16)).slice(-8),
+  skeleton: skeleton,
+  keyword_counts: counts
+};
+"""
+
+
+@traced("extract_dom_model", cat="extract")
+def extract_dom_model(driver, keywords=()):
+    """
+    Run the in-page extractor and return the compact form model:
+    {"url", "title", "sections", "fields", "buttons", "structure_hash", "skeleton",
+    "dom_fingerprint", "keyword_counts"}. dom_fingerprint is the simhash of the
+    tag/attribute skeleton (see dom_fingerprint.py), for near-duplicate checks.
+    keywords (lowercase strings) are counted in the page markup inside the browser,
+    so callers never need page_source for simple content checks.
+    """
+    model = driver.execute_script(EXTRACT_SCRIPT, list(keywords))
+    if not isinstance(model, dict):
+        raise RuntimeError(f"DOM extractor returned unexpected result: {model!r}")
+    model["dom_fingerprint"] = simhash(model.get("skeleton") or {})
+    return model
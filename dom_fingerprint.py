@@ -0,0 +1,144 @@
+# dom_fingerprint.py
+# Structural fingerprint of a page: a 64-bit simhash over its tag/attribute
+# skeleton. Every element (outside script/style/nav and the like) contributes
+# one token, "parent>tag[type=..][name=..][role=..]", weighted so form controls
+# and headings count more than layout wrappers and long repeated lists count
+# less. Pages that differ in a few nodes (an error message, a spinner, a new
+# job card) stay within a few bits of each other, while a different form step
+# moves many bits. dom_extractor collects the skeleton in the page during its
+# single DOM pass; html_skeleton() builds the same tokens from captured HTML.
+import math
+import hashlib
+from functools import lru_cache
+
+try:
+    from lxml import etree
+except ImportError:  # fall back to bs4's html.parser tree
+    etree = None
+from bs4 import BeautifulSoup
+
+from form_fingerprint import mask_volatile_ids
+
+SIMHASH_BITS = 64
+NEAR_DUPLICATE_DISTANCE = 3  # bits; at most this many differing bits counts as the same page
+SKELETON_ATTRS = ("type", "name", "role")
+MAX_ATTR_CHARS = 64  # dom_extractor truncates attribute values the same way
+
+# Same exclusions as html_processor / dom_extractor
+REMOVED_TAGS = frozenset(["script", "style", "noscript", "header", "footer", "nav", "aside"])
+_HEAVY_TAGS = frozenset(["input", "textarea", "button", "select", "form", "fieldset", "label",
+                         "h1", "h2", "h3", "h4", "h5", "h6"])
+HEAVY_WEIGHT = 4.0
+
+
+def skeleton_token(parent, tag, attrs):
+    """The skeleton token of one element (attrs: a mapping with .get)."""
+    token = f"{parent or ''}>{tag}"
+    for key in SKELETON_ATTRS:
+        value = attrs.get(key)
+        if value:
+            token += f"[{key}={value[:MAX_ATTR_CHARS]}]"
+    return token
+
+
+def html_skeleton(html):
+    """{token: count} for captured HTML, matching what dom_extractor collects in the page."""
+    skeleton = {}
+    if not html:
+        return skeleton
+    if etree is not None:
+        parser = etree.HTMLParser(encoding="utf-8", huge_tree=True)
+        root = etree.fromstring(html.encode("utf-8", "replace"), parser)
+        stack = [(root, None)] if root is not None else []
+        while stack:
+            node, parent = stack.pop()
+            tag = node.tag
+            if not isinstance(tag, str) or tag in REMOVED_TAGS:
+                continue
+            token = skeleton_token(parent, tag, node.attrib)
+            skeleton[token] = skeleton.get(token, 0) + 1
+            stack.extend((child, tag) for child in node)
+        return skeleton
+    soup = BeautifulSoup(html, "html.parser")
+    for node in soup.find_all(True):
+        if node.name in REMOVED_TAGS or any(p.name in REMOVED_TAGS for p in node.parents):
+            continue
+        parent = node.parent.name if node.parent is not None and node.parent.name != "[document]" else None
+        attrs = {key: " ".join(v) if isinstance(v, list) else v for key, v in node.attrs.items()}
+        token = skeleton_token(parent, node.name, attrs)
+        skeleton[token] = skeleton.get(token, 0) + 1
+    return skeleton
+
+
+@lru_cache(maxsize=65536)
+def _token_hash(token):
+    digest = hashlib.blake2b(mask_volatile_ids(token).encode("utf-8"), digest_size=SIMHASH_BITS // 8).digest()
+    return int.from_bytes(digest, "big")
+
+
+def _token_weight(token, count):
+    tag = token.split(">", 1)[-1].split("[", 1)[0]
+    base = HEAVY_WEIGHT if tag in _HEAVY_TAGS else 1.0
+    return base * (1 + math.log2(count))  # 50 identical list items should not outweigh the form
+
+
+def simhash(skeleton):
+    """64-bit simhash of a {token: count} skeleton, as 16 hex characters (None when empty)."""
+    if not skeleton:
+        return None
+    totals = [0.0] * SIMHASH_BITS
+    for token, count in skeleton.items():
+        h = _token_hash(token)
+        w = _token_weight(token, count)
+        for bit in range(SIMHASH_BITS):
+            if (h >> bit) & 1:
+                totals[bit] += w
+            else:
+                totals[bit] -= w
+    value = 0
+    for bit, total in enumerate(totals):
+        if total > 0:
+            value |= 1 << bit
+    return f"{value:016x}"
+
+
+def html_fingerprint(html):
+    """Structural fingerprint of captured HTML."""
+    return simhash(html_skeleton(html))
+
+
+def distance(a, b):
+    """Number of differing bits between two fingerprints (SIMHASH_BITS when either is missing)."""
+    if a is None or b is None:
+        return SIMHASH_BITS
+    return bin(int(a, 16) ^ int(b, 16)).count("1")
+
+
+def is_near_duplicate(a, b, threshold=NEAR_DUPLICATE_DISTANCE):
+    return distance(a, b) <= threshold
+
+
+class StateHistory:
+    """
+    Page states seen during one application, for loop detection. A state
+    repeats when its key (the parts that must match exactly, e.g. the URL and
+    the form fingerprint) comes back with a near-duplicate DOM fingerprint.
+    """
+
+    def __init__(self, threshold=NEAR_DUPLICATE_DISTANCE):
+        self.threshold = threshold
+        self.states = []  # (key, fingerprint, label)
+
+    def match(self, key, fingerprint):
+        """The label of the closest earlier near-duplicate state with this key, or None."""
+        best = None
+        for seen_key, seen_fingerprint, label in self.states:
+            if seen_key != key:
+                continue
+            d = distance(seen_fingerprint, fingerprint)
+            if d <= self.threshold and (best is None or d < best[0]):
+                best = (d, label)
+        return best[1] if best else None
+
+    def add(self, key, fingerprint, label=None):
+        self.states.append((key, fingerprint, label if label is not None else len(self.states)))
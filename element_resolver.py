@@ -0,0 +1,110 @@
+# element_resolver.py
+# Resolve every selector of a playbook in one execute_script round trip.
+# For each CSS or XPath selector the page reports whether it is valid, how many
+# elements match, whether the first match is visible, and hands back that
+# element, so executors can fail fast on selectors that cannot match and only
+# wait for elements that may still appear.
+import time
+
+from tracing import span
+
+ELEMENT_TIMEOUT = 10  # seconds to wait for an element that an earlier action may reveal
+FIRST_ACTION_TIMEOUT = 3  # seconds for an element nothing could have revealed (the page may still be rendering)
+POLL_INTERVAL = 0.25
+
+# Actions that can reveal elements missing from the page (e.g. a "Yes" radio showing a follow-up field)
+REVEALING_ACTIONS = ("click", "select", "check", "uncheck")
+
+RESOLVE_SCRIPT = r"""
+var queries = arguments[0];
+var results = [];
+function isVisible(el) {
+  if (!el.getClientRects().length) { return false; }
+  var style = window.getComputedStyle(el);
+  return style.visibility !== 'hidden' && style.display !== 'none' && style.opacity !== '0';
+}
+for (var i = 0; i < queries.length; i++) {
+  var selector = queries[i][0], xpath = queries[i][1];
+  var result = {valid: true, count: 0, visible: false, element: null, error: null};
+  try {
+    var matches = [];
+    if (xpath) {
+      var snapshot = document.evaluate(selector, document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+      for (var j = 0; j < snapshot.snapshotLength; j++) {
+        if (snapshot.snapshotItem(j).nodeType === 1) { matches.push(snapshot.snapshotItem(j)); }
+      }
+    } else {
+      matches = document.querySelectorAll(selector);
+    }
+    result.count = matches.length;
+    if (matches.length) {
+      result.element = matches[0];
+      result.visible = isVisible(matches[0]);
+    }
+  } catch (e) {
+    result.valid = false;
+    result.error = String(e && e.message || e);
+  }
+  results.push(result);
+}
+return results;
+"""
+
+
+def uses_xpath(action):
+    """Whether an action's selector is XPath (explicit use_xpath flag, else a leading / or ()."""
+    if "use_xpath" in action:
+        return bool(action["use_xpath"])
+    selector = action.get("selector") or action.get("target") or ""
+    return selector.startswith(("/", "("))
+
+
+def selector_key(action):
+    return (action.get("selector") or action.get("target") or "", uses_xpath(action))
+
+
+def resolve_selectors(driver, selectors):
+    """
+    Resolve (selector, use_xpath) pairs in one round trip. Returns one dict per
+    pair: {"valid", "count", "visible", "unique", "element", "error"}.
+    """
+    selectors = list(selectors)
+    if not selectors:
+        return []
+    with span("resolve_selectors", cat="selenium", count=len(selectors)):
+        results = driver.execute_script(RESOLVE_SCRIPT, [[s, bool(x)] for s, x in selectors])
+    for result in results:
+        result["unique"] = result["count"] == 1
+    return results
+
+
+def resolve_actions(driver, actions):
+    """
+    Resolve the selectors of every action at once.
+    Returns {(selector, use_xpath): result}; actions without a selector are skipped.
+    """
+    keys = []
+    for action in actions:
+        key = selector_key(action)
+        if key[0] and key not in keys:
+            keys.append(key)
+    resolved = dict(zip(keys, resolve_selectors(driver, keys)))
+    missing = sum(1 for r in resolved.values() if r["valid"] and not r["count"])
+    invalid = sum(1 for r in resolved.values() if not r["valid"])
+    ambiguous = sum(1 for r in resolved.values() if r["count"] > 1)
+    print(f"[Resolver] {len(resolved)} selectors: {len(resolved) - missing - invalid} present, "
+          f"{missing} missing, {invalid} invalid, {ambiguous} not unique")
+    return resolved
+
+
+def wait_for_resolved(driver, selector, use_xpath=False, timeout=ELEMENT_TIMEOUT):
+    """
+    Poll one selector with the resolver until it matches or timeout seconds pass.
+    Returns the last resolution; an invalid selector returns immediately.
+    """
+    deadline = time.perf_counter() + timeout
+    while True:
+        result = resolve_selectors(driver, [(selector, use_xpath)])[0]
+        if not result["valid"] or result["count"] or time.perf_counter() >= deadline:
+            return result
+        time.sleep(POLL_INTERVAL)
@@ -20,20 +20,4 @@ def slugify_title(title):
 
 def ensure_dir(path):
     """Create the directory (and parent dirs) if it doesn't exist."""
-    os.makedirs(path, exist_ok=True)
-
-def get_unique_filename(dir_path, base_name, extension):
-    """
-    Generate a unique file path in dir_path for base_name with the given extension.
-    Avoids overwriting by adding suffix.
-    """
-    # Start with no suffix
-    file_name = f"{base_name}.{extension}"
-    file_path = os.path.join(dir_path, file_name)
-    counter = 1
-    # Increment suffix until a free name is found
-    while os.path.exists(file_path):
-        file_name = f"{base_name}_{counter}.{extension}"
-        file_path = os.path.join(dir_path, file_name)
-        counter += 1
-    return file_path
\ No newline at end of file
+    os.makedirs(path, exist_ok=True)
\ No newline at end of file
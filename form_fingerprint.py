@@ -0,0 +1,49 @@
+# form_fingerprint.py
+import re
+import hashlib
+
+# React-style generated ids (":r1:", ":r2f:") and long digit runs (job or
+# question ids) change between page loads and jobs, so they are masked
+_VOLATILE_ID_RE = re.compile(r":r[0-9a-z]+:")
+_LONG_NUMBER_RE = re.compile(r"\d{5,}")
+
+# Placeholders written by html_processor / dom_extractor for form controls
+_CONTROL_RE = re.compile(r"\[(INPUT|TEXTAREA|SELECT|BUTTON)([^\]\n]*)\]")
+_ATTR_RE = re.compile(r"(type|name)=([^,\]]*)")
+
+
+def mask_volatile_ids(text):
+    """Replace generated ids that differ between page loads with stable tokens."""
+    text = _VOLATILE_ID_RE.sub(":r:", text)
+    return _LONG_NUMBER_RE.sub("#", text)
+
+
+def form_structure(sections):
+    """
+    The structural skeleton of a form step: one entry per control, in page order.
+    Inputs, textareas and selects contribute (kind, type, name); buttons
+    contribute their label. Values, placeholders and free text are ignored.
+    """
+    structure = []
+    for section in sections or []:
+        for kind, body in _CONTROL_RE.findall(section):
+            if kind == "BUTTON":
+                structure.append(("BUTTON", body.lstrip(": ").strip().lower()))
+                continue
+            attrs = dict(_ATTR_RE.findall(body))
+            control_type = attrs.get("type", kind.lower()).strip()
+            structure.append((kind, control_type, mask_volatile_ids(attrs.get("name", "").strip())))
+    return structure
+
+
+def form_fingerprint(sections):
+    """
+    Short, stable hash identifying a form step by its structure, so the same
+    step on another job (or another visit) maps to the same playbook.
+    Returns None when the sections contain no form controls.
+    """
+    structure = form_structure(sections)
+    if not structure:
+        return None
+    canonical = "\n".join("|".join(entry) for entry in structure)
+    return hashlib.sha1(canonical.encode("utf-8")).hexdigest()[:16]
@@ -0,0 +1,68 @@
+# html_delta.py
+# Compact deltas between two captures of the same page. The HTML is split into
+# tag-sized chunks (everything up to and including each ">"), the chunks are
+# matched with difflib, and the delta lists chunk ranges copied from the base
+# plus the literal text of everything else, zlib-compressed. Consecutive steps
+# of one application usually differ by a few nodes, so a delta is a few KB
+# where the page is a few hundred.
+import re
+import json
+import zlib
+import difflib
+
+DELTA_VERSION = 1
+MAX_CHUNKS = 60000  # beyond this matching gets slow; store the page in full instead
+
+_CHUNK_RE = re.compile(r"[^>]*>|[^>]+$")
+
+
+def split_chunks(html):
+    return _CHUNK_RE.findall(html)
+
+
+def make_delta(base, html):
+    """
+    The delta turning base into html, as compressed bytes; None when either
+    page is too large to diff quickly.
+    """
+    base_chunks = split_chunks(base)
+    chunks = split_chunks(html)
+    if len(base_chunks) > MAX_CHUNKS or len(chunks) > MAX_CHUNKS:
+        return None
+    # Pages mostly change in one region: trim the common head and tail before matching
+    head = 0
+    limit = min(len(base_chunks), len(chunks))
+    while head < limit and base_chunks[head] == chunks[head]:
+        head += 1
+    tail = 0
+    while tail < limit - head and base_chunks[-1 - tail] == chunks[-1 - tail]:
+        tail += 1
+    ops = [[0, head]] if head else []
+    matcher = difflib.SequenceMatcher(None, base_chunks[head:len(base_chunks) - tail],
+                                      chunks[head:len(chunks) - tail])
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            ops.append([head + i1, head + i2])
+        elif j2 > j1:
+            ops.append("".join(chunks[head + j1:head + j2]))
+    if tail:
+        ops.append([len(base_chunks) - tail, len(base_chunks)])
+    payload = {"v": DELTA_VERSION, "base_chunks": len(base_chunks), "ops": ops}
+    return zlib.compress(json.dumps(payload, separators=(",", ":")).encode("utf-8"), 9)
+
+
+def apply_delta(base, delta):
+    """Rebuild the page from its base and a delta made by make_delta()."""
+    payload = json.loads(zlib.decompress(delta).decode("utf-8"))
+    if payload.get("v") != DELTA_VERSION:
+        raise ValueError(f"Unsupported HTML delta version: {payload.get('v')}")
+    base_chunks = split_chunks(base)
+    if len(base_chunks) != payload["base_chunks"]:
+        raise ValueError("HTML delta does not match its base page")
+    out = []
+    for op in payload["ops"]:
+        if isinstance(op, str):
+            out.append(op)
+        else:
+            out.extend(base_chunks[op[0]:op[1]])
+    return "".join(out)
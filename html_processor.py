@@ -1,10 +1,39 @@
 # html_processor.py
-from bs4 import BeautifulSoup, NavigableString
+import re
+from bs4 import BeautifulSoup, NavigableString, Comment
+
+try:
+    from lxml import etree
+except ImportError:  # lxml is optional; the single-pass engine falls back to bs4's html.parser tree
+    etree = None
+
+# Elements dropped from the page before any section is processed
+REMOVED_TAGS = frozenset(['script', 'style', 'noscript', 'header', 'footer', 'nav', 'aside'])
+HEADING_TAGS = frozenset(['h1', 'h2', 'h3', 'h4', 'h5', 'h6'])
+CONTROL_TAGS = frozenset(['input', 'textarea', 'button', 'select'])
+_BODY_TAG_RE = re.compile(r"<body[\s>/]", re.IGNORECASE)
+
 
 def extract_form_sections(html_content):
     """
     Parse the HTML content and extract relevant form sections as text.
     Returns a list of section text chunks.
+
+    Uses a single parse (lxml when installed, otherwise html.parser) and one
+    walk per section; the output matches extract_form_sections_bs4().
+    """
+    if etree is not None:
+        tree = _LxmlTree(html_content)
+    else:
+        tree = _SoupTree(html_content)
+    return _extract_sections(tree, has_body_tag=bool(_BODY_TAG_RE.search(html_content)))
+
+
+def extract_form_sections_bs4(html_content):
+    """
+    Original BeautifulSoup implementation of extract_form_sections(): parses the
+    page, then re-parses every section. Kept as the reference for the
+    single-pass engine (see benchmark_extraction.py).
     """
     soup = BeautifulSoup(html_content, "html.parser")
 
@@ -146,4 +175,303 @@ def _process_section(section_element):
     if title:
         # Prepend the section title as a header
         section_text = title + ":\n" + section_text
-    return section_text.strip()
\ No newline at end of file
+    return section_text.strip()
+
+# ---------------------------------------------------------------------------
+# Single-pass engine
+#
+# The functions below reproduce extract_form_sections_bs4() without building
+# a second soup per section. The reference implementation serializes each
+# section and re-parses it, which merges text that was only separated by a
+# removed element (script, style, ...), and then calls get_text(); the walkers
+# here replay exactly that, so the output is identical.
+# ---------------------------------------------------------------------------
+
+# Text under these tags is a special string type in bs4 and is skipped by get_text()
+_EXCLUDED_TEXT_TAGS = frozenset(['template', 'rt', 'rp'])
+_MARKER = object()  # comments, doctypes and other non-text nodes
+
+
+class _LxmlTree:
+    """Minimal tree interface over an lxml HTML document."""
+
+    def __init__(self, html_content):
+        parser = etree.HTMLParser(encoding="utf-8", remove_comments=False, huge_tree=True)
+        self.root = etree.fromstring(html_content.encode("utf-8", "replace"), parser)
+
+    @staticmethod
+    def tag(node):
+        name = node.tag
+        return name if isinstance(name, str) else None
+
+    @staticmethod
+    def get(node, key, default=None):
+        return node.get(key, default)
+
+    @staticmethod
+    def has_attr(node, key):
+        return key in node.attrib
+
+    @staticmethod
+    def items(node):
+        """Children in document order: str for text, nodes for everything else."""
+        if node.text is not None:
+            yield node.text
+        for child in node:
+            yield child
+            if child.tail is not None:
+                yield child.tail
+
+
+class _SoupTree:
+    """The same interface over a single html.parser soup (used when lxml is missing)."""
+
+    _TEXT_TYPES = (NavigableString,)
+
+    def __init__(self, html_content):
+        self.root = BeautifulSoup(html_content, "html.parser")
+
+    @staticmethod
+    def tag(node):
+        return None if isinstance(node, NavigableString) else node.name
+
+    @staticmethod
+    def get(node, key, default=None):
+        return node.get(key, default)
+
+    @staticmethod
+    def has_attr(node, key):
+        return node.has_attr(key)
+
+    @staticmethod
+    def items(node):
+        for child in node.contents:
+            if isinstance(child, NavigableString):
+                if type(child) is NavigableString or type(child).__name__ == "CData":
+                    yield str(child)
+                else:
+                    yield _MARKER
+            else:
+                yield child
+
+
+def _extract_sections(tree, has_body_tag=True):
+    """Walk the document once to find the sections, then render each of them."""
+    root = tree.root
+    if root is None:
+        return []
+
+    fieldsets = []
+    first_form = None
+    body = None
+    last_heading = None
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        if node is _MARKER or isinstance(node, str):
+            continue
+        name = tree.tag(node)
+        if name is None or name in REMOVED_TAGS:
+            continue
+        if name == 'fieldset':
+            fieldsets.append((node, name, last_heading))
+        elif name == 'form' and first_form is None:
+            first_form = (node, name, last_heading)
+        elif name == 'body' and body is None and has_body_tag:
+            body = (node, name, last_heading)
+        if name in HEADING_TAGS:
+            last_heading = node
+        stack.extend(reversed([child for child in tree.items(node) if not isinstance(child, str)]))
+
+    if fieldsets:
+        candidates = fieldsets
+    else:
+        # If no fieldsets, use the main form (if any) or body as one section
+        container = first_form or body
+        candidates = [container] if container else []
+
+    sections = []
+    for node, name, prev_heading in candidates:
+        section_text = _render_section(tree, node, name, prev_heading)
+        if section_text:
+            sections.append(section_text)
+    return sections
+
+
+def _render_section(tree, node, name, prev_heading):
+    """Single-pass equivalent of _process_section()."""
+    title = ""
+    if name == 'fieldset':
+        if tree.has_attr(node, 'aria-label'):
+            title = tree.get(node, 'aria-label')
+        legend = _find_first(tree, node, 'legend')
+        if legend is not None:
+            title = _joined_text(tree, legend, merged=False) or title
+    if not title and prev_heading is not None:
+        title = _joined_text(tree, prev_heading, merged=False)
+
+    strings = []
+    run = []
+    _walk_section(tree, node, strings, run, False)
+    _flush_run(run, strings)
+
+    section_text = "\n".join(strings)
+    if title:
+        section_text = title + ":\n" + section_text
+    return section_text.strip()
+
+
+def _flush_run(run, out):
+    if run:
+        text = "".join(run).strip()
+        if text:
+            out.append(text)
+        run.clear()
+
+
+def _walk_section(tree, node, out, run, excluded):
+    """Collect the section's text, replacing form controls with placeholders."""
+    for item in tree.items(node):
+        if isinstance(item, str):
+            if not excluded:
+                run.append(item)
+            continue
+        if item is _MARKER:
+            _flush_run(run, out)
+            continue
+        name = tree.tag(item)
+        if name in REMOVED_TAGS:
+            continue  # dropped before serialization, so surrounding text merges
+        _flush_run(run, out)
+        if name is None:
+            continue
+        if name in CONTROL_TAGS:
+            placeholder = _control_placeholder(tree, item, name, excluded)
+            if placeholder:
+                out.append(placeholder)
+            continue
+        _walk_section(tree, item, out, run, excluded or name in _EXCLUDED_TEXT_TAGS)
+        _flush_run(run, out)
+
+
+def _collect_text(tree, node, out, run, merged, excluded):
+    for item in tree.items(node):
+        if isinstance(item, str):
+            if excluded:
+                continue
+            if merged:
+                run.append(item)
+            else:
+                text = item.strip()
+                if text:
+                    out.append(text)
+            continue
+        if item is _MARKER:
+            _flush_run(run, out)
+            continue
+        name = tree.tag(item)
+        if name in REMOVED_TAGS:
+            continue
+        _flush_run(run, out)
+        if name is None:
+            continue
+        _collect_text(tree, item, out, run, merged, excluded or name in _EXCLUDED_TEXT_TAGS)
+        _flush_run(run, out)
+
+
+def _joined_text(tree, node, merged, excluded=False):
+    """
+    Equivalent of get_text(strip=True). merged=True reproduces a node from a
+    re-parsed section, where text around removed elements became one string.
+    """
+    out = []
+    run = []
+    _collect_text(tree, node, out, run, merged, excluded)
+    _flush_run(run, out)
+    return "".join(out)
+
+
+def _find_first(tree, node, tag_name):
+    """First descendant element with the given tag, in document order."""
+    for item in tree.items(node):
+        if isinstance(item, str) or item is _MARKER:
+            continue
+        name = tree.tag(item)
+        if name is None or name in REMOVED_TAGS:
+            continue
+        if name == tag_name:
+            return item
+        found = _find_first(tree, item, tag_name)
+        if found is not None:
+            return found
+    return None
+
+
+def _find_all(tree, node, tag_name, excluded, found):
+    for item in tree.items(node):
+        if isinstance(item, str) or item is _MARKER:
+            continue
+        name = tree.tag(item)
+        if name is None or name in REMOVED_TAGS:
+            continue
+        if name == tag_name:
+            found.append((item, excluded))
+        _find_all(tree, item, tag_name, excluded or name in _EXCLUDED_TEXT_TAGS, found)
+    return found
+
+
+def _control_placeholder(tree, inp, tag_name, excluded):
+    """Placeholder text for a form control, or "" when the control is dropped."""
+    placeholder = ""
+    if tag_name == 'input':
+        input_type = tree.get(inp, 'type', 'text')
+        if input_type == 'hidden':
+            return ""
+        placeholder = f"[INPUT: type={input_type}"
+        name = tree.get(inp, 'name')
+        if name:
+            placeholder += f", name={name}"
+        if tree.get(inp, 'placeholder'):
+            placeholder += f", placeholder={tree.get(inp, 'placeholder')}"
+        if input_type in ['radio', 'checkbox']:
+            value = tree.get(inp, 'value')
+            if value and value.lower() not in ["on", "off", ""]:
+                placeholder += f", value={value}"
+        if input_type == 'file':
+            placeholder += ", file upload"
+        placeholder += "]"
+    elif tag_name == 'textarea':
+        placeholder = "[TEXTAREA"
+        name = tree.get(inp, 'name')
+        if name:
+            placeholder += f", name={name}"
+        if tree.get(inp, 'placeholder'):
+            placeholder += f", placeholder={tree.get(inp, 'placeholder')}"
+        placeholder += "]"
+    elif tag_name == 'button':
+        btn_type = tree.get(inp, 'type', 'button')
+        btn_text = _joined_text(tree, inp, merged=True, excluded=excluded)
+        if btn_type in ['submit', 'button'] and btn_text:
+            placeholder = f"[BUTTON: {btn_text}]"
+        else:
+            return ""
+    elif tag_name == 'select':
+        name = tree.get(inp, 'name')
+        options = [
+            _joined_text(tree, opt, merged=True, excluded=opt_excluded)
+            for opt, opt_excluded in _find_all(tree, inp, 'option', excluded, [])
+        ]
+        options = [opt for opt in options if opt]
+        opt_summary = ""
+        if options:
+            if len(options) > 5:
+                opt_summary = ", ".join(options[:3]) + f", ... (+{len(options)-3} more options)"
+            else:
+                opt_summary = ", ".join(options)
+        placeholder = "[SELECT"
+        if name:
+            placeholder += f", name={name}"
+        if opt_summary:
+            placeholder += f", options={opt_summary}"
+        placeholder += "]"
+    return placeholder
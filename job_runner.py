@@ -0,0 +1,211 @@
+# job_runner.py
+import os
+import sys
+import time
+import queue
+import argparse
+import threading
+from urllib.parse import urlparse
+
+from selenium.common.exceptions import TimeoutException, WebDriverException
+
+from application_agent import ApplicationAgent
+from file_utils import slugify_title
+from launch_browser import create_driver, RESUME_PATH, COVER_LETTER_PATH, PROFILE_PATH
+from browser_session import BrowserSession, build_slim_profile, MAX_JOBS_PER_SESSION
+from snapshot_writer import flush_snapshots
+from snapshot_store import get_snapshot_store
+from page_waits import get_wait_stats
+
+DEFAULT_CONCURRENCY = 2
+APPLY_XPATH = "//a[contains(., 'Apply') or contains(., 'apply')]"
+STATUS_INTERVAL = 30  # seconds between status lines while jobs are running
+
+
+def job_id_for_url(index, job_url):
+    """Snapshot namespace for one job: its position in the queue plus the URL's last path segment."""
+    tail = urlparse(job_url).path.rstrip("/").rsplit("/", 1)[-1]
+    return f"job_{index:03d}_{slugify_title(tail) or 'page'}"
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers (None when empty)."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * pct // 100))
+    return ordered[int(rank) - 1]
+
+
+class JobRunner:
+    """
+    Runs ApplicationAgent over a queue of job URLs with up to `concurrency`
+    workers in parallel. Every worker owns a BrowserSession (its own browser,
+    started from a copy of the slim profile template and kept warm between
+    jobs) and every job gets its own snapshot namespace (job_id). A worker
+    whose browser dies starts a new one.
+    """
+
+    def __init__(self, job_urls, concurrency=DEFAULT_CONCURRENCY, driver_factory=create_driver,
+                 resume_path=RESUME_PATH, cover_letter_path=COVER_LETTER_PATH, apply_xpath=APPLY_XPATH,
+                 profile_path=None, max_jobs_per_session=MAX_JOBS_PER_SESSION):
+        self.job_urls = list(job_urls)
+        self.concurrency = max(1, min(concurrency, len(self.job_urls) or 1))
+        self.driver_factory = driver_factory
+        self.resume_path = resume_path
+        self.cover_letter_path = cover_letter_path
+        self.apply_xpath = apply_xpath
+        self.profile_path = profile_path
+        self.max_jobs_per_session = max_jobs_per_session
+        self.sessions = []
+        self.results = []
+        self.worker_status = {}
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+
+    def run(self):
+        """Process every queued job, print status while running and return the summary."""
+        for index, job_url in enumerate(self.job_urls, start=1):
+            self._queue.put((index, job_url))
+
+        start = time.perf_counter()
+        workers = []
+        for n in range(self.concurrency):
+            name = f"worker-{n + 1}"
+            self._set_status(name, state="starting", job=None, done=0, failed=0)
+            thread = threading.Thread(target=self._worker, args=(name,), name=name, daemon=True)
+            thread.start()
+            workers.append(thread)
+
+        last_status = time.perf_counter()
+        while any(thread.is_alive() for thread in workers):
+            for thread in workers:
+                thread.join(timeout=1)
+            if time.perf_counter() - last_status >= STATUS_INTERVAL:
+                self.print_status()
+                last_status = time.perf_counter()
+
+        flush_snapshots()
+        summary = self.summary(time.perf_counter() - start)
+        self.print_summary(summary)
+        return summary
+
+    def print_status(self):
+        with self._lock:
+            status = {name: dict(s) for name, s in self.worker_status.items()}
+        print(f"[Runner] {self._queue.qsize()} jobs queued, {len(self.results)} finished")
+        for name, s in sorted(status.items()):
+            job = f" {s['job']}" if s["job"] else ""
+            print(f"[Runner]   {name}: {s['state']}{job} (done {s['done']}, failed {s['failed']})")
+
+    def summary(self, elapsed):
+        """Throughput and latency of the finished run."""
+        durations = [r["duration"] for r in self.results]
+        succeeded = sum(1 for r in self.results if r["status"] == "succeeded")
+        hours = elapsed / 3600
+        return {
+            "jobs": len(self.results),
+            "succeeded": succeeded,
+            "failed": len(self.results) - succeeded,
+            "concurrency": self.concurrency,
+            "elapsed": elapsed,
+            "applications_per_hour": succeeded / hours if hours else 0.0,
+            "p50": percentile(durations, 50),
+            "p95": percentile(durations, 95),
+        }
+
+    def print_summary(self, summary):
+        print("\n[Runner] ===== Summary =====")
+        print(f"[Runner] {summary['jobs']} jobs with {summary['concurrency']} workers in {summary['elapsed']:.1f}s: "
+              f"{summary['succeeded']} succeeded, {summary['failed']} failed.")
+        print(f"[Runner] Throughput: {summary['applications_per_hour']:.1f} applications/hour")
+        if summary["p50"] is not None:
+            print(f"[Runner] Time per application: p50 {summary['p50']:.1f}s, p95 {summary['p95']:.1f}s")
+        get_wait_stats().report()
+        get_snapshot_store().report()
+        for session in self.sessions:
+            session.report()
+
+    def _worker(self, name):
+        session = BrowserSession(self.driver_factory, profile_path=self.profile_path,
+                                 max_jobs=self.max_jobs_per_session)
+        with self._lock:
+            self.sessions.append(session)
+        try:
+            while True:
+                try:
+                    index, job_url = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                job_id = job_id_for_url(index, job_url)
+                self._set_status(name, state="preparing browser", job=job_id)
+                try:
+                    driver = session.acquire()
+                except Exception as e:
+                    print(f"[Runner] {name} could not prepare a browser: {e}")
+                    self._record(name, job_id, job_url, "failed", 0.0, str(e))
+                    session.recycle()
+                    continue
+                self._set_status(name, state="applying", job=job_id)
+                started = time.perf_counter()
+                status, error = "failed", None
+                try:
+                    agent = ApplicationAgent(driver, job_id, "N-A", self.resume_path, self.cover_letter_path)
+                    if agent.run_application(job_url, apply_xpath=self.apply_xpath):
+                        status = "succeeded"
+                except TimeoutException as e:
+                    # e.g. no Apply button: the job failed, the browser is fine
+                    error = str(e).splitlines()[0] if str(e) else type(e).__name__
+                    print(f"[Runner] {name}: timed out on {job_id}: {error}")
+                except WebDriverException as e:
+                    error = str(e).splitlines()[0] if str(e) else type(e).__name__
+                    print(f"[Runner] {name}: browser error on {job_id}, restarting browser: {error}")
+                    session.recycle()
+                except Exception as e:
+                    error = str(e)
+                    print(f"[Runner] {name}: {job_id} failed: {e}")
+                self._record(name, job_id, job_url, status, time.perf_counter() - started, error)
+        finally:
+            session.close()
+            self._set_status(name, state="finished", job=None)
+
+    def _record(self, name, job_id, job_url, status, duration, error=None):
+        with self._lock:
+            self.results.append({"worker": name, "job_id": job_id, "url": job_url,
+                                 "status": status, "duration": duration, "error": error})
+            worker = self.worker_status[name]
+            worker["done" if status == "succeeded" else "failed"] += 1
+        print(f"[Runner] {name}: {job_id} {status} in {duration:.1f}s")
+
+    def _set_status(self, name, **fields):
+        with self._lock:
+            self.worker_status.setdefault(name, {}).update(fields)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply to several jobs in parallel.")
+    parser.add_argument("urls", nargs="*", help="job page URLs")
+    parser.add_argument("--jobs-file", help="file with one job URL per line")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="number of parallel browsers")
+    parser.add_argument("--jobs-per-session", type=int, default=MAX_JOBS_PER_SESSION,
+                        help="jobs a warm browser handles before it is recycled")
+    args = parser.parse_args()
+
+    job_urls = list(args.urls)
+    if args.jobs_file:
+        with open(args.jobs_file, "r", encoding="utf-8") as f:
+            job_urls.extend(line.strip() for line in f if line.strip() and not line.startswith("#"))
+    if not job_urls:
+        parser.print_usage()
+        sys.exit(1)
+    for path in (RESUME_PATH, COVER_LETTER_PATH):
+        if not os.path.exists(path):
+            print(f"[Warning] {path} not found; uploads will fail.")
+
+    profile_path = build_slim_profile(PROFILE_PATH)
+    JobRunner(job_urls, concurrency=args.concurrency, profile_path=profile_path,
+              max_jobs_per_session=args.jobs_per_session).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,6 @@
 import os
 import time
 import json
-from bs4 import BeautifulSoup
 from urllib.parse import urlparse
 from selenium import webdriver
 from selenium.webdriver.common.by import By
@@ -11,16 +10,27 @@ from selenium.common.exceptions import TimeoutException, WebDriverException, NoS
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 
-from page_capture import save_page_snapshot
+from page_capture import capture_page_snapshot
+from snapshot_writer import flush_snapshots
+from snapshot_store import get_snapshot_store
+from dom_extractor import extract_dom_model
+from dom_fingerprint import StateHistory, distance, NEAR_DUPLICATE_DISTANCE
+from llm_cache import get_llm_cache
+from page_waits import wait_for_upload_result, wait_for_page_ready, get_wait_stats, UPLOAD_SUCCESS, UPLOAD_FAILURE
 from analyze_form import analyze_form_page
-from playbook_manager import load_playbook, save_playbook
-from playbook_executor import execute_playbook_actions
+from playbook_manager import load_step_playbook, append_step_actions
+from form_fingerprint import form_fingerprint
+from playbook_executor import execute_playbook_actions, action_key, get_review_stats
+from selector_validator import contains_to_xpath, validate_actions
+from browser_session import BrowserSession, build_slim_profile
+from tracing import job_trace, span
 import html_processor
 # Removed import for get_smart_step_summary
-import re # Import re for sanitize_actions
 
 RESUME_PATH = os.path.abspath("./resume.pdf")
 COVER_LETTER_PATH = os.path.abspath("./cover_letter.pdf")
+PROFILE_PATH = "/Users/umairsaeed/Library/Application Support/Firefox/Profiles/4219wmga.default-release"
+ARCHIVE_SNAPSHOTS = True  # also fetch full HTML + screenshot each step and archive them
 
 # Keep the sanitize_actions function
 def sanitize_actions(actions):
@@ -28,12 +38,10 @@ def sanitize_actions(actions):
     for action in actions:
         selector = action.get("selector", "")
         if ":contains(" in selector:
-            # Convert to XPath if we detect :contains
-            text_match = re.findall(r":contains\(['\"]?(.*?)['\"]?\)", selector)
-            if text_match:
-                text = text_match[0]
-                # Simple XPath fallback assuming it's a button
-                action["selector"] = f"//button[contains(text(), '{text}')]"
+            # Convert to XPath if we detect :contains (rewrites are cached per selector)
+            xpath = contains_to_xpath(selector)
+            if xpath:
+                action["selector"] = xpath
                 action["use_xpath"] = True
             else:
                 print(f"Warning: Skipping malformed selector with :contains(): {selector}")
@@ -44,23 +52,33 @@ def sanitize_actions(actions):
     return valid_actions
 
 # Keep the wait_for_upload_completion function
-def wait_for_upload_completion(driver, keyword="uploaded", timeout=15):
-    try:
-        WebDriverWait(driver, timeout).until(lambda d: keyword in d.page_source.lower())
+def wait_for_upload_completion(driver, keyword="uploaded", timeout=15, file_name=None):
+    """
+    Wait for the upload widget to report completion (MutationObserver in the page).
+    Returns UPLOAD_SUCCESS, UPLOAD_FAILURE or UPLOAD_TIMEOUT.
+    """
+    result = wait_for_upload_result(driver, file_name=file_name, success_keywords=(keyword,), timeout=timeout)
+    if result == UPLOAD_SUCCESS:
         print("Upload completion detected.")
-        return True
-    except TimeoutException:
+    elif result == UPLOAD_FAILURE:
+        print("[Error] Upload widget reported a failure.")
+    else:
         print("Upload completion NOT detected within timeout.")
-        return False
-
-def main():
-    profile_path = "/Users/umairsaeed/Library/Application Support/Firefox/Profiles/4219wmga.default-release"
+    return result
 
+def create_driver(profile_path=PROFILE_PATH, headless=False):
+    """
+    Launch Firefox with the given profile. Selenium copies the profile into a
+    temporary directory, so every driver gets its own isolated session.
+    """
     options = FirefoxOptions()
     options.set_preference("dom.webnotifications.enabled", False)
     options.add_argument("--width=1280")
     options.add_argument("--height=900")
-    options.profile = profile_path
+    if headless:
+        options.add_argument("--headless")
+    if profile_path:
+        options.profile = profile_path
 
     print("Initializing Firefox Service...")
     service = FirefoxService()
@@ -70,190 +88,191 @@ def main():
     driver = webdriver.Firefox(service=service, options=options)
     print("Firefox WebDriver initialized successfully.")
 
-    driver.implicitly_wait(10)
+    # No implicit wait: element lookups go through element_resolver, which polls a
+    # missing selector briefly (FIRST_ACTION_TIMEOUT) or, when an earlier click may
+    # have revealed it, for up to ELEMENT_TIMEOUT
+    driver.implicitly_wait(0)
+    return driver
+
+def main():
+    session = BrowserSession(create_driver, profile_path=build_slim_profile(PROFILE_PATH))
+    driver = session.acquire()
     job_id = "seek_application"
     job_title = "N-A"
     step_counter = 0
 
     try:
-        job_url = "https://www.seek.com.au/job/83589298"
-        print(f"Opening job page: {job_url}")
-        driver.get(job_url)
-
-        print("Waiting for Apply button...")
-        WebDriverWait(driver, 20).until(
-            EC.presence_of_element_located((By.XPATH, "//a[contains(., 'Apply') or contains(., 'apply')]"))
-        )
-        step_counter += 1
-
-        soup = BeautifulSoup(driver.page_source, 'html.parser')
-        job_title_element = soup.select_one('h1')
-        job_title = job_title_element.get_text(strip=True) if job_title_element else 'N-A'
-
-        save_page_snapshot(driver, job_id, job_title, f"nav_{step_counter}")
-
-        apply_button = driver.find_element(By.XPATH, "//a[contains(., 'Apply') or contains(., 'apply')]")
-        print("Clicking Apply...")
-        apply_button.click()
-        time.sleep(5)
-        step_counter += 1
-
-        visited_states = set()
-        executed_action_keys = set()
-        domain_safe = None
-        max_steps = 10
-
-        while step_counter < max_steps:
-            current_url = driver.current_url
-            domain = urlparse(current_url).netloc
-            print(f"\n--- Processing Step {step_counter + 1} ---")
-            print(f"Current URL: {current_url}")
-
-            state_signature = hash(current_url + "_" + str(len(driver.page_source)))
-            if state_signature in visited_states:
-                print("Detected a repeating page state (possible loop). Ending automation.")
-                break
-            visited_states.add(state_signature)
-
-            html_file_path, screenshot_path = save_page_snapshot(driver, job_id, job_title, f"step_{step_counter + 1}")
-
-            if not os.path.exists(html_file_path):
-                print(f"[Error] HTML snapshot not found: {html_file_path}")
-                break
-
-            with open(html_file_path, "r", encoding="utf-8") as f:
-                current_html = f.read()
-
-            # Removed call to get_smart_step_summary
-
-            form_sections = html_processor.extract_form_sections(current_html)
-            if not form_sections:
-                print("No form sections found. Assuming application complete or next step pending.")
-                break
-
-            print(f"Found {len(form_sections)} form sections on the page.")
-            playbook = load_playbook(domain)
-
-            actions_to_execute = []
-            if playbook and 'actions' in playbook:
-                print(f"Loaded existing playbook for {domain}.")
-                for action in playbook['actions']:
-                    key = f"{action.get('action')}|{action.get('selector')}|{action.get('value')}"
-                    if key not in executed_action_keys:
-                        actions_to_execute.append(action)
-            else:
-                playbook = {"actions": []}
-
-            if not actions_to_execute or form_sections:
-                print("Generating actions with LLM...")
-                try:
-                    truncated_html = current_html[:400000] # Truncate HTML for LLM
-                    raw_new_actions = analyze_form_page(truncated_html, screenshot_path) # Get raw actions
-
-                    if raw_new_actions:
-                        print(f"LLM generated {len(raw_new_actions)} raw new actions.")
-                        # Sanitize the raw actions
-                        sanitized_new_actions = sanitize_actions(raw_new_actions)
-                        print(f"Sanitized to {len(sanitized_new_actions)} valid actions.")
-
-                        # Append sanitized actions to playbook and actions_to_execute
-                        for action in sanitized_new_actions:
-                            key = f"{action.get('action')}|{action.get('selector')}|{action.get('value')}"
-                            if key not in executed_action_keys:
-                                playbook['actions'].append(action)
-                                actions_to_execute.append(action)
-
-                        save_playbook(domain, playbook)
-                        print("Appended new actions to playbook and saved.")
-                    else:
-                        print("[Error] LLM failed to generate new actions. Cannot proceed.")
-                        break
-                except Exception as e:
-                    print(f"[Error] Failed to generate new actions via LLM: {e}")
-                    break
+        with job_trace(job_id):
+            job_url = "https://www.seek.com.au/job/83589298"
+            print(f"Opening job page: {job_url}")
+            with span("driver.get", cat="selenium", url=job_url):
+                driver.get(job_url)
+
+            print("Waiting for Apply button...")
+            with span("wait for Apply button", cat="wait"):
+                WebDriverWait(driver, 20).until(
+                    EC.presence_of_element_located((By.XPATH, "//a[contains(., 'Apply') or contains(., 'apply')]"))
+                )
+            step_counter += 1
 
-            if actions_to_execute:
-                print(f"Executing {len(actions_to_execute)} actions...")
-                # Execute actions one by one to allow post-action review in executor
-                for idx, action in enumerate(actions_to_execute):
-                    action_key = f"{action.get('action')}|{action.get('selector')}|{action.get('value')}"
-                    if action_key in executed_action_keys:
-                        continue # Skip if already executed
+            job_title = extract_dom_model(driver)["title"] or 'N-A'
 
-                    try:
-                        print(f"Executing action {idx+1}: {action.get('action')} - {action.get('field')}")
-                        # Pass only the current action to the executor
-                        single_action_success = execute_playbook_actions(driver, [action], RESUME_PATH, COVER_LETTER_PATH)
-                        if not single_action_success:
-                            print(f"[Error] Failed to execute action {action}")
-                            # Decide how to handle single action failure - break or continue?
-                            # For now, break the loop on failure
-                            break # Exit the actions execution loop
-                        executed_action_keys.add(action_key) # Mark as executed after successful execution
-
-                        # Add specific wait after upload
-                        if action.get("action") == "upload":
-                            wait_for_upload_completion(driver)
+            if ARCHIVE_SNAPSHOTS:
+                capture_page_snapshot(driver, job_id, job_title, f"nav_{step_counter}")
 
-                    except WebDriverException as ex:
-                        print(f"[Error] Unexpected error during action '{action.get('field')}': {ex}")
-                        # Decide how to handle unexpected WebDriver errors - break or continue?
-                        # For now, break the loop on error
-                        break # Exit the actions execution loop
+            apply_button = driver.find_element(By.XPATH, "//a[contains(., 'Apply') or contains(., 'apply')]")
+            print("Clicking Apply...")
+            apply_button.click()
+            wait_for_page_ready(driver, "after Apply", replaces=5)
+            step_counter += 1
 
-                # Check if the actions execution loop was broken due to failure
-                # If single_action_success is False, it means the inner loop broke
-                if 'single_action_success' in locals() and not single_action_success:
-                    break # Exit the main application loop if an action failed
+            visited_states = StateHistory()
+            executed_action_keys = set()
+            domain_safe = None
+            max_steps = 10
+
+            while step_counter < max_steps:
+                current_url = driver.current_url
+                domain = urlparse(current_url).netloc
+                print(f"\n--- Processing Step {step_counter + 1} ---")
+                print(f"Current URL: {current_url}")
+
+                # One in-page pass gives the sections and a structural fingerprint; no page_source transfer
+                page_model = extract_dom_model(driver)
+                form_sections = page_model["sections"]
+                # Playbooks are keyed by the step's structure (field names, types, button labels)
+                fingerprint = form_fingerprint(form_sections)
+                # Same URL and form with a near-identical DOM skeleton (e.g. only an error message added)
+                state_key = (current_url, fingerprint)
+                repeated_step = visited_states.match(state_key, page_model["dom_fingerprint"])
+                if repeated_step is not None:
+                    print(f"Detected a repeating page state (same structure as step {repeated_step + 1}, possible loop). Ending automation.")
+                    break
+                visited_states.add(state_key, page_model["dom_fingerprint"], step_counter)
 
+                snapshot = None
+                if ARCHIVE_SNAPSHOTS:
+                    snapshot = capture_page_snapshot(driver, job_id, job_title, f"step_{step_counter + 1}", form_sections=form_sections)
 
-            else:
-                print("No actions to execute in this step.")
-
-            # Note: The post-action snapshot and form section check logic is now primarily
-            # handled within the execute_playbook_actions function for each individual action.
-            # The loop will continue to the next step if execute_playbook_actions returns True.
-
-
-            # After executing actions (or if no actions), wait briefly before next step check
-            time.sleep(2)
-
-            # Check if the page has changed or updated significantly before the next step
-            # This is a simple check; more sophisticated checks might be needed for complex SPAs
-            # This check is now less critical as form_sections check is done after each action in executor
-            # but keeping it as a fallback.
-            new_url = driver.current_url
-            new_html_len = len(driver.page_source)
-            if new_url == current_url and new_html_len == len(current_html):
-                 print("Warning: Page content did not change after executing actions.")
-                 # Decide how to handle this - maybe break or try LLM again?
-                 # For now, we rely on the form_sections check at the start of the next loop iteration.
-            else:
-                 print("Page content updated.")
+                if not form_sections:
+                    print("No form sections found. Assuming application complete or next step pending.")
+                    break
 
+                print(f"Found {len(form_sections)} form sections on the page.")
+                print(f"Form step fingerprint: {fingerprint}")
+                with span("load_step_playbook", cat="playbook", fingerprint=fingerprint):
+                    playbook = load_step_playbook(domain, fingerprint)
+
+                actions_to_execute = []
+                if playbook and 'actions' in playbook:
+                    print(f"Loaded existing playbook for step {fingerprint} on {domain}; skipping LLM.")
+                    for action in playbook['actions']:
+                        key = action_key(action)
+                        if key not in executed_action_keys:
+                            actions_to_execute.append(action)
+
+                if not actions_to_execute:
+                    print("Generating actions with LLM...")
+                    try:
+                        raw_new_actions = analyze_form_page("", form_sections=form_sections) # Get raw actions from the extracted sections
+
+                        if raw_new_actions:
+                            print(f"LLM generated {len(raw_new_actions)} raw new actions.")
+                            # Sanitize the raw actions
+                            sanitized_new_actions = sanitize_actions(raw_new_actions)
+                            print(f"Sanitized to {len(sanitized_new_actions)} valid actions.")
+                            # Check the selectors against this step's HTML before any browser wait
+                            page_html = snapshot.html if snapshot is not None else driver.page_source
+                            sanitized_new_actions, _ = validate_actions(sanitized_new_actions, page_html)
+                            if not sanitized_new_actions:
+                                print("[Error] None of the generated actions match this page. Cannot proceed.")
+                                break
+
+                            # Queue sanitized actions; the store only appends ones it has not seen
+                            for action in sanitized_new_actions:
+                                key = action_key(action)
+                                if key not in executed_action_keys:
+                                    actions_to_execute.append(action)
+
+                            if fingerprint:
+                                append_step_actions(domain, fingerprint, sanitized_new_actions)
+                        else:
+                            print("[Error] LLM failed to generate new actions. Cannot proceed.")
+                            break
+                    except Exception as e:
+                        print(f"[Error] Failed to generate new actions via LLM: {e}")
+                        break
 
-            # Add a Smart Loop Exit (Fail-Safe)
-            # Check for too many identical file upload steps
-            html_after_actions = driver.page_source.lower() # Need to get current page source again
-            if step_counter > 4 and html_after_actions.count("resume") > 3 and html_after_actions.count("cover letter") > 3:
-                print("⚠️ Repeated upload step detected multiple times. Assuming the form is stuck. Ending.")
-                break
-            # End Smart Loop Exit
+                if actions_to_execute:
+                    print(f"Executing {len(actions_to_execute)} actions...")
+                    # One executor call per step: runs of non-upload actions execute in the page,
+                    # uploads wait for their widget, and the page is reviewed after each run or upload
+                    try:
+                        actions_succeeded = execute_playbook_actions(driver, actions_to_execute, RESUME_PATH,
+                                                                     COVER_LETTER_PATH, executed=executed_action_keys)
+                    except WebDriverException as ex:
+                        print(f"[Error] Unexpected WebDriver error while executing actions: {ex}")
+                        actions_succeeded = False
+                    if not actions_succeeded:
+                        print("[Error] Failed to execute this step's actions. Ending automation.")
+                        break # Exit the main application loop if an action failed
+
+                else:
+                    print("No actions to execute in this step.")
+
+                # Note: The post-action snapshot and LLM review happen inside execute_playbook_actions
+                # after each batched run or upload.
+
+
+                # After executing actions (or if no actions), wait briefly before next step check
+                wait_for_page_ready(driver, "between steps", replaces=2)
+
+                # Check if the page has changed or updated significantly before the next step
+                # This is a simple check; more sophisticated checks might be needed for complex SPAs
+                # This check is now less critical as form_sections check is done after each action in executor
+                # but keeping it as a fallback.
+                after_model = extract_dom_model(driver, keywords=("resume", "cover letter"))
+                change = distance(page_model["dom_fingerprint"], after_model["dom_fingerprint"])
+                if (after_model["url"] == current_url and change <= NEAR_DUPLICATE_DISTANCE
+                        and form_fingerprint(after_model["sections"]) == fingerprint):
+                     print(f"Warning: Page content did not change after executing actions ({change} bits differ).")
+                     # Decide how to handle this - maybe break or try LLM again?
+                     # For now, we rely on the form_sections check at the start of the next loop iteration.
+                else:
+                     print(f"Page content updated ({change} bits differ).")
+
+
+                # Add a Smart Loop Exit (Fail-Safe)
+                # Check for too many identical file upload steps
+                keyword_counts = after_model["keyword_counts"] # Counted in the browser, no page_source needed
+                if step_counter > 4 and keyword_counts["resume"] > 3 and keyword_counts["cover letter"] > 3:
+                    print("⚠️ Repeated upload step detected multiple times. Assuming the form is stuck. Ending.")
+                    break
+                # End Smart Loop Exit
 
 
-            # Increment step counter
-            step_counter += 1
+                # Increment step counter
+                step_counter += 1
 
-        # Check if the loop exited due to max steps limit
-        if step_counter >= max_steps:
-            print(f"Maximum number of steps ({max_steps}) reached. Ending automation.")
+            # Check if the loop exited due to max steps limit
+            if step_counter >= max_steps:
+                print(f"Maximum number of steps ({max_steps}) reached. Ending automation.")
 
 
     except Exception as e:
         print(f"[Error] An unexpected exception occurred during the application process: {e}")
 
     finally:
-        driver.quit()
+        flush_snapshots()  # make sure every background snapshot write reached the disk
+        get_wait_stats().report()
+        get_snapshot_store().report()
+        get_review_stats().report()
+        llm_cache = get_llm_cache()
+        if llm_cache is not None:
+            stats = llm_cache.stats()
+            print(f"[LLM cache] {stats['hits']} hits, {stats['misses']} misses, {stats['entries']} entries cached.")
+        session.report()
+        session.close()
         print("Browser closed.")
 
 if __name__ == "__main__":
@@ -14,8 +14,10 @@ from selenium.common.exceptions import TimeoutException
 from page_capture import save_page_snapshot
 from analyze_form import analyze_form_page
 from playbook_manager import load_playbook, save_playbook
-from playbook_executor import execute_playbook_actions
-from llm_agent import analyze_page_with_context
+from playbook_executor import execute_playbook_actions, action_key
+from dom_extractor import extract_dom_model
+from dom_fingerprint import StateHistory
+from form_fingerprint import form_fingerprint
 
 RESUME_PATH = os.path.abspath("./resume.pdf")
 COVER_LETTER_PATH = os.path.abspath("./cover_letter.pdf")
@@ -69,7 +71,7 @@ def main():
         time.sleep(5)
         step_counter += 1
 
-        visited_states = set()
+        visited_states = StateHistory()
         executed_action_keys = set()
 
         while step_counter < max_steps:
@@ -78,11 +80,13 @@ def main():
             print(f"\n--- Processing Step {step_counter + 1} ---")
             print(f"Current URL: {current_url}")
 
-            state_signature = hash(current_url + "_" + str(len(driver.page_source)))
-            if state_signature in visited_states:
+            # Structural fingerprint from one in-page pass instead of the length of page_source
+            page_model = extract_dom_model(driver)
+            state_key = (current_url, form_fingerprint(page_model["sections"]))
+            if visited_states.match(state_key, page_model["dom_fingerprint"]) is not None:
                 print("Detected a repeating page state. Ending automation.")
                 break
-            visited_states.add(state_signature)
+            visited_states.add(state_key, page_model["dom_fingerprint"])
 
             html_path, screenshot_path = save_page_snapshot(driver, job_id, job_title, f"step_{step_counter + 1}")
             current_html = open(html_path, encoding="utf-8").read()
@@ -92,7 +96,7 @@ def main():
 
             if not playbook or 'actions' not in playbook:
                 print("No playbook found. Generating new actions...")
-                new_actions = analyze_form_page(current_html[:400000], screenshot_path)
+                new_actions = analyze_form_page(current_html, screenshot_path)
                 if new_actions:
                     playbook = {"actions": new_actions}
                     save_playbook(domain, playbook)
@@ -103,42 +107,29 @@ def main():
             else:
                 print(f"Loaded existing playbook for {domain}.")
                 for action in playbook['actions']:
-                    key = f"{action['action']}|{action['selector']}|{action.get('value')}"
-                    if key not in executed_action_keys:
+                    if action_key(action) not in executed_action_keys:
                         actions_to_execute.append(action)
 
-            for idx, action in enumerate(actions_to_execute):
-                field = action.get("field", "Unknown")
-                print(f"Executing action {idx+1}: {action['action']} - {field}")
-
-                # Skip if already handled
-                if "resume" in field.lower() and resume_uploaded:
-                    continue
-                if "cover letter" in field.lower() and cover_letter_uploaded:
-                    continue
-
-                success = execute_playbook_actions(driver, [action], RESUME_PATH, COVER_LETTER_PATH)
-                executed_action_keys.add(f"{action['action']}|{action['selector']}|action.get('value')")
-
-                post_html_path, post_screenshot_path = save_page_snapshot(driver, job_id, job_title, f"post_action_{idx+1}_{field.replace(' ', '_')}")
-                post_html = open(post_html_path, encoding="utf-8").read()
-
-                print("Analyzing effect of last action with LLM...")
-                summary_analysis = analyze_page_with_context(post_html[:400000], post_screenshot_path)
-                print(f"\n🖼️ Screenshot summary:\n{post_screenshot_path}")
-                print(f"🧾 HTML summary:\n{post_html_path}")
-                print(f"🔮 LLM-suggested next action:\n{summary_analysis}\n")
-
-                summary_text = summary_analysis.get("summary", "").lower()
-                if "resume uploaded" in summary_text:
-                    resume_uploaded = True
-                if "cover letter uploaded" in summary_text:
-                    cover_letter_uploaded = True
-                if "error" in summary_text:
-                    print("❌ LLM reported an error, stopping.")
-                    break
-
-                time.sleep(2)
+            # Skip uploads already handled earlier in the application
+            actions_to_execute = [
+                action for action in actions_to_execute
+                if not ("resume" in action.get("field", "").lower() and resume_uploaded)
+                and not ("cover letter" in action.get("field", "").lower() and cover_letter_uploaded)
+            ]
+            print(f"Executing {len(actions_to_execute)} actions...")
+            # One executor call per step: it batches runs of non-upload actions and
+            # reviews the page with the LLM after each run or upload
+            success = execute_playbook_actions(driver, actions_to_execute, RESUME_PATH, COVER_LETTER_PATH,
+                                               executed=executed_action_keys)
+            for action in actions_to_execute:
+                if action["action"] == "upload" and action_key(action) in executed_action_keys:
+                    if action.get("value") == "[RESUME_PATH]":
+                        resume_uploaded = True
+                    elif action.get("value") == "[COVER_LETTER_PATH]":
+                        cover_letter_uploaded = True
+            if not success:
+                print("❌ Action execution failed, stopping.")
+                break
 
             step_counter += 1
 
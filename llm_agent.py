@@ -1,55 +1,132 @@
-import os
 import json
-import base64
 import re
-from openai import OpenAI
-from dotenv import load_dotenv
-
-load_dotenv()
-api_key = os.getenv("OPENAI_API_KEY")
-client = OpenAI(api_key=api_key)
+import hashlib
+import time
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from llm_transport import get_chat_client
+from vision_payload import screenshot_data_url
+from perceptual_hash import dhash
+from llm_cache import get_llm_cache, make_cache_key
+from prompt_budget import pack_sections
+from selector_validator import contains_to_xpath
+from tracing import traced
+import html_processor
 
 MODEL_NAME = "gpt-4o"
 MAX_CHARS_SINGLE = 15000
+MAX_SECTION_CONCURRENCY = 4  # section prompts in flight at once for long forms
+SECTION_RETRIES = 1  # extra attempts for a section whose prompt failed or could not be parsed
+PAGE_ANALYSIS_TOKEN_BUDGET = 3500  # form text sent with the screenshot
+# Bump these when the corresponding prompt changes so cached responses are not reused
+PLAYBOOK_PROMPT_VERSION = "generate_playbook/1"
+PAGE_ANALYSIS_PROMPT_VERSION = "analyze_page_with_context/2"
 
 def sanitize_actions(actions):
     valid = []
     for a in actions:
         if ":contains" in a.get("selector", ""):
-            print(f"[Sanitizer] Skipping invalid selector: {a['selector']}")
-            continue
+            xpath = contains_to_xpath(a["selector"])
+            if not xpath:
+                print(f"[Sanitizer] Skipping invalid selector: {a['selector']}")
+                continue
+            a = dict(a, selector=xpath, use_xpath=True)
         valid.append(a)
     return valid
 
-def generate_playbook(sections, model=MODEL_NAME):
+@traced("llm.generate_playbook", cat="llm")
+def generate_playbook(sections, model=MODEL_NAME, max_concurrency=MAX_SECTION_CONCURRENCY):
+    cache = get_llm_cache()
+    cache_key = make_cache_key(sections, PLAYBOOK_PROMPT_VERSION, model)
+    if cache is not None:
+        cached_plan = cache.get(cache_key)
+        if cached_plan is not None:
+            print("[LLM] Playbook served from cache.")
+            return cached_plan
+
     combined = "\n\n".join(sections)
     if len(combined) <= MAX_CHARS_SINGLE:
         prompt = _build_full_prompt(sections)
-        response = client.chat.completions.create(
+        response = get_chat_client().chat.completions.create(
             model=model,
             messages=prompt,
             temperature=0
         )
         content = response.choices[0].message.content
         plan = _parse_json(content)
+        if isinstance(plan, list):
+            plan = {"actions": plan}
+        elif not isinstance(plan, dict):
+            print("[LLM] Could not parse the playbook response.")
+            plan = {"actions": [], "failed_sections": list(range(1, len(sections) + 1))}
     else:
-        plan = {"actions": []}
-        for idx, section in enumerate(sections):
-            prompt = _build_section_prompt(section, idx + 1)
-            response = client.chat.completions.create(
-                model=model,
-                messages=prompt,
-                temperature=0
-            )
-            content = response.choices[0].message.content
-            part = _parse_json(content)
-            if part:
-                plan["actions"].extend(part if isinstance(part, list) else part.get("actions", []))
+        plan = _generate_section_plans(sections, model, max_concurrency)
     if "actions" in plan:
         plan["actions"] = sanitize_actions(plan["actions"])
         print(f"[LLM] Plan sanitized to {len(plan['actions'])} actions.")
+    if cache is not None and plan and plan.get("actions") and not plan.get("failed_sections"):
+        cache.put(cache_key, plan, meta={"prompt_version": PLAYBOOK_PROMPT_VERSION})
     return plan
 
+def _generate_section_plans(sections, model, max_concurrency):
+    """
+    Send one prompt per section, up to max_concurrency at a time, and merge the
+    actions back in section order. A section that fails (or whose response
+    cannot be parsed) is retried up to SECTION_RETRIES times; one that still
+    fails is reported in plan["failed_sections"] (1-based) instead of failing
+    the whole plan. Callers must not store such a partial plan as the step's
+    playbook.
+    """
+    start = time.perf_counter()
+    workers = max(1, min(max_concurrency, len(sections)))
+    results = [None] * len(sections)
+    pending = list(range(len(sections)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="llm-section") as pool:
+        for attempt in range(SECTION_RETRIES + 1):
+            if attempt:
+                print(f"[LLM] Retrying {len(pending)} failed section(s).")
+            # Each section runs in a copy of the caller's context so its trace span lands in the same job
+            contexts = {i: contextvars.copy_context() for i in pending}
+            outcomes = list(pool.map(lambda i: contexts[i].run(_generate_section_plan, sections[i], i + 1, model),
+                                     pending))
+            for i, outcome in zip(pending, outcomes):
+                results[i] = outcome
+            pending = [i for i in pending if results[i][1] is not None]
+            if not pending:
+                break
+
+    plan = {"actions": []}
+    failed = []
+    for index, (actions, error) in enumerate(results, start=1):
+        if error is not None:
+            print(f"[LLM] Section {index} failed: {error}")
+            failed.append(index)
+            continue
+        plan["actions"].extend(actions)
+    if failed:
+        plan["failed_sections"] = failed
+    print(f"[LLM] {len(sections)} section prompts ({workers} concurrent) took "
+          f"{time.perf_counter() - start:.1f}s; {len(failed)} failed.")
+    return plan
+
+@traced("llm.section", cat="llm")
+def _generate_section_plan(section, index, model):
+    """Returns (actions, error) for one section; never raises."""
+    try:
+        prompt = _build_section_prompt(section, index)
+        response = get_chat_client().chat.completions.create(
+            model=model,
+            messages=prompt,
+            temperature=0
+        )
+        content = response.choices[0].message.content
+        part = _parse_json(content)
+        if part is None:
+            return [], ValueError("response is not valid JSON")
+        return (part if isinstance(part, list) else part.get("actions", [])), None
+    except Exception as e:
+        return [], e
+
 def _build_full_prompt(sections):
     return [
         {
@@ -72,22 +149,70 @@ def _build_section_prompt(section_text, index):
     return _build_full_prompt([f"Section {index}:\n{section_text}"])
 
 def _parse_json(text):
+    """The JSON object or array in a response (code fences and surrounding prose allowed), or None."""
+    text = (text or "").strip()
+    candidates = [re.sub(r"^```(?:json)?\s*|\s*```$", "", text)]
+    for pattern in (r"\{.*\}", r"\[.*\]"):
+        match = re.search(pattern, text, re.DOTALL)
+        if match:
+            candidates.append(match.group())
+    for candidate in candidates:
+        try:
+            parsed = json.loads(candidate)
+        except ValueError:
+            continue
+        if isinstance(parsed, (dict, list)):
+            return parsed
+    print(f"[ParseError] No JSON object or array in response: {text[:80]!r}")
+    return None
+
+@traced("llm.analyze_page_with_context", cat="llm")
+def analyze_page_with_context(html, screenshot, previous_action=None, crop_box=None, form_sections=None,
+                              frame_hash=None):
+    """
+    Ask the LLM to review the current step. `screenshot` may be PNG bytes
+    (e.g. PageSnapshot.png) or a path to a PNG file on disk. The image is
+    downscaled and re-encoded before upload, and cropped to crop_box
+    (e.g. PageSnapshot.form_bbox) when given.
+    The form sections (pass form_sections if they are already extracted) are
+    packed into PAGE_ANALYSIS_TOKEN_BUDGET tokens in place of the raw HTML.
+    Results are cached by the normalized section text together with the
+    screenshot's perceptual hash (frame_hash, e.g. PageSnapshot.frame_hash;
+    computed here when not given) and previous_action, so the same form in a
+    different visual state (an upload error banner, say) is reviewed again.
+    """
+    if form_sections is None:
+        form_sections = html_processor.extract_form_sections(html)
     try:
-        match = re.search(r"\{.*\}", text.strip(), re.DOTALL)
-        return json.loads(match.group()) if match else None
-    except Exception as e:
-        print(f"[ParseError] {e}")
-        return None
+        if isinstance(screenshot, (bytes, bytearray)):
+            png_bytes = screenshot
+        else:
+            with open(screenshot, "rb") as img_file:
+                png_bytes = img_file.read()
+    except OSError as e:
+        print(f"[LLM ERROR] {e}")
+        return {"summary": f"Error from LLM: {e}", "suggested_action": None}
+
+    cache = get_llm_cache()
+    cache_key = None
+    if cache is not None:
+        if form_sections:
+            # Without Pillow there is no perceptual hash; only byte-identical screenshots then share a review
+            frame = frame_hash or dhash(png_bytes, crop_box=crop_box) or hashlib.sha256(png_bytes).hexdigest()
+            cache_key = make_cache_key(form_sections, PAGE_ANALYSIS_PROMPT_VERSION, MODEL_NAME,
+                                       extra={"frame": frame, "previous_action": previous_action})
+            cached_result = cache.get(cache_key)
+            if cached_result is not None:
+                print("[LLM] Page analysis served from cache.")
+                return cached_result
 
-def analyze_page_with_context(html, screenshot_path, previous_action=None):
     try:
-        with open(screenshot_path, "rb") as img_file:
-            b64_image = base64.b64encode(img_file.read()).decode("utf-8")
+        image_url = screenshot_data_url(png_bytes, crop_box=crop_box)
 
         base_prompt = """
 You are an automation agent reviewing a job application step.
 
-🧾 You have the HTML of the current page and a screenshot.
+🧾 You have the form content of the current page and a screenshot.
 
 Your tasks:
 1. Describe in plain English what’s happening.
@@ -105,18 +230,20 @@ Always respond with JSON like:
 }
 """
 
+        packed_sections, _ = pack_sections(form_sections, PAGE_ANALYSIS_TOKEN_BUDGET, MODEL_NAME,
+                                           label="page analysis")
         messages = [
             {"role": "system", "content": "You are a smart form-filling automation agent."},
             {
                 "role": "user",
                 "content": [
-                    {"type": "text", "text": base_prompt + "\n\nHTML Snapshot:\n" + html[:14000]},
-                    {"type": "image_url", "image_url": {"url": f"data:image/png;base64,{b64_image}"}}
+                    {"type": "text", "text": base_prompt + "\n\nForm content:\n" + "\n\n".join(packed_sections)},
+                    {"type": "image_url", "image_url": {"url": image_url}}
                 ]
             }
         ]
 
-        response = client.chat.completions.create(
+        response = get_chat_client().chat.completions.create(
             model=MODEL_NAME,
             messages=messages,
             max_tokens=1000
@@ -124,7 +251,12 @@ Always respond with JSON like:
 
         content = response.choices[0].message.content
         match = re.search(r"\{.*\}", content.strip(), re.DOTALL)
-        return json.loads(match.group()) if match else {"summary": content, "suggested_action": None}
+        if not match:
+            return {"summary": content, "suggested_action": None}
+        result = json.loads(match.group())
+        if cache_key is not None:
+            cache.put(cache_key, result, meta={"prompt_version": PAGE_ANALYSIS_PROMPT_VERSION})
+        return result
 
     except Exception as e:
         print(f"[LLM ERROR] {e}")
@@ -0,0 +1,166 @@
+# llm_cache.py
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+from file_utils import ensure_dir
+from form_fingerprint import mask_volatile_ids
+
+CACHE_DIR = ".llm_cache"
+MAX_ENTRIES = 1000
+MAX_BYTES = 50 * 1024 * 1024
+MAX_AGE_SECONDS = 14 * 24 * 3600
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_sections(sections):
+    """Normalize extracted form sections so equivalent pages produce the same cache key."""
+    normalized = []
+    for section in sections or []:
+        text = mask_volatile_ids(section)
+        text = _WHITESPACE_RE.sub(" ", text).strip()
+        if text:
+            normalized.append(text)
+    return normalized
+
+
+def make_cache_key(sections, prompt_version, model, extra=None):
+    """Hash of the normalized sections, the prompt template version and the model name."""
+    payload = {
+        "sections": normalize_sections(sections),
+        "prompt_version": prompt_version,
+        "model": model,
+        "extra": extra,
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    """
+    Persistent on-disk cache for LLM responses.
+    Each entry is a small JSON file under cache_dir; entries written more than
+    max_age ago are ignored and removed however often they are hit, and the
+    least recently used entries are evicted once the cache grows past
+    max_entries or max_bytes. A file's mtime is its creation time and its
+    atime its last use, so both survive restarts.
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, max_entries=MAX_ENTRIES, max_bytes=MAX_BYTES,
+                 max_age=MAX_AGE_SECONDS):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._index = None  # key -> [size, last_used, created]
+
+    def get(self, key):
+        """Return the cached value for key, or None on a miss."""
+        with self._lock:
+            index = self._load_index()
+            entry = index.get(key)
+            path = self._path(key)
+            if entry is not None and time.time() - entry[2] <= self.max_age:
+                try:
+                    with open(path, "r", encoding="utf-8") as f:
+                        value = json.load(f)["value"]
+                except (OSError, ValueError, KeyError):
+                    value = None
+                if value is not None:
+                    self.hits += 1
+                    entry[1] = time.time()
+                    try:
+                        os.utime(path, (entry[1], entry[2]))  # bump last use, keep creation time
+                    except OSError:
+                        pass
+                    return value
+            if entry is not None:
+                self._remove(key)
+            self.misses += 1
+            return None
+
+    def put(self, key, value, meta=None):
+        """Store a JSON-serializable value under key, then evict if over the limits."""
+        data = json.dumps({"value": value, "meta": meta or {}, "created": time.time()})
+        with self._lock:
+            index = self._load_index()
+            path = self._path(key)
+            ensure_dir(os.path.dirname(path))
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+            now = time.time()
+            index[key] = [len(data), now, now]
+            self._evict()
+
+    def stats(self):
+        """Hit/miss counters plus the current size of the cache."""
+        with self._lock:
+            index = self._load_index()
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "entries": len(index),
+                "bytes": sum(entry[0] for entry in index.values()),
+            }
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def _load_index(self):
+        if self._index is None:
+            self._index = {}
+            if os.path.isdir(self.cache_dir):
+                for sub in os.listdir(self.cache_dir):
+                    sub_dir = os.path.join(self.cache_dir, sub)
+                    if not os.path.isdir(sub_dir):
+                        continue
+                    for name in os.listdir(sub_dir):
+                        if not name.endswith(".json"):
+                            continue
+                        stat = os.stat(os.path.join(sub_dir, name))
+                        self._index[name[:-len(".json")]] = [stat.st_size, stat.st_atime, stat.st_mtime]
+        return self._index
+
+    def _remove(self, key):
+        self._index.pop(key, None)
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def _evict(self):
+        now = time.time()
+        for key in [k for k, (_, _, created) in self._index.items() if now - created > self.max_age]:
+            self._remove(key)
+        total_bytes = sum(entry[0] for entry in self._index.values())
+        if len(self._index) <= self.max_entries and total_bytes <= self.max_bytes:
+            return
+        for key, (size, _, _) in sorted(self._index.items(), key=lambda item: item[1][1]):
+            if len(self._index) <= self.max_entries and total_bytes <= self.max_bytes:
+                break
+            self._remove(key)
+            total_bytes -= size
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_llm_cache():
+    """Return the process-wide LLMCache, or None when disabled with LLM_CACHE=0."""
+    global _default_cache
+    if os.getenv("LLM_CACHE", "1") == "0":
+        return None
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = LLMCache(os.getenv("LLM_CACHE_DIR", CACHE_DIR))
+    return _default_cache
@@ -0,0 +1,101 @@
+# llm_stub_server.py
+# Minimal OpenAI-compatible server for offline runs and benchmarks.
+#   python llm_stub_server.py --cassette cassettes/llm.jsonl --latency 0.5
+#   LLM_BASE_URL=http://127.0.0.1:8765/v1 python launch_browser.py
+# POST /v1/chat/completions answers from the cassette when the request was
+# recorded there (see llm_transport.py) and with a fixed reply otherwise.
+import json
+import time
+import uuid
+import argparse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from llm_transport import Cassette, request_key, DEFAULT_CASSETTE
+
+DEFAULT_PORT = 8765
+DEFAULT_REPLY = '{"actions": []}'
+
+
+def make_completion(model, content):
+    """A chat.completion response body with a single assistant message."""
+    return {
+        "id": f"chatcmpl-stub-{uuid.uuid4().hex[:12]}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model or "stub",
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content},
+            "finish_reason": "stop",
+        }],
+        "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+    }
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    cassette = None
+    latency = 0.0
+    reply = DEFAULT_REPLY
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send(404, {"error": {"message": f"Unknown endpoint {self.path}"}})
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            request = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._send(400, {"error": {"message": "Request body is not JSON"}})
+            return
+        record = self.cassette.get(request_key(request)) if self.cassette is not None else None
+        if self.latency:
+            time.sleep(self.latency)
+        if record is not None:
+            body = record["response"]
+        else:
+            body = make_completion(request.get("model"), self.reply)
+        self._send(200, body)
+
+    def _send(self, status, body):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, fmt, *args):
+        print(f"[Stub] {self.address_string()} {fmt % args}")
+
+
+def serve(host="127.0.0.1", port=DEFAULT_PORT, cassette_path=None, latency=0.0, reply=DEFAULT_REPLY):
+    """Start the stub server and block until interrupted."""
+    handler = type("Handler", (StubHandler,), {
+        "cassette": Cassette(cassette_path) if cassette_path else None,
+        "latency": latency,
+        "reply": reply,
+    })
+    server = ThreadingHTTPServer((host, port), handler)
+    print(f"[Stub] Serving OpenAI-compatible API on http://{host}:{port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local OpenAI-compatible stub server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--cassette", nargs="?", const=DEFAULT_CASSETTE,
+                        help="answer recorded requests from this cassette")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds to wait before each reply")
+    parser.add_argument("--reply", default=DEFAULT_REPLY, help="message content for unrecorded requests")
+    args = parser.parse_args()
+    serve(args.host, args.port, args.cassette, args.latency, args.reply)
+
+
+if __name__ == "__main__":
+    main()
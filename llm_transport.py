@@ -0,0 +1,164 @@
+# llm_transport.py
+# Pluggable transport for chat completion calls, chosen with LLM_MODE:
+#   live    - call the API (LLM_BASE_URL points it at another OpenAI-compatible
+#             server, e.g. llm_stub_server.py)
+#   record  - call the API and append every request/response pair to the cassette
+#   replay  - answer from the cassette only; no network, no API key needed
+# The cassette (LLM_CASSETTE, default cassettes/llm.jsonl) is JSON lines keyed
+# by a hash of the request. LLM_REPLAY_LATENCY adds a delay to replayed calls:
+# a number of seconds, or "recorded" to sleep as long as the original call took.
+import os
+import json
+import time
+import hashlib
+import threading
+from types import SimpleNamespace
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+LIVE = "live"
+RECORD = "record"
+REPLAY = "replay"
+DEFAULT_CASSETTE = os.path.join("cassettes", "llm.jsonl")
+
+
+class CassetteMiss(LookupError):
+    """Replay mode got a request that is not in the cassette."""
+
+
+def transport_mode():
+    mode = os.getenv("LLM_MODE", LIVE).lower()
+    if mode not in (LIVE, RECORD, REPLAY):
+        raise ValueError(f"Unknown LLM_MODE {mode!r}; expected live, record or replay")
+    return mode
+
+
+def request_key(request):
+    """Stable hash of a chat completion request (its keyword arguments)."""
+    return hashlib.sha256(json.dumps(request, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+class Cassette:
+    """Append-only JSONL file of {"key", "request", "response", "latency"} records."""
+
+    def __init__(self, path=DEFAULT_CASSETTE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries = None
+
+    def get(self, key):
+        with self._lock:
+            return self._load().get(key)
+
+    def append(self, request, response, latency):
+        key = request_key(request)
+        record = {"key": key, "request": request, "response": response, "latency": latency}
+        with self._lock:
+            self._load()[key] = record
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, default=str) + "\n")
+
+    def __len__(self):
+        with self._lock:
+            return len(self._load())
+
+    def _load(self):
+        if self._entries is None:
+            self._entries = {}
+            if os.path.exists(self.path):
+                with open(self.path, "r", encoding="utf-8") as f:
+                    for line in f:
+                        if line.strip():
+                            record = json.loads(line)
+                            self._entries[record["key"]] = record
+        return self._entries
+
+
+def _to_completion(data):
+    """Rebuild a ChatCompletion object from its recorded JSON."""
+    try:
+        from openai.types.chat import ChatCompletion
+        return ChatCompletion.model_validate(data)
+    except Exception:
+        return json.loads(json.dumps(data), object_hook=lambda d: SimpleNamespace(**d))
+
+
+class _Completions:
+    def __init__(self, transport):
+        self._transport = transport
+
+    def create(self, **request):
+        return self._transport.create(request)
+
+
+class ChatTransport:
+    """
+    Drop-in for the part of the OpenAI client the agent uses:
+    transport.chat.completions.create(**kwargs) returns a ChatCompletion.
+    """
+
+    def __init__(self, mode=LIVE, cassette=None, replay_latency=None, base_url=None):
+        self.mode = mode
+        self.cassette = cassette
+        self.replay_latency = replay_latency
+        self.base_url = base_url
+        self.chat = SimpleNamespace(completions=_Completions(self))
+        self._client = None
+        self._client_lock = threading.Lock()
+
+    def create(self, request):
+        if self.mode == REPLAY:
+            return self._replay(request)
+        start = time.perf_counter()
+        response = self._live_client().chat.completions.create(**request)
+        if self.mode == RECORD:
+            self.cassette.append(request, response.model_dump(), time.perf_counter() - start)
+        return response
+
+    def _replay(self, request):
+        record = self.cassette.get(request_key(request))
+        if record is None:
+            raise CassetteMiss(f"No recorded response for this {request.get('model')} request "
+                               f"in {self.cassette.path}")
+        if self.replay_latency == "recorded":
+            time.sleep(record.get("latency") or 0)
+        elif self.replay_latency:
+            time.sleep(float(self.replay_latency))
+        return _to_completion(record["response"])
+
+    def _live_client(self):
+        with self._client_lock:
+            if self._client is None:
+                from openai import OpenAI
+                api_key = os.getenv("OPENAI_API_KEY") or ("stub" if self.base_url else None)
+                self._client = OpenAI(api_key=api_key, base_url=self.base_url)
+            return self._client
+
+
+_transport = None
+_transport_lock = threading.Lock()
+
+
+def get_chat_client():
+    """
+    Return the process-wide chat transport configured from the environment
+    (LLM_MODE, LLM_CASSETTE, LLM_REPLAY_LATENCY, LLM_BASE_URL). The OpenAI
+    client is only created on the first live call.
+    """
+    global _transport
+    with _transport_lock:
+        if _transport is None:
+            mode = transport_mode()
+            cassette = Cassette(os.getenv("LLM_CASSETTE", DEFAULT_CASSETTE)) if mode != LIVE else None
+            _transport = ChatTransport(
+                mode=mode,
+                cassette=cassette,
+                replay_latency=os.getenv("LLM_REPLAY_LATENCY") or None,
+                base_url=os.getenv("LLM_BASE_URL") or None,
+            )
+            if cassette is not None:
+                print(f"[LLM] Transport mode '{mode}' with cassette {cassette.path} ({len(cassette)} entries)")
+        return _transport
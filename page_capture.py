@@ -1,53 +1,150 @@
 
 # page_capture.py (final version with structured paths and slugged titles)
-import os
-from selenium.webdriver.common.by import By
-from file_utils import slugify_title, ensure_dir, get_unique_filename
+from file_utils import slugify_title
+from snapshot_store import get_snapshot_store
+from snapshot_writer import flush_snapshots
+import html_processor
+from perceptual_hash import dhash
+from screenshot_capture import capture_screenshot, CAPTURE_MODE, VIEWPORT
+from tracing import span, traced
 
-def save_page_snapshot(driver, job_id, job_title, step):
+# Bounding box (in screenshot pixels) of the elements html_processor treats as
+# form sections: every <fieldset>, or the <form> when there are none.
+# arguments[0] is true for full-page screenshots (page coordinates) and false
+# for viewport screenshots (clipped to the visible area).
+FORM_BBOX_SCRIPT = """
+var fullPage = arguments[0];
+var els = document.querySelectorAll('fieldset');
+if (!els.length) { els = document.querySelectorAll('form'); }
+var dpr = window.devicePixelRatio || 1;
+var dx = fullPage ? window.scrollX : 0, dy = fullPage ? window.scrollY : 0;
+var left = Infinity, top = Infinity, right = -Infinity, bottom = -Infinity;
+for (var i = 0; i < els.length; i++) {
+  var r = els[i].getBoundingClientRect();
+  if (!r.width || !r.height) { continue; }
+  left = Math.min(left, r.left + dx);
+  top = Math.min(top, r.top + dy);
+  right = Math.max(right, r.right + dx);
+  bottom = Math.max(bottom, r.bottom + dy);
+}
+if (!fullPage) {
+  left = Math.max(left, 0); top = Math.max(top, 0);
+  right = Math.min(right, window.innerWidth); bottom = Math.min(bottom, window.innerHeight);
+}
+if (left === Infinity || right <= left || bottom <= top) { return null; }
+return [left * dpr, top * dpr, right * dpr, bottom * dpr];
+"""
+
+
+class PageSnapshot:
     """
-    Save current page HTML and screenshot in a structured folder:
-    - HTML in resources/html/<job_id>/
-    - Screenshot in resources/screenshots/<job_id>/
-    Filenames include a slug of the job title and step.
+    In-memory capture of a page: the HTML string, the PNG screenshot bytes and
+    the parsed form model. Writing to disk is optional (see save()), so callers
+    can pass the snapshot through extraction, LLM analysis and execution without
+    re-reading the files they just wrote.
     """
-    # Prepare directories
-    base_html_dir = os.path.join("resources", "html", str(job_id))
-    base_screenshot_dir = os.path.join("resources", "screenshots", str(job_id))
-    ensure_dir(base_html_dir)
-    ensure_dir(base_screenshot_dir)
 
-    # Generate a slug for the job title for filenames
-    slug_title = slugify_title(job_title)
-    if not slug_title:
-        slug_title = str(job_id)  # fallback to job_id if title is empty
+    def __init__(self, html, png, job_id, job_title, step, url=None, form_bbox=None, form_sections=None):
+        self.html = html
+        self.png = png
+        self.form_bbox = form_bbox  # (left, top, right, bottom) of the form sections, if known
+        self.job_id = job_id
+        self.job_title = job_title
+        self.step = step
+        self.url = url
+        self.html_path = None
+        self.html_digest = None
+        self.screenshot_path = None
+        self.step_key = None
+        self._form_sections = form_sections
+        self._frame_hash = None
+
+    @property
+    def form_sections(self):
+        """Form sections extracted from the HTML (parsed once, on first use)."""
+        if self._form_sections is None:
+            with span("extract_form_sections", cat="extract"):
+                self._form_sections = html_processor.extract_form_sections(self.html)
+        return self._form_sections
+
+    @property
+    def frame_hash(self):
+        """Perceptual hash of the screenshot's form area (computed once, on first use)."""
+        if self._frame_hash is None:
+            with span("frame_hash", cat="capture"):
+                self._frame_hash = dhash(self.png, crop_box=self.form_bbox)
+        return self._frame_hash
+
+    def save(self, store=None):
+        """
+        Persist the snapshot in the content-addressed snapshot store:
+        - HTML and screenshot blobs in resources/blobs/ (later HTML pages of a
+          job as deltas against the previous one, see SnapshotStore.put_html)
+        - step -> blob mapping in resources/manifests/<job_id>.jsonl
+        The step key includes a slug of the job title and step.
+        Returns (html_path, screenshot_path).
+        """
+        if self.html_path and self.screenshot_path:
+            return self.html_path, self.screenshot_path
+        store = store or get_snapshot_store()
+
+        # Generate a slug for the job title for the step key
+        slug_title = slugify_title(self.job_title)
+        if not slug_title:
+            slug_title = str(self.job_id)  # fallback to job_id if title is empty
+
+        # Compose the step key (e.g., "Software-Engineer_step1"); only new content hits the disk
+        html_digest, html_path = store.put_html(self.job_id, self.html)
+        png_digest, screenshot_path = store.put_blob(self.png, "png")
+        self.step_key = store.record_step(self.job_id, f"{slug_title}_step{self.step}", html_digest, png_digest)
+        self.html_digest = html_digest
 
-    # Compose base name for files (e.g., "Software-Engineer_step1")
-    base_name = f"{slug_title}_step{step}"
+        self.html_path = html_path
+        self.screenshot_path = screenshot_path
+        print(f"Saved page snapshot '{self.step_key}': HTML -> {html_path}, Screenshot -> {screenshot_path}")
+        return html_path, screenshot_path
 
-    # Get unique file paths to avoid overwrite
-    html_path = get_unique_filename(base_html_dir, base_name, "html")
-    screenshot_path = get_unique_filename(base_screenshot_dir, base_name, "png")
 
+@traced("capture_page_snapshot", cat="capture")
+def capture_page_snapshot(driver, job_id, job_title, step, persist=True, form_sections=None,
+                          capture_mode=CAPTURE_MODE):
+    """
+    Capture the current page HTML and a screenshot into a PageSnapshot.
+    The screenshot is full-page by default (capture_mode=VIEWPORT for the
+    visible area only) and never resizes the window; see screenshot_capture.
+    When persist is True the snapshot is also written to disk; the write runs on
+    the background snapshot writer, so call snapshot_writer.flush_snapshots()
+    before relying on the files. form_sections may carry sections that were already
+    extracted (e.g. by dom_extractor) so the HTML is not parsed again.
+    """
     # Capture content
     html_content = driver.page_source
-    with open(html_path, "w", encoding="utf-8") as f:
-        f.write(html_content)
 
-    # Adjust window size to page size for full screenshot
     try:
-        width = driver.execute_script("return document.body.parentNode.scrollWidth")
-        height = driver.execute_script("return document.body.parentNode.scrollHeight")
-        driver.set_window_size(width, height)
+        png, method = capture_screenshot(driver, capture_mode)
     except Exception as e:
-        print(f"[Warning] Could not resize window: {e}")
+        print(f"[Warning] Screenshot capture failed ({e}); using the viewport.")
+        png, method = driver.get_screenshot_as_png(), VIEWPORT
 
-    # Take full-page screenshot
     try:
-        body = driver.find_element(By.TAG_NAME, "body")
-        body.screenshot(screenshot_path)
+        form_bbox = driver.execute_script(FORM_BBOX_SCRIPT, method != VIEWPORT)
     except Exception:
-        driver.save_screenshot(screenshot_path)
+        form_bbox = None
+
+    snapshot = PageSnapshot(html_content, png, job_id, job_title, step, url=driver.current_url, form_bbox=form_bbox,
+                            form_sections=form_sections)
+    if persist:
+        snapshot.save()
+    return snapshot
+
 
-    print(f"Saved page snapshot: HTML -> {html_path}, Screenshot -> {screenshot_path}")
-    return html_path, screenshot_path
\ No newline at end of file
+def save_page_snapshot(driver, job_id, job_title, step):
+    """
+    Save current page HTML and screenshot to disk.
+    Returns (html_path, screenshot_path); prefer capture_page_snapshot() when the
+    caller needs the content as well.
+    """
+    snapshot = capture_page_snapshot(driver, job_id, job_title, step, persist=True)
+    flush_snapshots()  # callers of this helper read the files straight back
+    get_snapshot_store().materialize_html(snapshot.html_digest)  # the HTML may be stored as a delta
+    return snapshot.html_path, snapshot.screenshot_path
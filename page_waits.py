@@ -0,0 +1,309 @@
+# page_waits.py
+import time
+from selenium.common.exceptions import TimeoutException, WebDriverException
+from tracing import span
+
+UPLOAD_SUCCESS = "success"
+UPLOAD_FAILURE = "failure"
+UPLOAD_TIMEOUT = "timeout"
+
+DEFAULT_SUCCESS_KEYWORDS = ("uploaded",)
+DEFAULT_FAILURE_KEYWORDS = ("upload failed", "failed to upload", "file is too large",
+                            "file type is not supported", "something went wrong", "try again")
+
+# Resolves with "success", "failure" or "timeout". Only the upload widget is
+# looked at: the closest ancestor of the file input that holds no other file
+# input (the whole document when no input is given), so an earlier upload or a
+# pre-filled resume elsewhere on the page does not count. The widget is
+# checked once for success, provided the input actually holds the file (failure
+# text only counts when it appears after the upload); then a
+# MutationObserver inspects only the widget's nodes that change, so nothing is
+# polled and no DOM is transferred back to Python.
+UPLOAD_WAIT_SCRIPT = r"""
+var input = arguments[0];
+var fileName = (arguments[1] || '').toLowerCase();
+var successWords = arguments[2];
+var failureWords = arguments[3];
+var timeoutMs = arguments[4];
+var done = arguments[arguments.length - 1];
+var finished = false, observer = null, timer = null;
+
+function finish(result) {
+  if (finished) { return; }
+  finished = true;
+  if (observer) { observer.disconnect(); }
+  if (timer) { clearTimeout(timer); }
+  done(result);
+}
+
+function classify(text, checkFailure) {
+  text = (text || '').toLowerCase();
+  if (!text) { return null; }
+  for (var i = 0; checkFailure && i < failureWords.length; i++) {
+    if (text.indexOf(failureWords[i]) >= 0) { return 'failure'; }
+  }
+  if (fileName && text.indexOf(fileName) >= 0) { return 'success'; }
+  for (var j = 0; j < successWords.length; j++) {
+    if (text.indexOf(successWords[j]) >= 0) { return 'success'; }
+  }
+  return null;
+}
+
+function widgetOf(el) {
+  var widget = el, levels = 0;
+  while (widget.parentElement && widget.parentElement !== document.body && levels < 8) {
+    if (widget.parentElement.querySelectorAll('input[type=file]').length > 1) { break; }
+    widget = widget.parentElement;
+    levels++;
+  }
+  return widget;
+}
+
+var scope = input ? widgetOf(input) : document.documentElement;
+
+function inScope(node) {
+  // A widget that re-rendered itself is gone; then any change may be the result
+  return !scope.isConnected || scope.contains(node);
+}
+
+function inputHoldsFile() {
+  if (!input || !input.files || !input.files.length) { return false; }
+  for (var i = 0; i < input.files.length; i++) {
+    if (!fileName || input.files[i].name.toLowerCase() === fileName) { return true; }
+  }
+  return false;
+}
+
+function inputState() {
+  if (!input || !input.isConnected) { return null; }
+  if (input.getAttribute('aria-invalid') === 'true') { return 'failure'; }
+  return null;
+}
+
+var initial = inputState();
+if (!initial && input && inputHoldsFile()) { initial = classify(scope.innerText, false); }
+if (initial) { finish(initial); return; }
+
+observer = new MutationObserver(function (mutations) {
+  for (var m = 0; m < mutations.length; m++) {
+    var mutation = mutations[m];
+    var result = null;
+    if (!inScope(mutation.target)) { continue; }
+    if (mutation.type === 'attributes') {
+      if (mutation.target === input) { result = inputState(); }
+      else if (mutation.attributeName === 'role' && mutation.target.getAttribute('role') === 'alert') {
+        result = classify(mutation.target.textContent, true);
+      }
+    } else if (mutation.type === 'characterData') {
+      result = classify(mutation.target.nodeValue, true);
+    } else {
+      for (var n = 0; n < mutation.addedNodes.length && !result; n++) {
+        result = classify(mutation.addedNodes[n].textContent, true);
+      }
+    }
+    if (result) { finish(result); return; }
+  }
+});
+observer.observe(document.documentElement, {
+  childList: true, subtree: true, characterData: true,
+  attributes: true, attributeFilter: ['aria-invalid', 'role', 'value', 'disabled']
+});
+timer = setTimeout(function () { finish('timeout'); }, timeoutMs);
+"""
+
+
+def wait_for_upload_result(driver, file_input=None, file_name=None,
+                           success_keywords=DEFAULT_SUCCESS_KEYWORDS,
+                           failure_keywords=DEFAULT_FAILURE_KEYWORDS, timeout=15):
+    """
+    Wait for a file upload to finish, driven by DOM mutations inside the page.
+    file_input is the <input type=file> WebElement (optional) and file_name the
+    uploaded file's base name, which upload widgets usually display once done.
+    Returns UPLOAD_SUCCESS, UPLOAD_FAILURE or UPLOAD_TIMEOUT.
+    """
+    with span("wait_for_upload_result", cat="wait", file_name=file_name) as wait_span:
+        try:
+            result = run_async_script(
+                driver,
+                UPLOAD_WAIT_SCRIPT,
+                timeout + 5,
+                file_input,
+                file_name or "",
+                [k.lower() for k in success_keywords],
+                [k.lower() for k in failure_keywords],
+                int(timeout * 1000),
+            )
+        except TimeoutException:
+            result = UPLOAD_TIMEOUT
+        except WebDriverException as e:
+            # e.g. the page navigated away while waiting
+            print(f"[Upload] Upload waiter interrupted: {e}")
+            result = UPLOAD_TIMEOUT
+        if result not in (UPLOAD_SUCCESS, UPLOAD_FAILURE, UPLOAD_TIMEOUT):
+            result = UPLOAD_TIMEOUT
+        wait_span.set(result=result)
+    return result
+
+
+# Waits, in order, for document.readyState == "complete", for in-flight
+# fetch/XHR requests to settle and for the DOM to stop mutating, each with its
+# own timeout. The request tracker is installed on first use per page, and the
+# Resource Timing API covers requests that started before it was installed.
+PAGE_READY_SCRIPT = r"""
+var documentTimeout = arguments[0];
+var networkTimeout = arguments[1];
+var domTimeout = arguments[2];
+var quietMs = arguments[3];
+var done = arguments[arguments.length - 1];
+var start = performance.now();
+var result = {timed_out: []};
+
+var net = window.__autoseekNet;
+if (!net) {
+  net = window.__autoseekNet = {pending: 0, last: 0};
+  var settle = function () { net.pending = Math.max(0, net.pending - 1); net.last = performance.now(); };
+  if (window.fetch) {
+    var origFetch = window.fetch;
+    window.fetch = function () {
+      net.pending++;
+      var p = origFetch.apply(this, arguments);
+      p.then(settle, settle);
+      return p;
+    };
+  }
+  var origSend = XMLHttpRequest.prototype.send;
+  XMLHttpRequest.prototype.send = function () {
+    net.pending++;
+    this.addEventListener('loadend', settle);
+    return origSend.apply(this, arguments);
+  };
+}
+
+var lastMutation = performance.now();
+var observer = new MutationObserver(function () { lastMutation = performance.now(); });
+observer.observe(document.documentElement, {childList: true, subtree: true, attributes: true, characterData: true});
+
+function lastNetworkActivity() {
+  var last = net.last;
+  var entries = performance.getEntriesByType('resource');
+  for (var i = Math.max(0, entries.length - 25); i < entries.length; i++) {
+    last = Math.max(last, entries[i].responseEnd || entries[i].startTime);
+  }
+  return last;
+}
+
+var phases = [
+  ['document', documentTimeout, function () { return document.readyState === 'complete'; }],
+  ['network', networkTimeout, function () {
+    return net.pending === 0 && performance.now() - lastNetworkActivity() >= quietMs;
+  }],
+  ['dom', domTimeout, function () { return performance.now() - lastMutation >= quietMs; }]
+];
+
+function runPhase(index) {
+  if (index >= phases.length) {
+    observer.disconnect();
+    result.total_ms = Math.round(performance.now() - start);
+    done(result);
+    return;
+  }
+  var name = phases[index][0], timeoutMs = phases[index][1], ready = phases[index][2];
+  var phaseStart = performance.now();
+  var check = function () {
+    var elapsed = performance.now() - phaseStart;
+    if (ready() || elapsed >= timeoutMs) {
+      if (!ready()) { result.timed_out.push(name); }
+      result[name + '_ms'] = Math.round(elapsed);
+      runPhase(index + 1);
+      return;
+    }
+    setTimeout(check, 50);
+  };
+  check();
+}
+runPhase(0);
+"""
+
+
+class WaitStats:
+    """Records how long each readiness wait took, and the fixed sleep it replaced."""
+
+    def __init__(self):
+        self.records = []
+
+    def record(self, label, elapsed, replaces=None, details=None):
+        self.records.append({"label": label, "elapsed": elapsed, "replaces": replaces, "details": details or {}})
+
+    def report(self):
+        """Print total time spent waiting, compared with the fixed sleeps it replaced."""
+        if not self.records:
+            return
+        waited = sum(r["elapsed"] for r in self.records)
+        replaced = sum(r["replaces"] for r in self.records if r["replaces"] is not None)
+        compared = sum(r["elapsed"] for r in self.records if r["replaces"] is not None)
+        print(f"[Wait] {len(self.records)} readiness waits took {waited:.1f}s in total.")
+        if replaced:
+            print(f"[Wait] Fixed sleeps would have taken {replaced:.1f}s; saved {replaced - compared:.1f}s.")
+
+
+_wait_stats = WaitStats()
+
+
+def get_wait_stats():
+    """Return the process-wide WaitStats."""
+    return _wait_stats
+
+
+def wait_for_page_ready(driver, label="", replaces=None, document_timeout=10, network_timeout=5,
+                        dom_timeout=5, quiet_ms=300):
+    """
+    Adaptive replacement for fixed time.sleep() calls: wait for document
+    readiness, network quiescence and DOM-mutation quiescence (no activity for
+    quiet_ms), each bounded by its own timeout in seconds.
+    `replaces` is the fixed sleep (seconds) this wait stands in for; it is only
+    used to report time saved. Returns the per-phase timings reported by the page.
+    """
+    with span("wait_for_page_ready", cat="wait", label=label, replaces=replaces):
+        start = time.perf_counter()
+        total_timeout = document_timeout + network_timeout + dom_timeout
+        try:
+            details = run_async_script(
+                driver,
+                PAGE_READY_SCRIPT,
+                total_timeout + 5,
+                int(document_timeout * 1000),
+                int(network_timeout * 1000),
+                int(dom_timeout * 1000),
+                int(quiet_ms),
+            ) or {}
+        except WebDriverException as e:
+            # Navigation in progress or script timeout: fall back to the plain readyState check
+            print(f"[Wait] Readiness script failed ({type(e).__name__}); waiting for readyState only.")
+            details = {"error": str(e).splitlines()[0] if str(e) else type(e).__name__}
+            deadline = start + document_timeout
+            while time.perf_counter() < deadline:
+                try:
+                    if driver.execute_script("return document.readyState") == "complete":
+                        break
+                except WebDriverException:
+                    pass
+                time.sleep(0.1)
+        elapsed = time.perf_counter() - start
+        _wait_stats.record(label, elapsed, replaces, details)
+    timed_out = details.get("timed_out") if isinstance(details, dict) else None
+    suffix = f" (timed out: {', '.join(timed_out)})" if timed_out else ""
+    print(f"[Wait] {label or 'page'} ready after {elapsed:.2f}s{suffix}")
+    return details
+
+
+def run_async_script(driver, script, script_timeout, *args):
+    """execute_async_script with a temporary script timeout (seconds)."""
+    previous_script_timeout = driver.timeouts.script
+    driver.set_script_timeout(script_timeout)
+    try:
+        return driver.execute_async_script(script, *args)
+    finally:
+        try:
+            driver.set_script_timeout(previous_script_timeout)
+        except WebDriverException:
+            pass
@@ -0,0 +1,67 @@
+# perceptual_hash.py
+# Difference hash (dHash) of screenshots, for telling whether an action
+# visibly changed the page. The image (cropped to the form when a box is given)
+# is reduced to a grayscale grid HASH_WIDTH cells wide, with as many rows as the
+# aspect ratio asks for, and every cell contributes one bit: brighter than its
+# right-hand neighbour or not. A grid cell covers roughly 20-40 CSS pixels of a
+# full-page capture, so a ticked checkbox, a typed value or an inline error
+# flips bits, while identical frames hash identically.
+import io
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow is optional; without it no frame is considered a duplicate
+    Image = None
+
+HASH_WIDTH = 64
+MIN_ROWS = 8
+MAX_ROWS = 512
+DISTANCE_THRESHOLD = 2  # differing bits tolerated (caret blink, anti-aliasing)
+CROP_PADDING = 24  # same padding vision_payload uses around the form box
+
+
+def dhash(png_bytes, crop_box=None, width=HASH_WIDTH, padding=CROP_PADDING):
+    """
+    dHash of a PNG screenshot as "<cols>x<rows>:<hex>", or None when the image
+    cannot be decoded (or Pillow is missing).
+    """
+    if Image is None or not png_bytes:
+        return None
+    try:
+        image = Image.open(io.BytesIO(png_bytes))
+        image.load()
+    except Exception as e:
+        print(f"[Vision] Could not decode screenshot for hashing ({e}).")
+        return None
+    if crop_box:
+        left, top, right, bottom = crop_box
+        box = (max(0, int(left) - padding), max(0, int(top) - padding),
+               min(image.width, int(right) + padding), min(image.height, int(bottom) + padding))
+        if box[2] > box[0] and box[3] > box[1]:
+            image = image.crop(box)
+    rows = min(MAX_ROWS, max(MIN_ROWS, round(width * image.height / max(1, image.width))))
+    grid = image.convert("L").resize((width + 1, rows), Image.BOX)
+    pixels = grid.tobytes()  # mode "L": one byte per cell, row-major
+    bits = 0
+    for row in range(rows):
+        offset = row * (width + 1)
+        for col in range(width):
+            bits = (bits << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return f"{width}x{rows}:{bits:0{(width * rows + 3) // 4}x}"
+
+
+def hash_distance(a, b):
+    """Differing bits between two dHashes; None when they are not comparable (missing or different grids)."""
+    if not a or not b:
+        return None
+    shape_a, _, bits_a = a.partition(":")
+    shape_b, _, bits_b = b.partition(":")
+    if shape_a != shape_b:
+        return None
+    return bin(int(bits_a, 16) ^ int(bits_b, 16)).count("1")
+
+
+def is_same_frame(a, b, threshold=DISTANCE_THRESHOLD):
+    """Whether two screenshots look the same (None-safe: unknown frames never match)."""
+    distance = hash_distance(a, b)
+    return distance is not None and distance <= threshold
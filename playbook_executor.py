@@ -1,15 +1,102 @@
+import os
 import time
+import weakref
+import threading
 from selenium.webdriver.common.by import By
-from selenium.common.exceptions import ElementNotInteractableException, NoSuchElementException
-from page_capture import save_page_snapshot
+from selenium.common.exceptions import (ElementNotInteractableException, NoSuchElementException,
+                                        StaleElementReferenceException)
+from page_capture import capture_page_snapshot
+from page_waits import wait_for_page_ready, wait_for_upload_result, UPLOAD_SUCCESS, UPLOAD_FAILURE
 from llm_agent import analyze_page_with_context # Import the correct LLM analysis function
 import html_processor
+from tracing import span, traced
+from element_resolver import (resolve_actions, wait_for_resolved, selector_key, ELEMENT_TIMEOUT,
+                              FIRST_ACTION_TIMEOUT, REVEALING_ACTIONS)
+from batch_actions import is_batchable, run_batched_actions, BATCHABLE_ACTIONS
+from perceptual_hash import is_same_frame
+from candidate_profile import get_candidate_profile, fill_placeholders, FILE_PLACEHOLDERS
+
+BATCH_ACTIONS = True  # run consecutive non-upload actions in the page with one script call
+REUSE_UNCHANGED_REVIEWS = True  # skip the LLM review when the screenshot looks like the last reviewed one
+
+
+class ReviewStats:
+    """Counts post-action reviews sent to the LLM and ones answered from a visually identical frame."""
+
+    def __init__(self):
+        self.analyzed = 0
+        self.reused = 0
+        self._lock = threading.Lock()
+
+    def record(self, reused):
+        with self._lock:
+            if reused:
+                self.reused += 1
+            else:
+                self.analyzed += 1
+
+    def report(self):
+        total = self.analyzed + self.reused
+        if total:
+            print(f"[Vision] {total} page reviews: {self.reused} reused for an unchanged screenshot, "
+                  f"{self.analyzed} sent to the LLM.")
+
+
+_review_stats = ReviewStats()
+_last_reviews = weakref.WeakKeyDictionary()  # driver -> (url, frame hash, analysis) of its last LLM review
+
+
+def get_review_stats():
+    """Return the process-wide ReviewStats."""
+    return _review_stats
  
-def execute_playbook_actions(driver, actions, resume_path, cover_letter_path):
+def action_key(action):
+    """Identity of an action, for remembering which ones already ran in this application."""
+    return f"{action.get('action')}|{action.get('selector')}|{action.get('value')}"
+ 
+@traced("execute_playbook_actions", cat="action")
+def execute_playbook_actions(driver, actions, resume_path, cover_letter_path, batched=BATCH_ACTIONS,
+                             review=True, executed=None, profile=None):
+    """
+    Execute a step's playbook actions, reviewing the page with the LLM after
+    each one (unless review is False). When batched, every run of consecutive
+    non-upload actions (clicks, typing, selects) is executed inside the page in
+    one round trip and reviewed once; uploads always go through send_keys and
+    wait for the upload widget to report completion. The action_key() of every
+    action that ran is added to the executed set when one is given.
+    Placeholders in typed values ([NAME], [EMAIL], ...) are filled from profile
+    (default: candidate_profile.get_candidate_profile()); a value the profile
+    cannot fill, or an upload of anything but [RESUME_PATH] or
+    [COVER_LETTER_PATH], fails the step before any action runs.
+    Returns False on the first failure, True when every action ran or a review
+    found the form complete.
+    """
+    playbook_actions = actions
+    actions = _prepare_actions(actions, get_candidate_profile() if profile is None else profile)
+    if actions is None:
+        return False
     resume_uploaded = False
     cover_letter_uploaded = False
+    # One round trip resolves every selector; later lookups reuse it and only wait for missing elements
+    resolved = resolve_actions(driver, actions)
  
-    for idx, action in enumerate(actions):
+    idx = 0
+    while idx < len(actions):
+        if batched and is_batchable(actions[idx]):
+            end = idx
+            while end < len(actions) and is_batchable(actions[end]):
+                end += 1
+            if not _execute_batch(driver, actions[idx:end], idx, resolved):
+                return False
+            if executed is not None:
+                executed.update(action_key(action) for action in playbook_actions[idx:end])
+            wait_for_page_ready(driver, "after batched actions", replaces=1.5 * (end - idx))
+            if review and _review_step(driver, f"steppost_batch_{idx+1}_{end}"):
+                return True
+            idx = end
+            continue
+
+        action = actions[idx]
         action_type = action.get("action")
         selector = action.get("selector")
         field = action.get("field", "Unknown field")
@@ -19,64 +106,34 @@ def execute_playbook_actions(driver, actions, resume_path, cover_letter_path):
  
         try:
             # Determine how to find the element
-            element = driver.find_element(By.XPATH, selector) if action.get("use_xpath") else driver.find_element(By.CSS_SELECTOR, selector)
- 
-            if action_type == "click":
-                try:
-                    element.click()
-                except ElementNotInteractableException:
-                    print(f"Element not interactable for clicking '{field}'. Scrolling into view and retrying.")
-                    driver.execute_script("arguments[0].scrollIntoView(true);", element)
-                    time.sleep(1)
-                    element.click()
-                print(f"Clicked: {field}")
- 
-            elif action_type == "upload":
-                upload_path = resume_path if value == "[RESUME_PATH]" else cover_letter_path
-                driver.execute_script("arguments[0].scrollIntoView(true);", element)
-                time.sleep(1)
-                element.send_keys(upload_path)
-                print(f"Uploaded file for: {field} (Path: {upload_path})")
+            element = resolve_element(driver, action, resolved, can_reveal=earlier_action_reveals(actions, idx))
+            if element is None:
+                return False
+ 
+            try:
+                _perform_action(driver, element, action, resume_path, cover_letter_path)
+            except StaleElementReferenceException:
+                # An earlier action re-rendered the element after the batch resolution; look it up once more
+                print(f"Element for '{field}' was re-rendered; resolving it again.")
+                resolved.pop(selector_key(action), None)
+                element = resolve_element(driver, action, resolved)
+                if element is None:
+                    return False
+                _perform_action(driver, element, action, resume_path, cover_letter_path)
+            if executed is not None:
+                executed.add(action_key(playbook_actions[idx]))
+            if action_type == "upload":
                 if value == "[RESUME_PATH]":
                     resume_uploaded = True
                 elif value == "[COVER_LETTER_PATH]":
                     cover_letter_uploaded = True
  
-            time.sleep(3 if action_type == "upload" else 1.5)
+            wait_for_page_ready(driver, f"after {action_type}", replaces=3 if action_type == "upload" else 1.5)
  
-            # Save snapshot
+            # Capture snapshot and analyze the step via LLM
             snapshot_name = f"steppost_action_{idx+1}_{field.replace(' ', '_')}"
-            html_path, screenshot_path = save_page_snapshot(driver, "seek_application", "PostAction", snapshot_name)
- 
-            # Get current HTML
-            with open(html_path, "r", encoding="utf-8") as f:
-                current_html = f.read()
- 
-            # Analyze step via LLM
-            try:
-                print("Analyzing effect of last action with LLM...")
-                # Call the correct LLM function and expect a dictionary
-                result = get_smart_step_summary(current_html, screenshot_path)
- 
-                if isinstance(result, dict):
-                    print(f"🖼️ Screenshot summary: {result.get('screenshot_summary', 'N/A')}")
-                    print(f"🧾 HTML summary: {result.get('html_summary', 'N/A')}")
-                    print(f"🔮 LLM-suggested next action: {result.get('suggested_action', 'N/A')}")
-                    # Check for completion based on LLM analysis
-                    if "no more form fields" in result.get('html_summary', '').lower() or "application complete" in result.get('screenshot_summary', '').lower():
-                         print("✅ LLM analysis indicates form is completed.")
-                         return True
-                else:
-                    print(f"❌ LLM analysis failed or returned unexpected format: {result}")
-                    # Decide how to handle unexpected LLM response - break or continue?
-                    # For now, continue but log the issue
-                    pass
- 
-            except Exception as llm_error:
-                print(f"❌ LLM Error during analysis: {llm_error}")
-                # Decide how to handle LLM errors - break or continue?
-                # For now, continue but log the issue
-                pass
+            if review and _review_step(driver, snapshot_name):
+                return True
  
         except NoSuchElementException:
             print(f"[Error] Element not found for action '{action_type}' with selector: {selector}")
@@ -84,5 +141,160 @@ def execute_playbook_actions(driver, actions, resume_path, cover_letter_path):
         except Exception as e:
             print(f"[Error] Unexpected error during action '{field}': {e}")
             return False
+        idx += 1
+ 
+    return True
+ 
+def _prepare_actions(actions, profile):
+    """
+    Copies of the actions with profile placeholders filled into their values,
+    or None (after printing why) when an action could not run as written.
+    """
+    prepared = []
+    for idx, action in enumerate(actions):
+        action_type = action.get("action")
+        value = action.get("value")
+        field = action.get("field", "Unknown field")
+        if action_type == "upload":
+            if value not in (f"[{name}]" for name in FILE_PLACEHOLDERS):
+                print(f"[Error] Action {idx+1} '{field}': unknown upload value {value!r}; "
+                      f"expected [RESUME_PATH] or [COVER_LETTER_PATH].")
+                return None
+        elif action_type in BATCHABLE_ACTIONS and action_type != "click":
+            filled, missing = fill_placeholders(value, profile)
+            if missing:
+                print(f"[Error] Action {idx+1} '{field}': no candidate profile value for "
+                      f"{', '.join(f'[{name}]' for name in missing)}; not typing a placeholder.")
+                return None
+            if filled != value:
+                action = dict(action, value=filled)
+        prepared.append(action)
+    return prepared
+ 
+def _perform_action(driver, element, action, resume_path, cover_letter_path):
+    """Click, type or upload through WebDriver."""
+    action_type = action.get("action")
+    field = action.get("field", "Unknown field")
+    if action_type == "click":
+        try:
+            element.click()
+        except ElementNotInteractableException:
+            print(f"Element not interactable for clicking '{field}'. Scrolling into view and retrying.")
+            driver.execute_script("arguments[0].scrollIntoView(true);", element)
+            wait_for_page_ready(driver, "scroll into view", replaces=1, network_timeout=1, dom_timeout=1)
+            element.click()
+        print(f"Clicked: {field}")
+    elif action_type in ("type", "fill"):
+        element.send_keys(action.get("value") or "")
+        print(f"Typed into: {field}")
+    elif action_type == "upload":
+        if action.get("value") == "[RESUME_PATH]":
+            upload_path = resume_path
+        elif action.get("value") == "[COVER_LETTER_PATH]":
+            upload_path = cover_letter_path
+        else:
+            raise ValueError(f"Unknown upload value placeholder: {action.get('value')!r}")
+        driver.execute_script("arguments[0].scrollIntoView(true);", element)
+        element.send_keys(upload_path)  # file inputs accept keys without waiting for the scroll
+        print(f"Uploaded file for: {field} (Path: {upload_path})")
+        result = wait_for_upload_result(driver, file_input=element, file_name=os.path.basename(upload_path))
+        if result == UPLOAD_SUCCESS:
+            print("Upload completion detected.")
+        elif result == UPLOAD_FAILURE:
+            print("[Error] Upload widget reported a failure.")
+        else:
+            print("Upload completion NOT detected within timeout.")
+    else:
+        print(f"[Warning] Unknown action type: {action_type}. Skipping action.")
+ 
+def _execute_batch(driver, run, first_idx, resolved):
+    """Execute a run of non-upload actions in the page. Returns False on the first failure."""
+    for offset, action in enumerate(run):
+        info = resolved.get(selector_key(action))
+        # Invalid selectors never match; missing elements get the in-page wait of the batch script
+        if info is not None and not info["valid"]:
+            print(f"[Error] Action {first_idx + offset + 1} '{action.get('field', 'Unknown field')}': "
+                  f"invalid selector: {info['error']}")
+            return False
+    print(f"\nExecuting actions {first_idx + 1}-{first_idx + len(run)} in the page ({len(run)} actions)")
+    results = run_batched_actions(driver, run)
+    for offset, result in enumerate(results):
+        action = run[offset]
+        label = f"{action.get('action')} - {action.get('field', 'Unknown field')}"
+        if result.get("ok"):
+            print(f"Action {first_idx + offset + 1}: {label} ({result.get('status')})")
+        else:
+            print(f"[Error] Action {first_idx + offset + 1}: {label} failed: {result.get('error')}")
+            return False
+    return len(results) == len(run)
+ 
+def _review_step(driver, snapshot_name):
+    """Snapshot the page and let the LLM review it. Returns True if the form looks complete."""
+    # Capture snapshot (kept in memory; written to disk as a side effect)
+    snapshot = capture_page_snapshot(driver, "seek_application", "PostAction", snapshot_name)
+ 
+    # Analyze step via LLM, unless the page looks exactly like it did at the last review
+    try:
+        previous = _last_reviews.get(driver) if REUSE_UNCHANGED_REVIEWS else None
+        if previous is not None and previous[0] == snapshot.url and is_same_frame(previous[1], snapshot.frame_hash):
+            print("Screenshot unchanged since the last review; reusing its analysis.")
+            result = previous[2]
+            _review_stats.record(reused=True)
+        else:
+            print("Analyzing effect of last action with LLM...")
+            # Call the correct LLM function and expect a dictionary
+            result = analyze_page_with_context(snapshot.html, snapshot.png, crop_box=snapshot.form_bbox,
+                                               form_sections=snapshot.form_sections,
+                                               frame_hash=snapshot.frame_hash)
+            _review_stats.record(reused=False)
+            if REUSE_UNCHANGED_REVIEWS and isinstance(result, dict):
+                _last_reviews[driver] = (snapshot.url, snapshot.frame_hash, result)
+ 
+        if isinstance(result, dict):
+            print(f"🖼️ Screenshot summary: {result.get('screenshot_summary', 'N/A')}")
+            print(f"🧾 HTML summary: {result.get('html_summary', 'N/A')}")
+            print(f"🔮 LLM-suggested next action: {result.get('suggested_action', 'N/A')}")
+            # Check for completion based on LLM analysis
+            if "no more form fields" in result.get('html_summary', '').lower() or "application complete" in result.get('screenshot_summary', '').lower():
+                 print("✅ LLM analysis indicates form is completed.")
+                 return True
+        else:
+            print(f"❌ LLM analysis failed or returned unexpected format: {result}")
+            # Decide how to handle unexpected LLM response - break or continue?
+            # For now, continue but log the issue
+            pass
+ 
+    except Exception as llm_error:
+        print(f"❌ LLM Error during analysis: {llm_error}")
+        # Decide how to handle LLM errors - break or continue?
+        # For now, continue but log the issue
+        pass
+    return False
+ 
+def earlier_action_reveals(actions, idx):
+    """Whether an action before actions[idx] may have revealed elements missing from the page."""
+    return any(action.get("action") in REVEALING_ACTIONS for action in actions[:idx])
  
-    return True
\ No newline at end of file
+def resolve_element(driver, action, resolved, can_reveal=False):
+    """
+    The element for an action, from the batch resolution. Invalid selectors
+    fail immediately. A selector that matched nothing is polled: for up to
+    ELEMENT_TIMEOUT when an earlier click or select may have revealed it,
+    otherwise for FIRST_ACTION_TIMEOUT in case the page is still rendering.
+    """
+    selector, xpath = selector_key(action)
+    info = resolved.get((selector, xpath))
+    if info is not None and not info["valid"]:
+        print(f"[Error] Invalid selector '{selector}': {info['error']}")
+        return None
+    if info is None or not info["count"]:
+        timeout = ELEMENT_TIMEOUT if can_reveal else FIRST_ACTION_TIMEOUT
+        with span("find_element", cat="selenium", selector=selector):
+            info = wait_for_resolved(driver, selector, xpath, timeout=timeout)
+        resolved[(selector, xpath)] = info
+    if not info["valid"] or not info["count"]:
+        print(f"[Error] Element not found for action '{action.get('action')}' with selector: {selector}")
+        return None
+    if info["count"] > 1:
+        print(f"[Warning] Selector '{selector}' matches {info['count']} elements; using the first.")
+    return info["element"]
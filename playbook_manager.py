@@ -1,43 +1,104 @@
 # playbook_manager.py
 import os
 import json
+import threading
+from playbook_store import PlaybookStore
 
 PLAYBOOK_DIR = "playbooks"
 
+_store = None
+_store_lock = threading.Lock()
+
+def get_playbook_store():
+    """Return the process-wide PlaybookStore (playbooks/playbooks.sqlite3)."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            ensure_playbook_dir()
+            _store = PlaybookStore(os.path.join(PLAYBOOK_DIR, "playbooks.sqlite3"))
+    return _store
+
 def load_playbook(form_key):
     """
-    Load a playbook (JSON) for the given form key (e.g., domain).
-    Returns the playbook data (dict or list) or None if not found.
+    Load a playbook for the given form key (e.g., domain).
+    Returns the playbook data ({"actions": [...]}) or None if not found.
+    A legacy JSON playbook is imported into the store the first time it is looked up.
     """
-    ensure_playbook_dir()
-    filename = _key_to_filename(form_key)
-    filepath = os.path.join(PLAYBOOK_DIR, filename)
-    if os.path.exists(filepath):
-        try:
-            with open(filepath, "r", encoding="utf-8") as f:
-                data = json.load(f)
-            print(f"[Playbook] Loaded existing playbook for '{form_key}' from {filepath}")
-            return data
-        except Exception as e:
-            print(f"[Playbook] Error loading playbook {filepath}: {e}")
-            return None
-    else:
-        print(f"[Playbook] No playbook found for '{form_key}'")
-        return None
+    return _load(form_key, os.path.join(PLAYBOOK_DIR, _key_to_filename(form_key)), f"'{form_key}'")
 
 def save_playbook(form_key, playbook_data):
     """
-    Save the playbook data (dict or list) to a JSON file identified by form_key.
+    Replace the playbook identified by form_key. Duplicate actions are dropped.
+    """
+    _save(form_key, playbook_data, f"'{form_key}'")
+
+def load_step_playbook(domain, fingerprint):
+    """
+    Load the playbook recorded for one form step, identified by its structural
+    fingerprint (see form_fingerprint.py). Returns None if the step is new.
+    """
+    if not fingerprint:
+        return None
+    return _load(_step_key(domain, fingerprint), _step_filepath(domain, fingerprint),
+                 f"step {fingerprint} on '{domain}'")
+
+def save_step_playbook(domain, fingerprint, playbook_data):
+    """
+    Replace the playbook for one form step. Duplicate actions are dropped.
+    """
+    _save(_step_key(domain, fingerprint), playbook_data, f"step {fingerprint} on '{domain}'")
+
+def append_step_actions(domain, fingerprint, actions):
+    """
+    Append new actions to a form step's playbook without rewriting it.
+    Actions already recorded (same action, selector and value) are skipped.
+    Returns the number of actions added.
     """
-    ensure_playbook_dir()
-    filename = _key_to_filename(form_key)
-    filepath = os.path.join(PLAYBOOK_DIR, filename)
     try:
-        with open(filepath, "w", encoding="utf-8") as f:
-            json.dump(playbook_data, f, indent=2)
-        print(f"[Playbook] Saved playbook for '{form_key}' to {filepath}")
+        added = get_playbook_store().append_actions(_step_key(domain, fingerprint), actions)
+        print(f"[Playbook] Appended {added} new actions to step {fingerprint} on '{domain}'")
+        return added
     except Exception as e:
-        print(f"[Playbook] Failed to save playbook for '{form_key}': {e}")
+        print(f"[Playbook] Failed to append actions for step {fingerprint} on '{domain}': {e}")
+        return 0
+
+def compact_playbooks():
+    """Run a compaction pass over the playbook store."""
+    removed = get_playbook_store().compact()
+    print(f"[Playbook] Compaction removed: {removed}")
+    return removed
+
+def _load(key, legacy_path, label):
+    store = get_playbook_store()
+    try:
+        data = store.get(key)
+        if data is None and os.path.exists(legacy_path):
+            kept = store.import_json(key, legacy_path)
+            print(f"[Playbook] Imported legacy playbook {legacy_path} ({kept} unique actions)")
+            data = store.get(key)
+    except Exception as e:
+        print(f"[Playbook] Error loading playbook for {label}: {e}")
+        return None
+    if data is None:
+        print(f"[Playbook] No playbook found for {label}")
+        return None
+    if data.get("failed_sections"):
+        # Stored before partial plans were refused; treat the step as new so it is planned again
+        print(f"[Playbook] Ignoring partial playbook for {label} (sections {data['failed_sections']} failed)")
+        return None
+    print(f"[Playbook] Loaded existing playbook for {label} ({len(data['actions'])} actions)")
+    return data
+
+def _save(key, playbook_data, label):
+    if playbook_data.get("failed_sections"):
+        print(f"[Playbook] Not saving partial playbook for {label} "
+              f"(sections {playbook_data['failed_sections']} failed)")
+        return
+    try:
+        get_playbook_store().put(key, playbook_data)
+        print(f"[Playbook] Saved playbook for {label}")
+    except Exception as e:
+        print(f"[Playbook] Failed to save playbook for {label}: {e}")
 
 def ensure_playbook_dir():
     """Ensure the playbook directory exists."""
@@ -53,6 +114,14 @@ def _key_to_filename(form_key):
     # Further sanitization could be added if needed (e.g., handling spaces, special chars)
     return filename
 
+def _step_key(domain, fingerprint):
+    return f"{domain}/{fingerprint}"
+
+def _step_filepath(domain, fingerprint):
+    """Legacy location: playbooks/www_seek_com_au/<fingerprint>.json"""
+    domain_dir = _key_to_filename(domain)[:-len(".json")]
+    return os.path.join(PLAYBOOK_DIR, domain_dir, f"{fingerprint}.json")
+
 # Example usage (if standalone test):
 if __name__ == "__main__":
     # This is a placeholder example. In a real scenario, you would get playbook_data
@@ -0,0 +1,210 @@
+# playbook_store.py
+import os
+import sys
+import json
+import time
+import copy
+import sqlite3
+import threading
+
+DEFAULT_DB_PATH = os.path.join("playbooks", "playbooks.sqlite3")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS playbooks (
+    key TEXT PRIMARY KEY,
+    meta TEXT NOT NULL DEFAULT '{}',
+    version INTEGER NOT NULL DEFAULT 0,
+    updated REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS actions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    key TEXT NOT NULL,
+    action TEXT NOT NULL,
+    selector TEXT NOT NULL,
+    value TEXT NOT NULL,
+    data TEXT NOT NULL,
+    UNIQUE (key, action, selector, value)
+);
+CREATE INDEX IF NOT EXISTS actions_by_key ON actions (key, id);
+"""
+
+
+def action_identity(action):
+    """The (action, selector, value) triple used to deduplicate playbook actions."""
+    selector = action.get("selector", action.get("target"))
+    value = action.get("value")
+    return (
+        str(action.get("action") or ""),
+        str(selector or ""),
+        value if isinstance(value, str) else json.dumps(value),
+    )
+
+
+class PlaybookStore:
+    """
+    SQLite-backed playbook store.
+    Each playbook is a row in `playbooks` plus its actions in `actions`, unique
+    per (key, action, selector, value), so appending an action that is already
+    recorded is a no-op. Loaded playbooks are kept in an in-process cache that
+    is dropped whenever another connection commits (PRAGMA data_version) or the
+    playbook's version changes.
+    """
+
+    def __init__(self, db_path=DEFAULT_DB_PATH):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        self._conn.commit()
+        self._cache = {}  # key -> (version, playbook)
+        self._data_version = self._read_data_version()
+
+    def get(self, key):
+        """Return the playbook dict for key ({"actions": [...], ...}) or None."""
+        with self._lock:
+            self._check_external_changes()
+            cached = self._cache.get(key)
+            if cached is not None:
+                return copy.deepcopy(cached[1])
+            row = self._conn.execute("SELECT meta, version FROM playbooks WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            playbook = json.loads(row[0])
+            playbook["actions"] = [
+                json.loads(data) for (data,) in
+                self._conn.execute("SELECT data FROM actions WHERE key = ? ORDER BY id", (key,))
+            ]
+            self._cache[key] = (row[1], playbook)
+            return copy.deepcopy(playbook)
+
+    def exists(self, key):
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM playbooks WHERE key = ?", (key,)).fetchone() is not None
+
+    def put(self, key, playbook):
+        """Replace the playbook for key. Duplicate actions are dropped, first occurrence kept."""
+        playbook = _as_playbook(playbook)
+        with self._lock:
+            with self._conn:
+                self._touch(key, playbook)
+                self._conn.execute("DELETE FROM actions WHERE key = ?", (key,))
+                self._insert_actions(key, playbook["actions"])
+            self._cache.pop(key, None)
+            self._data_version = self._read_data_version()
+
+    def append_actions(self, key, actions):
+        """
+        Append actions to the playbook for key, creating it if needed.
+        Only actions not already recorded are written. Returns the number added.
+        """
+        with self._lock:
+            with self._conn:
+                self._touch(key, None)
+                added = self._insert_actions(key, actions)
+            self._cache.pop(key, None)
+            self._data_version = self._read_data_version()
+            return added
+
+    def keys(self):
+        with self._lock:
+            return [key for (key,) in self._conn.execute("SELECT key FROM playbooks ORDER BY key")]
+
+    def compact(self):
+        """
+        Explicit compaction pass: drop duplicate actions (keeping the first),
+        orphaned actions and empty playbooks, then VACUUM the database.
+        Returns a dict with the number of rows removed.
+        """
+        with self._lock:
+            with self._conn:
+                duplicates = self._conn.execute(
+                    "DELETE FROM actions WHERE id NOT IN "
+                    "(SELECT MIN(id) FROM actions GROUP BY key, action, selector, value)"
+                ).rowcount
+                orphans = self._conn.execute(
+                    "DELETE FROM actions WHERE key NOT IN (SELECT key FROM playbooks)"
+                ).rowcount
+                empty = self._conn.execute(
+                    "DELETE FROM playbooks WHERE key NOT IN (SELECT DISTINCT key FROM actions)"
+                ).rowcount
+            self._conn.execute("VACUUM")
+            self._cache.clear()
+            self._data_version = self._read_data_version()
+        return {"duplicate_actions": duplicates, "orphaned_actions": orphans, "empty_playbooks": empty}
+
+    def import_json(self, key, filepath):
+        """Import a legacy JSON playbook file, deduplicating its actions. Returns the number of actions kept."""
+        with open(filepath, "r", encoding="utf-8") as f:
+            playbook = _as_playbook(json.load(f))
+        with self._lock:
+            with self._conn:
+                self._touch(key, playbook)
+                added = self._insert_actions(key, playbook["actions"])
+            self._cache.pop(key, None)
+            self._data_version = self._read_data_version()
+        return added
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _touch(self, key, playbook):
+        meta = None
+        if playbook is not None:
+            meta = json.dumps({k: v for k, v in playbook.items() if k != "actions"})
+        self._conn.execute(
+            "INSERT INTO playbooks (key, meta, version, updated) VALUES (?, COALESCE(?, '{}'), 1, ?) "
+            "ON CONFLICT(key) DO UPDATE SET meta = COALESCE(?, meta), version = version + 1, updated = excluded.updated",
+            (key, meta, time.time(), meta),
+        )
+
+    def _insert_actions(self, key, actions):
+        added = 0
+        for action in actions or []:
+            if not isinstance(action, dict):
+                continue
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO actions (key, action, selector, value, data) VALUES (?, ?, ?, ?, ?)",
+                (key, *action_identity(action), json.dumps(action)),
+            )
+            added += cursor.rowcount
+        return added
+
+    def _read_data_version(self):
+        return self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def _check_external_changes(self):
+        # data_version only changes when *another* connection commits
+        data_version = self._read_data_version()
+        if data_version != self._data_version:
+            self._cache.clear()
+            self._data_version = data_version
+
+
+def _as_playbook(data):
+    """Normalize legacy playbook shapes (a bare list of actions, or a dict) to {"actions": [...]}."""
+    if isinstance(data, list):
+        return {"actions": data}
+    if isinstance(data, dict):
+        playbook = dict(data)
+        playbook["actions"] = list(playbook.get("actions") or [])
+        return playbook
+    return {"actions": []}
+
+
+def main():
+    """python playbook_store.py [compact|list] [db_path]"""
+    command = sys.argv[1] if len(sys.argv) > 1 else "list"
+    store = PlaybookStore(sys.argv[2] if len(sys.argv) > 2 else DEFAULT_DB_PATH)
+    if command == "compact":
+        print(f"[Playbook] Compaction removed: {store.compact()}")
+    else:
+        for key in store.keys():
+            print(f"{key}: {len(store.get(key)['actions'])} actions")
+    store.close()
+
+
+if __name__ == "__main__":
+    main()
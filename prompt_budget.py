@@ -0,0 +1,103 @@
+# prompt_budget.py
+# Token-budgeted prompt assembly. Instead of slicing HTML at a fixed character
+# count, the extracted form sections are ranked by how much they matter for
+# filling the form (file uploads, inputs, next/submit buttons first) and packed
+# into a token budget, then put back in page order.
+import re
+import math
+from functools import lru_cache
+
+try:
+    import tiktoken
+except ImportError:  # fall back to a characters-per-token estimate
+    tiktoken = None
+
+CHARS_PER_TOKEN = 4  # rough average for English text and markup when no tokenizer is installed
+DEFAULT_ENCODING = "o200k_base"
+
+_FILE_UPLOAD_RE = re.compile(r"\[INPUT: type=file")
+_FIELD_RE = re.compile(r"\[(INPUT|TEXTAREA|SELECT)")
+_BUTTON_RE = re.compile(r"\[BUTTON: ([^\]]*)\]")
+_PRIMARY_BUTTON_WORDS = ("next", "continue", "submit", "apply", "review", "upload", "save")
+
+
+@lru_cache(maxsize=8)
+def _encoding(model):
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding(DEFAULT_ENCODING)
+    except Exception:
+        # e.g. the BPE file is not cached locally and cannot be downloaded
+        return None
+
+
+def count_tokens(text, model="gpt-4o"):
+    """Number of tokens in text for model (estimated from length without tiktoken)."""
+    if not text:
+        return 0
+    encoding = _encoding(model)
+    if encoding is None:
+        return math.ceil(len(text) / CHARS_PER_TOKEN)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_to_tokens(text, max_tokens, model="gpt-4o"):
+    """Cut text to at most max_tokens tokens."""
+    if max_tokens <= 0:
+        return ""
+    encoding = _encoding(model)
+    if encoding is None:
+        return text[:max_tokens * CHARS_PER_TOKEN]
+    tokens = encoding.encode(text, disallowed_special=())
+    return text if len(tokens) <= max_tokens else encoding.decode(tokens[:max_tokens])
+
+
+def section_score(section):
+    """Relevance of a form section: file uploads > next/submit buttons > fields > other buttons > text."""
+    score = 8 * len(_FILE_UPLOAD_RE.findall(section))
+    score += 3 * len(_FIELD_RE.findall(section))
+    for label in _BUTTON_RE.findall(section):
+        label = label.lower()
+        score += 6 if any(word in label for word in _PRIMARY_BUTTON_WORDS) else 1
+    return score
+
+
+def pack_sections(sections, budget, model="gpt-4o", label="prompt", separator_tokens=8):
+    """
+    Choose the sections to send within `budget` tokens, most relevant first,
+    and return (sections in their original order, stats). A relevant section
+    that does not fit on its own is truncated to the remaining budget.
+    stats = {"budget", "total", "used", "dropped", "kept_sections", "dropped_sections"}.
+    """
+    sections = [s for s in sections or [] if s]
+    costs = [count_tokens(s, model) + separator_tokens for s in sections]
+    ranked = sorted(range(len(sections)), key=lambda i: (-section_score(sections[i]), i))
+
+    chosen = {}
+    remaining = budget
+    for i in ranked:
+        if costs[i] <= remaining:
+            chosen[i] = sections[i]
+            remaining -= costs[i]
+        elif remaining > separator_tokens * 4 and section_score(sections[i]) > 0:
+            chosen[i] = truncate_to_tokens(sections[i], remaining - separator_tokens, model)
+            remaining = 0
+
+    kept = [chosen[i] for i in sorted(chosen)]
+    total = sum(costs)
+    used = budget - remaining
+    stats = {
+        "budget": budget,
+        "total": total,
+        "used": used,
+        "dropped": max(0, total - used),
+        "kept_sections": len(kept),
+        "dropped_sections": len(sections) - len(kept),
+    }
+    print(f"[Prompt] {label}: {stats['kept_sections']}/{len(sections)} sections, "
+          f"{stats['used']} tokens used, {stats['dropped']} dropped (budget {budget}"
+          f"{'' if _encoding(model) is not None else ', estimated'})")
+    return kept, stats
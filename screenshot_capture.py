@@ -0,0 +1,103 @@
+# screenshot_capture.py
+# Screenshots without resizing the browser window. Resizing the window to the
+# page's scroll size forces a full re-layout of the SPA, can trigger lazy
+# loading, and leaves the window huge for the rest of the run. Instead:
+#   "full"      Firefox's native full-page screenshot (geckodriver renders the
+#               whole document at the current window size), falling back to
+#               scrolling the viewport and stitching the tiles with Pillow
+#   "viewport"  just the visible viewport, for callers that do not need the page
+# The window stays at WINDOW_SIZE throughout.
+import io
+
+from page_waits import run_async_script
+from tracing import span
+
+try:
+    from PIL import Image
+except ImportError:  # without Pillow tiles cannot be stitched; "full" falls back to the viewport
+    Image = None
+
+FULL_PAGE = "full"
+VIEWPORT = "viewport"
+CAPTURE_MODE = FULL_PAGE
+WINDOW_SIZE = (1280, 900)  # create_driver starts Firefox at this size
+MAX_TILES = 40  # stitched captures stop after this many viewports
+
+PAGE_METRICS_SCRIPT = """
+var root = document.documentElement;
+return {height: Math.max(root.scrollHeight, document.body ? document.body.scrollHeight : 0),
+        viewport: window.innerHeight, x: window.scrollX, y: window.scrollY,
+        dpr: window.devicePixelRatio || 1};
+"""
+
+# Scroll, then let two animation frames pass so the new position is painted
+SCROLL_SCRIPT = """
+var done = arguments[arguments.length - 1];
+window.scrollTo(arguments[0], arguments[1]);
+requestAnimationFrame(function () { requestAnimationFrame(function () { done(window.scrollY); }); });
+"""
+
+
+def capture_screenshot(driver, mode=CAPTURE_MODE):
+    """
+    Screenshot the current page without touching the window size.
+    Returns (png_bytes, method) where method is "native", "stitched" or "viewport".
+    """
+    with span("screenshot", cat="capture", mode=mode) as current:
+        if mode == FULL_PAGE:
+            png, method = _full_page(driver)
+        else:
+            png, method = driver.get_screenshot_as_png(), VIEWPORT
+        current.set(method=method, bytes=len(png))
+    return png, method
+
+
+def _full_page(driver):
+    native = getattr(driver, "get_full_page_screenshot_as_png", None)
+    if native is not None:
+        try:
+            return native(), "native"
+        except Exception as e:
+            print(f"[Capture] Native full-page screenshot failed ({e}); stitching viewport tiles.")
+    if Image is None:
+        print("[Capture] Pillow not installed; capturing the viewport only.")
+        return driver.get_screenshot_as_png(), VIEWPORT
+    return stitch_viewport_tiles(driver), "stitched"
+
+
+def stitch_viewport_tiles(driver, max_tiles=MAX_TILES):
+    """
+    Scroll through the page one viewport at a time, screenshot each position
+    and paste the tiles into one image. The scroll position is restored
+    afterwards. Fixed or sticky elements appear once per tile.
+    """
+    metrics = driver.execute_script(PAGE_METRICS_SCRIPT)
+    dpr = metrics["dpr"]
+    viewport = max(1, int(metrics["viewport"]))
+    page_height = int(metrics["height"])
+    tiles = []
+    try:
+        for index in range(max_tiles):
+            target = index * viewport
+            if index and target >= page_height:
+                break
+            actual = run_async_script(driver, SCROLL_SCRIPT, 5, 0, target)
+            if tiles and actual <= tiles[-1][0]:
+                break  # the document does not scroll any further (e.g. an inner scroll container)
+            tiles.append((actual, driver.get_screenshot_as_png()))
+            if actual + viewport >= page_height:
+                break
+        else:
+            print(f"[Capture] Page is taller than {max_tiles} viewports; the screenshot is cut off.")
+    finally:
+        run_async_script(driver, SCROLL_SCRIPT, 5, metrics["x"], metrics["y"])
+
+    images = [(y, Image.open(io.BytesIO(png))) for y, png in tiles]
+    width = images[0][1].width
+    height = max(round(y * dpr) + image.height for y, image in images)
+    canvas = Image.new("RGB", (width, min(height, round(page_height * dpr)) or height), "white")
+    for y, image in images:
+        canvas.paste(image.convert("RGB"), (0, round(y * dpr)))
+    out = io.BytesIO()
+    canvas.save(out, format="PNG")
+    return out.getvalue()
@@ -0,0 +1,215 @@
+# selector_validator.py
+# Offline check of LLM-generated selectors against the HTML already captured
+# for the step. Every action's CSS or XPath selector is compiled once (cached)
+# and counted against the parsed page with lxml, so selectors that are invalid,
+# match nothing or match several elements are found in milliseconds instead of
+# through a browser wait per selector. Broken selectors are repaired where a
+# safe rewrite exists (jQuery :contains() to XPath, text() to normalize-space(),
+# unquoted attribute values); the rest are dropped before execution.
+# lxml is needed for any checking and cssselect for CSS selectors; without them
+# actions pass through as "unchecked".
+import re
+import time
+from functools import lru_cache
+
+try:
+    from lxml import etree
+except ImportError:  # nothing can be checked offline; actions pass through unchecked
+    etree = None
+
+try:
+    from cssselect import HTMLTranslator, SelectorSyntaxError, ExpressionError
+    _translator = HTMLTranslator()
+except ImportError:  # XPath selectors are still checked
+    HTMLTranslator = None
+    _translator = None
+
+from element_resolver import uses_xpath, REVEALING_ACTIONS
+from tracing import span
+
+OK = "ok"
+MISSING = "missing"
+AMBIGUOUS = "ambiguous"
+INVALID = "invalid"
+UNCHECKED = "unchecked"
+
+_CONTAINS_RE = re.compile(r"^(?P<prefix>.*?):contains\(\s*(?P<quote>['\"]?)(?P<text>.*?)(?P=quote)\s*\)(?P<rest>.*)$")
+_SIMPLE_TAG_RE = re.compile(r"^[a-zA-Z][\w-]*$")
+_TEXT_CONTAINS_RE = re.compile(r"contains\(\s*text\(\)\s*,")
+_TEXT_EQUALS_RE = re.compile(r"text\(\)\s*=")
+_UNQUOTED_ATTR_RE = re.compile(r"\[\s*([\w:-]+)\s*([~|^$*]?=)\s*([^\]'\"\s]+)\s*\]")
+
+
+def xpath_literal(text):
+    """text as an XPath 1.0 string literal (concat() when it holds both quote kinds)."""
+    if "'" not in text:
+        return f"'{text}'"
+    if '"' not in text:
+        return f'"{text}"'
+    return "concat(" + ", \"'\", ".join(f"'{part}'" for part in text.split("'")) + ")"
+
+
+@lru_cache(maxsize=4096)
+def contains_to_xpath(selector):
+    """
+    Rewrite a jQuery-style `tag:contains('text')` selector (which browsers
+    reject) into XPath matching the element's normalized text. A selector with
+    nothing before :contains is assumed to be a button. Returns None when the
+    selector cannot be rewritten (e.g. it continues after the :contains()).
+    """
+    match = _CONTAINS_RE.match(selector.strip())
+    if not match or match.group("rest").strip():
+        return None
+    prefix = match.group("prefix").strip() or "button"
+    predicate = f"[contains(normalize-space(.), {xpath_literal(match.group('text').strip())})]"
+    if _SIMPLE_TAG_RE.match(prefix):
+        return f"//{prefix}{predicate}"
+    if _translator is None:
+        return None
+    try:
+        return _translator.css_to_xpath(prefix, prefix="//") + predicate
+    except (SelectorSyntaxError, ExpressionError):
+        return None
+
+
+@lru_cache(maxsize=4096)
+def compile_selector(selector, use_xpath):
+    """
+    Compile a selector to an lxml XPath matcher, once per distinct selector.
+    Returns (matcher, status, error): matcher is None when the selector is
+    invalid, or UNCHECKED when the engine cannot express it (e.g. CSS :has()).
+    """
+    if etree is None:
+        return None, UNCHECKED, "lxml not installed"
+    if use_xpath:
+        expression = selector
+    elif _translator is None:
+        return None, UNCHECKED, "cssselect not installed"
+    else:
+        try:
+            expression = _translator.css_to_xpath(selector)
+        except SelectorSyntaxError as e:
+            return None, INVALID, str(e)
+        except ExpressionError as e:
+            return None, UNCHECKED, str(e)
+    try:
+        return etree.XPath(expression), OK, None
+    except etree.XPathSyntaxError as e:
+        return None, INVALID, str(e)
+
+
+def parse_html(html):
+    """The captured page as an lxml tree, or None when it cannot be parsed."""
+    if etree is None or not html:
+        return None
+    parser = etree.HTMLParser(encoding="utf-8", huge_tree=True)
+    return etree.fromstring(html.encode("utf-8", "replace"), parser)
+
+
+def check_selector(tree, selector, use_xpath):
+    """Match one selector against the parsed page. Returns (status, count, error)."""
+    if tree is None:
+        return UNCHECKED, None, "no page to check against"
+    matcher, status, error = compile_selector(selector, bool(use_xpath))
+    if matcher is None:
+        return status, None, error
+    try:
+        result = matcher(tree)
+    except etree.XPathEvalError as e:
+        return INVALID, None, str(e)
+    if not isinstance(result, list):
+        return INVALID, None, "selector does not select elements"
+    count = sum(1 for node in result if isinstance(getattr(node, "tag", None), str))
+    if count == 0:
+        return MISSING, 0, None
+    return (OK if count == 1 else AMBIGUOUS), count, None
+
+
+def repair_candidates(selector, use_xpath):
+    """Alternative (selector, use_xpath) pairs to try for a selector that did not check out."""
+    candidates = []
+    if ":contains(" in selector:
+        rewritten = contains_to_xpath(selector)
+        if rewritten:
+            candidates.append((rewritten, True))
+    elif use_xpath:
+        # text() only sees the element's own text nodes; the label is often inside a <span>
+        loosened = _TEXT_EQUALS_RE.sub("normalize-space(.)=", _TEXT_CONTAINS_RE.sub("contains(normalize-space(.),", selector))
+        if loosened != selector:
+            candidates.append((loosened, True))
+    else:
+        quoted = _UNQUOTED_ATTR_RE.sub(lambda m: f"[{m.group(1)}{m.group(2)}{xpath_literal(m.group(3))}]", selector)
+        if quoted != selector:
+            candidates.append((quoted, False))
+    return candidates
+
+
+def validate_actions(actions, html, repair=True, verbose=True):
+    """
+    Check every action's selector against the captured page HTML.
+    Invalid selectors are repaired or dropped. Selectors that match nothing are
+    repaired, kept when an earlier action could reveal them, or else dropped.
+    Ambiguous ones are kept (the executors use the first match) and reported.
+    Returns (kept_actions, report); kept actions carry the repaired selector
+    and an explicit use_xpath flag.
+    """
+    start = time.perf_counter()
+    with span("validate_selectors", cat="playbook", count=len(actions)):
+        tree = parse_html(html)
+        kept, entries = [], []
+        can_reveal = False
+        for idx, action in enumerate(actions):
+            selector = action.get("selector") or action.get("target") or ""
+            if not selector:
+                kept.append(action)
+                continue
+            use_xpath = uses_xpath(action)
+            status, count, error = check_selector(tree, selector, use_xpath)
+            if ":contains(" in selector and not use_xpath:
+                # cssselect understands :contains(), browsers do not
+                status, count, error = INVALID, None, ":contains() is not valid CSS"
+            repaired = None
+            if repair and status in (INVALID, MISSING):
+                for candidate, candidate_xpath in repair_candidates(selector, use_xpath):
+                    candidate_status, candidate_count, _ = check_selector(tree, candidate, candidate_xpath)
+                    if candidate_status in (OK, AMBIGUOUS) or (status == INVALID and candidate_status != INVALID):
+                        repaired = (candidate, candidate_xpath)
+                        status, count, error = candidate_status, candidate_count, None
+                        break
+            if status == INVALID or (status == MISSING and not can_reveal):
+                dropped = True
+                repaired = None  # only kept actions count as repaired
+            else:
+                dropped = False
+                action = dict(action)
+                if repaired:
+                    action["selector"], action["use_xpath"] = repaired
+                else:
+                    action["use_xpath"] = use_xpath
+                kept.append(action)
+                can_reveal = can_reveal or action.get("action") in REVEALING_ACTIONS
+            entries.append({"index": idx, "field": action.get("field"), "selector": selector,
+                            "status": status, "count": count, "error": error,
+                            "repaired": repaired[0] if repaired else None, "dropped": dropped})
+
+    report = {"actions": len(actions), "kept": len(kept), "entries": entries,
+              "ms": (time.perf_counter() - start) * 1000}
+    for status in (OK, MISSING, AMBIGUOUS, INVALID, UNCHECKED):
+        report[status] = sum(1 for e in entries if e["status"] == status)
+    report["repaired"] = sum(1 for e in entries if e["repaired"])
+    report["dropped"] = sum(1 for e in entries if e["dropped"])
+
+    if not verbose:
+        return kept, report
+    for e in entries:
+        if e["dropped"]:
+            reason = f"invalid ({e['error']})" if e["status"] == INVALID else "matches nothing on the page"
+            print(f"[Validator] Dropping action {e['index'] + 1} '{e['field']}': {e['selector']} {reason}")
+        elif e["repaired"]:
+            print(f"[Validator] Repaired action {e['index'] + 1} '{e['field']}': {e['selector']} -> {e['repaired']}")
+        elif e["status"] == AMBIGUOUS:
+            print(f"[Validator] Action {e['index'] + 1} '{e['field']}': {e['selector']} matches {e['count']} elements")
+    print(f"[Validator] {report['actions']} actions: {report[OK]} ok, {report[AMBIGUOUS]} ambiguous, "
+          f"{report[MISSING]} missing, {report['repaired']} repaired, {report['dropped']} dropped, "
+          f"{report[UNCHECKED]} unchecked ({report['ms']:.1f} ms)")
+    return kept, report
@@ -0,0 +1,300 @@
+# snapshot_store.py
+import os
+import sys
+import json
+import hashlib
+import zlib
+import threading
+from collections import OrderedDict
+from file_utils import ensure_dir
+from snapshot_writer import get_snapshot_writer
+from html_delta import make_delta, apply_delta
+
+STORE_ROOT = "resources"
+DELTA_HTML = True  # store later steps of a job as deltas against the previous step
+MAX_DELTA_CHAIN = 20  # every 20th consecutive delta is stored in full to bound rebuild time
+MAX_DELTA_RATIO = 0.5  # a delta larger than half the compressed page is not worth keeping
+MAX_TRACKED_JOBS = 16  # jobs whose last HTML is kept in memory as the next delta base
+
+
+class SnapshotStore:
+    """
+    Content-addressed, deduplicating store for page snapshots.
+
+    Every HTML page and screenshot is written once as a blob named after its
+    SHA-256 digest (resources/blobs/ab/abcdef....png). A small append-only
+    manifest per job (resources/manifests/<job_id>.jsonl) maps step names to
+    blob digests, so identical captures cost no extra disk and looking up a
+    step never has to scan the directory.
+
+    If a writer (see snapshot_writer.SnapshotWriter) is given, blob writes are
+    handed off to it and happen in the background; digests and paths are still
+    returned immediately.
+
+    With delta=True (see put_html) the first page of a job is stored in full
+    and every later page as a compressed delta against the job's previous
+    page (resources/blobs/ab/<digest>.html.delta, which names its base);
+    load_html() and load_step_html() rebuild full pages on demand.
+    """
+
+    def __init__(self, root=STORE_ROOT, writer=None, delta=False, max_chain=MAX_DELTA_CHAIN):
+        self.root = root
+        self.writer = writer
+        self.delta = delta
+        self.max_chain = max_chain
+        self.blob_dir = os.path.join(root, "blobs")
+        self.manifest_dir = os.path.join(root, "manifests")
+        self._known_blobs = set()
+        self._lock = threading.Lock()  # several job workers may share one store
+        self._manifests = {}  # job_id -> {"steps": {step_key: entry}, "counts": {step_name: n}}
+        self._html_bases = {}  # digest -> base digest of pages written as deltas
+        self._last_html = OrderedDict()  # job_id -> (digest, html, chain length); the next delta base
+        self.stats = {"full": 0, "full_bytes": 0, "delta": 0, "delta_bytes": 0, "html_bytes": 0}
+
+    def blob_path(self, digest, extension):
+        """Path of the blob with the given digest."""
+        return os.path.join(self.blob_dir, digest[:2], f"{digest}.{extension}")
+
+    def put_blob(self, data, extension):
+        """
+        Store data (bytes or str) and return (digest, path).
+        Content already in the store is not written again.
+        """
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.blob_path(digest, extension)
+        with self._lock:
+            is_new = digest not in self._known_blobs
+            self._known_blobs.add(digest)
+        if is_new:
+            if self.writer is not None:
+                self.writer.submit(self._write_blob, path, data)
+            else:
+                self._write_blob(path, data)
+        return digest, path
+
+    def put_html(self, job_id, html):
+        """
+        Store the HTML of a job's next page. Returns (digest, path); path is
+        where the full page lives (written only for full pages; see
+        materialize_html). Whether the page is kept as a delta is decided when
+        the blob is written, possibly in the background; see html_base().
+        """
+        if not self.delta:
+            return self.put_blob(html, "html")
+        data = html.encode("utf-8")
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.blob_path(digest, "html")
+        job_id = str(job_id)
+        with self._lock:
+            is_new = digest not in self._known_blobs
+            self._known_blobs.add(digest)
+            previous = self._last_html.pop(job_id, None)
+            base, base_html, chain = None, None, 0
+            if previous is not None and previous[0] != digest and previous[2] < self.max_chain:
+                base, base_html, chain = previous[0], previous[1], previous[2] + 1
+            self._last_html[job_id] = (digest, html, chain)
+            while len(self._last_html) > MAX_TRACKED_JOBS:
+                self._last_html.popitem(last=False)
+            if not is_new:
+                # Same page as an earlier capture: it is already stored one way or the other
+                return digest, path
+        if self.writer is not None:
+            self.writer.submit(self._write_html, digest, path, data, base, base_html, html)
+        else:
+            self._write_html(digest, path, data, base, base_html, html)
+        return digest, path
+
+    def _write_html(self, digest, path, data, base, base_html, html):
+        """Write a page as a delta against base_html when that pays off, otherwise in full."""
+        if base_html is not None and not os.path.exists(path):
+            delta = make_delta(base_html, html)
+            if delta is not None and len(delta) <= MAX_DELTA_RATIO * len(zlib.compress(data, 1)):
+                self._write_blob(f"{path}.delta", base.encode("ascii") + b"\n" + delta)
+                with self._lock:
+                    self._html_bases[digest] = base
+                    self.stats["delta"] += 1
+                    self.stats["delta_bytes"] += len(delta)
+                    self.stats["html_bytes"] += len(data)
+                return
+        self._write_blob(path, data)
+        with self._lock:
+            self.stats["full"] += 1
+            self.stats["full_bytes"] += len(data)
+            self.stats["html_bytes"] += len(data)
+
+    def load_html(self, digest):
+        """
+        The full HTML with the given digest, rebuilt from its chain of deltas
+        when it was stored as one. Returns None if the page is not in the store.
+        """
+        if self.writer is not None:
+            self.writer.flush()
+        chain = []
+        current = digest
+        while not os.path.exists(self.blob_path(current, "html")):
+            delta_path = f"{self.blob_path(current, 'html')}.delta"
+            if not os.path.exists(delta_path):
+                return None
+            with open(delta_path, "rb") as f:
+                base, _, delta = f.read().partition(b"\n")
+            chain.append((current, delta))
+            current = base.decode("ascii")
+        with open(self.blob_path(current, "html"), "r", encoding="utf-8") as f:
+            html = f.read()
+        for page_digest, delta in reversed(chain):
+            html = apply_delta(html, delta)
+            if hashlib.sha256(html.encode("utf-8")).hexdigest() != page_digest:
+                raise ValueError(f"Rebuilt HTML for {page_digest} does not match its digest")
+        return html
+
+    def html_base(self, digest):
+        """
+        The digest of the page the stored HTML is a delta against, or None
+        when it is stored in full (or not at all).
+        """
+        if self.writer is not None:
+            self.writer.flush()
+        with self._lock:
+            if digest in self._html_bases:
+                return self._html_bases[digest]
+        delta_path = f"{self.blob_path(digest, 'html')}.delta"
+        if os.path.exists(self.blob_path(digest, "html")) or not os.path.exists(delta_path):
+            return None
+        with open(delta_path, "rb") as f:
+            return f.readline().strip().decode("ascii")
+
+    def materialize_html(self, digest):
+        """Make sure the full page exists as a plain blob (e.g. for callers that open the file); returns its path."""
+        path = self.blob_path(digest, "html")
+        if not os.path.exists(path):
+            html = self.load_html(digest)
+            if html is None:
+                return None
+            self._write_blob(path, html.encode("utf-8"))
+        return path
+
+    def report(self):
+        stats = self.stats
+        if not stats["full"] and not stats["delta"]:
+            return
+        stored = stats["full_bytes"] + stats["delta_bytes"]
+        print(f"[SnapshotStore] HTML: {stats['full']} full, {stats['delta']} deltas; "
+              f"{stored / 1024:,.0f} KB written for {stats['html_bytes'] / 1024:,.0f} KB of pages")
+
+    def _write_blob(self, path, data):
+        if os.path.exists(path):
+            return
+        ensure_dir(os.path.dirname(path))
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def record_step(self, job_id, step_name, html_digest, png_digest):
+        """
+        Map a step of a job to its HTML and screenshot blobs.
+        Repeated step names get a _N suffix, like the old file naming did.
+        Returns the manifest key used for the step.
+        """
+        with self._lock:
+            manifest = self._load_manifest(job_id)
+            count = manifest["counts"].get(step_name, 0)
+            step_key = step_name if count == 0 else f"{step_name}_{count}"
+            while step_key in manifest["steps"]:  # e.g. a step literally named "X_1" after a repeated "X"
+                count += 1
+                step_key = f"{step_name}_{count}"
+            manifest["counts"][step_name] = count + 1
+
+            entry = {"step": step_key, "html": html_digest, "png": png_digest}
+            manifest["steps"][step_key] = entry
+
+            ensure_dir(self.manifest_dir)
+            with open(self._manifest_path(job_id), "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+        return step_key
+
+    def get_step(self, job_id, step_key):
+        """Return the manifest entry for a step, or None if it was never recorded."""
+        return self._load_manifest(job_id)["steps"].get(step_key)
+
+    def list_steps(self, job_id):
+        """Return the step keys recorded for a job, in capture order."""
+        return list(self._load_manifest(job_id)["steps"])
+
+    def load_step_html(self, job_id, step_key):
+        """Read back the HTML stored for a step, rebuilt from deltas if needed (None if the step is unknown)."""
+        entry = self.get_step(job_id, step_key)
+        if not entry:
+            return None
+        return self.load_html(entry["html"])
+
+    def _manifest_path(self, job_id):
+        return os.path.join(self.manifest_dir, f"{job_id}.jsonl")
+
+    def _load_manifest(self, job_id):
+        job_id = str(job_id)
+        if job_id in self._manifests:
+            return self._manifests[job_id]
+
+        manifest = {"steps": {}, "counts": {}}
+        path = self._manifest_path(job_id)
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    entry = json.loads(line)
+                    manifest["steps"][entry["step"]] = entry
+        # Rebuild the per-name counters from the keys already used
+        for step_key in manifest["steps"]:
+            base, _, suffix = step_key.rpartition("_")
+            if suffix.isdigit() and base in manifest["steps"]:
+                manifest["counts"][base] = max(manifest["counts"].get(base, 1), int(suffix) + 1)
+            else:
+                manifest["counts"].setdefault(step_key, 1)
+        self._manifests[job_id] = manifest
+        return manifest
+
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+
+def get_snapshot_store():
+    """Return the process-wide SnapshotStore rooted at resources/ (writes in the background, HTML as deltas)."""
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = SnapshotStore(writer=get_snapshot_writer(), delta=DELTA_HTML)
+    return _default_store
+
+
+def main():
+    """python snapshot_store.py list <job_id> | export <job_id> <step_key> [out.html]"""
+    if len(sys.argv) < 3 or sys.argv[1] not in ("list", "export"):
+        print(main.__doc__)
+        return
+    store = SnapshotStore()
+    job_id = sys.argv[2]
+    if sys.argv[1] == "list":
+        for step_key in store.list_steps(job_id):
+            entry = store.get_step(job_id, step_key)
+            base = store.html_base(entry["html"])  # from the blob itself: the delta decision is made at write time
+            stored = f"delta against {base[:12]}" if base else "full"
+            print(f"{step_key}: html {entry['html'][:12]} ({stored}), png {entry['png'][:12]}")
+        return
+    html = store.load_step_html(job_id, sys.argv[3])
+    if html is None:
+        print(f"No HTML stored for step {sys.argv[3]} of job {job_id}.")
+        return
+    output = sys.argv[4] if len(sys.argv) > 4 else f"{sys.argv[3]}.html"
+    with open(output, "w", encoding="utf-8") as f:
+        f.write(html)
+    print(f"Rebuilt {len(html):,} characters of HTML -> {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+# snapshot_writer.py
+import atexit
+import queue
+import threading
+
+DEFAULT_WORKERS = 2
+DEFAULT_MAX_PENDING = 32
+
+
+class SnapshotWriter:
+    """
+    Bounded background writer for snapshot persistence.
+
+    Jobs (plain callables) are queued and run on a small pool of worker threads,
+    so the agent loop hands off bytes and returns immediately. The queue is
+    bounded: when it is full, submit() blocks until a worker catches up, which
+    keeps memory in check if the disk is slower than the browser.
+    """
+
+    def __init__(self, max_workers=DEFAULT_WORKERS, max_pending=DEFAULT_MAX_PENDING):
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._closed = False
+        self._lock = threading.Lock()
+        self.completed = 0
+        self.failed = 0
+        self._threads = []
+        for idx in range(max_workers):
+            thread = threading.Thread(target=self._worker, name=f"snapshot-writer-{idx}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, fn, *args, **kwargs):
+        """Queue fn(*args, **kwargs); blocks while the queue is full (backpressure)."""
+        if self._closed:
+            # Writer already shut down (e.g. at interpreter exit): run inline so nothing is lost
+            fn(*args, **kwargs)
+            return
+        self._queue.put((fn, args, kwargs))
+
+    def flush(self):
+        """Block until every queued write has completed."""
+        self._queue.join()
+
+    def close(self):
+        """Flush pending writes and stop the worker threads."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        self.flush()
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        if self.failed:
+            print(f"[SnapshotWriter] {self.failed} of {self.completed + self.failed} writes failed.")
+
+    def _worker(self):
+        while True:
+            job = self._queue.get()
+            try:
+                if job is None:
+                    return
+                fn, args, kwargs = job
+                try:
+                    fn(*args, **kwargs)
+                    with self._lock:
+                        self.completed += 1
+                except Exception as e:
+                    with self._lock:
+                        self.failed += 1
+                    print(f"[SnapshotWriter] Background write failed: {e}")
+            finally:
+                self._queue.task_done()
+
+
+_default_writer = None
+
+
+def get_snapshot_writer():
+    """Return the process-wide SnapshotWriter (started on first use)."""
+    global _default_writer
+    if _default_writer is None:
+        _default_writer = SnapshotWriter()
+        atexit.register(_default_writer.close)
+    return _default_writer
+
+
+def flush_snapshots():
+    """Wait for all pending snapshot writes; call at the end of a run."""
+    if _default_writer is not None:
+        _default_writer.flush()
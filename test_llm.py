@@ -1,5 +1,5 @@
 import os
-from openai import OpenAI
+from llm_transport import get_chat_client, transport_mode, REPLAY
 from dotenv import load_dotenv
 from bs4 import BeautifulSoup # Import BeautifulSoup for HTML parsing
 
@@ -23,14 +23,14 @@ def interact_with_openai_llm():
     # Get API key from environment variables
     api_key = os.getenv("OPENAI_API_KEY")
 
-    if not api_key:
+    if not api_key and transport_mode() != REPLAY and not os.getenv("LLM_BASE_URL"):
         print("Error: OPENAI_API_KEY not found in environment variables.")
         print("Please make sure you have a .env file with OPENAI_API_KEY=your_api_key")
         return
 
     try:
-        # Initialize the OpenAI client
-        client = OpenAI(api_key=api_key)
+        # Live, recorded or replayed client depending on LLM_MODE
+        client = get_chat_client()
 
         # Define the path to the HTML file
         html_file_path = "screenshots/application_step1.html"
@@ -0,0 +1,192 @@
+# tracing.py
+# Lightweight per-job phase tracing. Enable with TRACE=1 (TRACE_DIR sets the
+# output directory, default traces/) or enable_tracing(). Inside
+# `with job_trace(job_id):` every `with span("name"):` block is recorded, and
+# when the job ends two files are written:
+#   traces/<job_id>.jsonl       one JSON object per span, appended as spans end
+#   traces/<job_id>.trace.json  Chrome trace-event format (chrome://tracing, Perfetto)
+# When tracing is disabled, or no job trace is active, span() returns a shared
+# no-op context manager, so instrumented code pays only a function call.
+import os
+import json
+import time
+import threading
+import functools
+import contextvars
+from collections import defaultdict
+
+TRACE_DIR = "traces"
+
+_enabled = os.getenv("TRACE", "0") not in ("", "0")
+_trace_dir = os.getenv("TRACE_DIR", TRACE_DIR)
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+def enable_tracing(trace_dir=TRACE_DIR):
+    global _enabled, _trace_dir
+    _enabled = True
+    _trace_dir = trace_dir
+
+
+def disable_tracing():
+    global _enabled
+    _enabled = False
+
+
+def tracing_enabled():
+    return _enabled
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class JobTrace:
+    """Spans recorded for one job; written out by close()."""
+
+    def __init__(self, job_id, trace_dir):
+        self.job_id = str(job_id)
+        self.trace_dir = trace_dir
+        self.origin = time.perf_counter()
+        self.events = []
+        self._lock = threading.Lock()
+        os.makedirs(trace_dir, exist_ok=True)
+        self.jsonl_path = os.path.join(trace_dir, f"{self.job_id}.jsonl")
+        self.chrome_path = os.path.join(trace_dir, f"{self.job_id}.trace.json")
+        self._jsonl = open(self.jsonl_path, "a", encoding="utf-8")
+
+    def record(self, event):
+        with self._lock:
+            self.events.append(event)
+            self._jsonl.write(json.dumps(event, default=str) + "\n")
+
+    def close(self):
+        with self._lock:
+            self._jsonl.close()
+            trace_events = [{
+                "name": e["name"], "cat": e["cat"], "ph": "X",
+                "ts": e["start_us"], "dur": e["dur_us"],
+                "pid": self.job_id, "tid": e["thread"], "args": e["args"],
+            } for e in self.events]
+        with open(self.chrome_path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": trace_events, "displayTimeUnit": "ms"}, f, default=str)
+
+    def summary(self, top=8):
+        """Total seconds per top-level phase name, slowest first."""
+        totals = defaultdict(float)
+        for e in self.events:
+            if e["parent"] == "job":
+                totals[e["name"]] += e["dur_us"] / 1e6
+        return sorted(totals.items(), key=lambda item: -item[1])[:top]
+
+
+class Span:
+    __slots__ = ("trace", "name", "cat", "args", "start", "parent", "_token")
+
+    def __init__(self, trace, name, cat, args):
+        self.trace = trace
+        self.name = name
+        self.cat = cat
+        self.args = args
+
+    def set(self, **attrs):
+        """Attach attributes discovered while the span runs (e.g. result sizes)."""
+        self.args.update(attrs)
+
+    def __enter__(self):
+        self.parent = _current_span.get()
+        self._token = _current_span.set(self.name)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.perf_counter()
+        _current_span.reset(self._token)
+        if exc_type is not None:
+            self.args["error"] = exc_type.__name__
+        self.trace.record({
+            "job": self.trace.job_id,
+            "name": self.name,
+            "cat": self.cat,
+            "parent": self.parent,
+            "thread": threading.current_thread().name,
+            "start_us": round((self.start - self.trace.origin) * 1e6),
+            "dur_us": round((end - self.start) * 1e6),
+            "args": self.args,
+        })
+        return False
+
+
+def span(name, cat="step", **args):
+    """Context manager timing one phase of the current job (no-op when tracing is off)."""
+    if not _enabled:
+        return _NOOP_SPAN
+    trace = _current_trace.get()
+    if trace is None:
+        return _NOOP_SPAN
+    return Span(trace, name, cat, args)
+
+
+def traced(name=None, cat="step"):
+    """Decorator form of span(): time every call of the function."""
+    def decorator(func):
+        span_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            with span(span_name, cat):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class job_trace:
+    """
+    `with job_trace(job_id):` collects the spans of one job and writes its
+    JSONL and Chrome trace files on exit. Nested job_trace blocks for the same
+    job reuse the outer trace.
+    """
+
+    def __init__(self, job_id):
+        self.job_id = job_id
+        self.trace = None
+        self._token = None
+        self._span = None
+
+    def __enter__(self):
+        if not _enabled:
+            return None
+        current = _current_trace.get()
+        if current is not None and current.job_id == str(self.job_id):
+            return current
+        self.trace = JobTrace(self.job_id, _trace_dir)
+        self._token = _current_trace.set(self.trace)
+        self._span = Span(self.trace, "job", "job", {"job_id": str(self.job_id)})
+        self._span.__enter__()
+        return self.trace
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.trace is None:
+            return False
+        self._span.__exit__(exc_type, exc, tb)
+        _current_trace.reset(self._token)
+        self.trace.close()
+        phases = ", ".join(f"{name} {seconds:.1f}s" for name, seconds in self.trace.summary() if name != "job")
+        print(f"[Trace] {self.trace.job_id}: {phases or 'no spans'}")
+        print(f"[Trace] Written {self.trace.jsonl_path} and {self.trace.chrome_path}")
+        return False
@@ -0,0 +1,82 @@
+# vision_payload.py
+import io
+import base64
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow is optional; without it screenshots are sent unchanged
+    Image = None
+
+# Defaults for screenshots sent to the vision model
+MAX_WIDTH = 1280
+MAX_HEIGHT = 2048
+IMAGE_FORMAT = "JPEG"  # "JPEG", "WEBP" or "PNG"
+IMAGE_QUALITY = 70
+CROP_PADDING = 24
+
+_MIME_TYPES = {"JPEG": "image/jpeg", "WEBP": "image/webp", "PNG": "image/png"}
+
+
+def optimize_screenshot(png_bytes, max_width=MAX_WIDTH, max_height=MAX_HEIGHT,
+                        image_format=IMAGE_FORMAT, quality=IMAGE_QUALITY, crop_box=None,
+                        padding=CROP_PADDING):
+    """
+    Shrink a screenshot before it is sent to the LLM.
+    Optionally crops to crop_box (left, top, right, bottom in screenshot pixels,
+    e.g. PageSnapshot.form_bbox), downscales to fit max_width x max_height and
+    re-encodes as JPEG/WebP.
+    Returns (image_bytes, mime_type, stats) where stats reports bytes and size
+    before and after.
+    """
+    stats = {"bytes_before": len(png_bytes), "bytes_after": len(png_bytes),
+             "size_before": None, "size_after": None}
+    if Image is None:
+        print("[Vision] Pillow not installed; sending the original PNG.")
+        return png_bytes, "image/png", stats
+
+    try:
+        image = Image.open(io.BytesIO(png_bytes))
+        image.load()
+    except Exception as e:
+        print(f"[Vision] Could not decode screenshot ({e}); sending the original PNG.")
+        return png_bytes, "image/png", stats
+    stats["size_before"] = image.size
+
+    if crop_box:
+        left, top, right, bottom = crop_box
+        box = (
+            max(0, int(left) - padding),
+            max(0, int(top) - padding),
+            min(image.width, int(right) + padding),
+            min(image.height, int(bottom) + padding),
+        )
+        if box[2] > box[0] and box[3] > box[1]:
+            image = image.crop(box)
+
+    if image.width > max_width or image.height > max_height:
+        image.thumbnail((max_width, max_height), Image.LANCZOS)
+
+    image_format = image_format.upper()
+    if image_format in ("JPEG", "WEBP") and image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+
+    buffer = io.BytesIO()
+    if image_format == "PNG":
+        image.save(buffer, format="PNG", optimize=True)
+    else:
+        image.save(buffer, format=image_format, quality=quality)
+    data = buffer.getvalue()
+
+    stats["size_after"] = image.size
+    stats["bytes_after"] = len(data)
+    return data, _MIME_TYPES.get(image_format, "image/png"), stats
+
+
+def screenshot_data_url(png_bytes, **kwargs):
+    """Optimize a screenshot and return it as a data: URL for the chat API."""
+    data, mime_type, stats = optimize_screenshot(png_bytes, **kwargs)
+    print(
+        f"[Vision] Screenshot payload {stats['bytes_before']:,} -> {stats['bytes_after']:,} bytes "
+        f"({stats['size_before']} -> {stats['size_after']})"
+    )
+    return f"data:{mime_type};base64,{base64.b64encode(data).decode('utf-8')}"